@@ -0,0 +1,232 @@
+import json
+import os
+import sqlite3
+from itertools import islice
+
+from fechas import convertir_fecha_ordinal
+
+# Almacén local de los catálogos (productos, clientes y ofertas) en SQLite, con un índice por clave
+RUTA_ALMACEN = "./Json/catalogos.sqlite"
+VERSION_ALMACEN = 1  # Cambia si cambia el esquema, para reconstruir los almacenes anteriores.
+CLAVES_POR_CONSULTA = 500  # Claves por consulta `IN (...)`; el último grupo se completa con NULL.
+
+# Sin tipo en las columnas de clave: SQLite conserva el tipo de cada valor (1 y "1" son claves
+# distintas, como en un diccionario de Python)
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS productos (clave PRIMARY KEY, datos TEXT NOT NULL, carga INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS clientes (clave PRIMARY KEY, datos TEXT NOT NULL, carga INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS ofertas (
+    llave, orden INTEGER NOT NULL, inicio INTEGER, fin INTEGER, datos TEXT NOT NULL, carga INTEGER NOT NULL,
+    PRIMARY KEY (llave, orden)
+);
+CREATE INDEX IF NOT EXISTS ofertas_vigencia ON ofertas (llave, inicio, fin);
+CREATE TABLE IF NOT EXISTS cargas (catalogo TEXT PRIMARY KEY, carga INTEGER NOT NULL, filas INTEGER NOT NULL);
+"""
+CATALOGOS = ("productos", "clientes", "ofertas")
+
+
+# Función para obtener la clave de búsqueda de cada catálogo
+def clave_producto(producto):
+    return producto["Producto Código"][:-2]  # EAN
+
+def clave_cliente(cliente):
+    return cliente["NUMERO FARMACIA"]
+
+CLAVES_CATALOGOS = {"productos": clave_producto, "clientes": clave_cliente}
+
+
+# Función para agrupar las claves en grupos de tamaño fijo
+def grupos_de_claves(claves):
+    """
+    Agrupa las claves de a CLAVES_POR_CONSULTA y completa el último grupo con None, de modo que
+    todas las consultas usan la misma sentencia preparada (`sqlite3` la guarda en su caché). NULL
+    nunca coincide dentro de `IN (...)`.
+
+    Yields:
+        list: Cada grupo de CLAVES_POR_CONSULTA claves.
+    """
+    iterador = iter(claves)
+    while grupo := list(islice(iterador, CLAVES_POR_CONSULTA)):
+        yield grupo + [None] * (CLAVES_POR_CONSULTA - len(grupo))
+
+
+# Función para consultar las filas de varias claves en grupos de tamaño fijo
+def consultar_en_grupos(conexion, sentencia, claves, parametros=()):
+    """
+    Args:
+        conexion (sqlite3.Connection): La base a consultar.
+        sentencia (str): La consulta, con `{condicion}` donde va la condición sobre la clave
+            (por ejemplo "SELECT datos FROM productos WHERE clave {condicion}").
+        claves (iterable): Las claves a buscar (sin repetir; None busca la clave nula).
+        parametros (tuple): Parámetros de la consulta que van después de las claves.
+
+    Returns:
+        list: Las filas de todas las claves.
+    """
+    claves = set(claves)
+    en_grupo = sentencia.format(condicion=f"IN ({', '.join('?' * CLAVES_POR_CONSULTA)})")
+    filas = []
+    for grupo in grupos_de_claves(clave for clave in claves if clave is not None):
+        filas.extend(conexion.execute(en_grupo, grupo + list(parametros)))
+    if None in claves:
+        # NULL no coincide dentro de `IN (...)`; la clave nula se busca aparte
+        filas.extend(conexion.execute(sentencia.format(condicion="IS NULL"), parametros))
+    return filas
+
+
+class AlmacenCatalogos:
+    """
+    Los catálogos guardados en una base SQLite local, de la que solo se leen las filas que usa
+    cada lote de ventas, en lugar de cargar los archivos completos y armar sus diccionarios.
+
+    Cada catálogo se actualiza con `actualizar` (generarJson.py lo hace al generar los archivos
+    intermedios): las filas se insertan o reemplazan por clave y las que ya no están en el
+    catálogo se eliminan, así que el almacén siempre refleja la última versión de cada archivo.
+    """
+
+    def __init__(self, ruta, solo_lectura=False):
+        """
+        Args:
+            ruta (str): La ruta de la base SQLite.
+            solo_lectura (bool): Si es True, la base debe existir y no se modifica.
+        """
+        self.ruta = ruta
+        if solo_lectura:
+            self.conexion = sqlite3.connect(f"file:{os.path.abspath(ruta)}?mode=ro", uri=True)
+        else:
+            carpeta = os.path.dirname(ruta)
+            if carpeta:
+                os.makedirs(carpeta, exist_ok=True)
+            self.conexion = sqlite3.connect(ruta)
+            self.preparar_esquema()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excepcion):
+        self.conexion.close()
+
+    # Función para crear las tablas (o reconstruirlas si son de otra versión del almacén)
+    def preparar_esquema(self):
+        version = self.conexion.execute("PRAGMA user_version").fetchone()[0]
+        if version != VERSION_ALMACEN:
+            with self.conexion:
+                for tabla in CATALOGOS + ("cargas",):
+                    self.conexion.execute(f"DROP TABLE IF EXISTS {tabla}")
+        self.conexion.executescript(ESQUEMA)
+        self.conexion.execute(f"PRAGMA user_version = {VERSION_ALMACEN}")
+
+    # Función para actualizar un catálogo del almacén con todos sus registros
+    def actualizar(self, nombre, registros):
+        """
+        Inserta o reemplaza cada registro por su clave (la última aparición de una clave
+        repetida, igual que el diccionario de búsqueda) y elimina las filas de cargas anteriores
+        que ya no están, todo en una sola transacción.
+
+        Args:
+            nombre (str): "productos", "clientes" u "ofertas".
+            registros (list): Todos los registros (dict) del catálogo.
+
+        Returns:
+            int: Las filas del catálogo en el almacén.
+        """
+        fila_carga = self.conexion.execute("SELECT carga FROM cargas WHERE catalogo = ?", (nombre,)).fetchone()
+        carga = fila_carga[0] + 1 if fila_carga else 1
+        with self.conexion:
+            if nombre == "ofertas":
+                self.conexion.executemany(
+                    "INSERT INTO ofertas (llave, orden, inicio, fin, datos, carga) VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (llave, orden) DO UPDATE SET inicio = excluded.inicio, fin = excluded.fin, "
+                    "datos = excluded.datos, carga = excluded.carga",
+                    filas_ofertas(registros, carga))
+            else:
+                clave = CLAVES_CATALOGOS[nombre]
+                indice = {clave(registro): registro for registro in registros}
+                self.conexion.executemany(
+                    f"INSERT INTO {nombre} (clave, datos, carga) VALUES (?, ?, ?) "
+                    "ON CONFLICT (clave) DO UPDATE SET datos = excluded.datos, carga = excluded.carga",
+                    ((valor, json.dumps(registro, ensure_ascii=False), carga) for valor, registro in indice.items()))
+            self.conexion.execute(f"DELETE FROM {nombre} WHERE carga <> ?", (carga,))
+            total = self.conexion.execute(f"SELECT COUNT(*) FROM {nombre}").fetchone()[0]
+            self.conexion.execute("INSERT INTO cargas (catalogo, carga, filas) VALUES (?, ?, ?) "
+                                  "ON CONFLICT (catalogo) DO UPDATE SET carga = excluded.carga, filas = excluded.filas",
+                                  (nombre, carga, total))
+        return total
+
+    # Función para verificar que todos los catálogos se cargaron y no están vacíos
+    def completo(self):
+        filas = dict(self.conexion.execute("SELECT catalogo, filas FROM cargas").fetchall())
+        return all(filas.get(nombre) for nombre in CATALOGOS)
+
+    # Funciones para obtener los registros de productos y de clientes con las claves dadas
+    def productos(self, eans):
+        filas = consultar_en_grupos(self.conexion, "SELECT datos FROM productos WHERE clave {condicion}", eans)
+        return [json.loads(datos) for datos, in filas]
+
+    def clientes(self, numeros_farmacia):
+        filas = consultar_en_grupos(self.conexion, "SELECT datos FROM clientes WHERE clave {condicion}", numeros_farmacia)
+        return [json.loads(datos) for datos, in filas]
+
+    # Función para obtener las ofertas de varias Llaves que pueden estar vigentes en un rango de fechas
+    def ofertas(self, llaves, desde=None, hasta=None):
+        """
+        Usa el índice (Llave, inicio, fin): solo se leen las ventanas que se superponen con el
+        rango, que son las únicas que pueden estar vigentes en alguna fecha del lote.
+
+        Args:
+            llaves (iterable): Las Llaves a buscar.
+            desde (int): El ordinal del primer día del rango, o None si no hay fechas válidas.
+            hasta (int): El ordinal del último día del rango.
+
+        Returns:
+            tuple: (Llaves con alguna oferta en el catálogo, aunque no sea vigente; ofertas (dict)
+            que se superponen con el rango, en el orden del catálogo).
+        """
+        existentes = [llave for llave, in consultar_en_grupos(
+            self.conexion, "SELECT DISTINCT llave FROM ofertas WHERE llave {condicion}", llaves)]
+        if desde is None or not existentes:
+            return existentes, []
+        filas = sorted(consultar_en_grupos(
+            self.conexion, "SELECT orden, datos FROM ofertas WHERE llave {condicion} AND inicio <= ? AND fin >= ?",
+            existentes, (hasta, desde)))
+        return existentes, [json.loads(datos) for _, datos in filas]
+
+
+# Función para armar las filas de ofertas del almacén
+def filas_ofertas(ofertas, carga):
+    """
+    Cada oferta se guarda con su posición entre las de su Llave (en el orden del archivo, que
+    decide el desempate entre ventanas con el mismo inicio) y sus fechas de vigencia como
+    ordinales, NULL si son vacías o inválidas.
+
+    Yields:
+        tuple: (llave, orden, inicio, fin, datos, carga).
+    """
+    ordenes = {}
+    for oferta in ofertas:
+        llave = oferta["Llave"]
+        orden = ordenes[llave] = ordenes.get(llave, -1) + 1
+        inicio = convertir_fecha_ordinal(oferta.get("Fecha inicio vigencia", None))
+        fin = convertir_fecha_ordinal(oferta.get("Fecha fin vigencia", None))
+        if inicio is None or fin is None:
+            inicio = fin = None
+        yield llave, orden, inicio, fin, json.dumps(oferta, ensure_ascii=False), carga
+
+
+# Función para abrir el almacén de catálogos para consultarlo
+def abrir_almacen(ruta=RUTA_ALMACEN):
+    """
+    Returns:
+        AlmacenCatalogos: El almacén en modo de solo lectura, o None si no existe o es de otra
+        versión.
+    """
+    if not os.path.isfile(ruta):
+        return None
+    almacen = AlmacenCatalogos(ruta, solo_lectura=True)
+    try:
+        if almacen.conexion.execute("PRAGMA user_version").fetchone()[0] == VERSION_ALMACEN:
+            return almacen
+    except sqlite3.DatabaseError:
+        pass
+    almacen.conexion.close()
+    return None
@@ -0,0 +1,199 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+
+import datosSinteticos  # Generador de catálogos, clientes, negociaciones y ventas.
+import intermedios
+import serializacion
+from metricas import memoria_pico_mb
+
+# Etapas que se miden, en el orden del pipeline
+ETAPAS = ("negociacion", "ofertas", "enriquecimiento", "excel")
+FILAS_PREDETERMINADAS = (10_000, 100_000)
+ARCHIVO_RESULTADOS = "benchmark_resultados.json"
+TOLERANCIA = 0.20  # Variación aceptada al comparar contra una ejecución anterior.
+
+# Función que mide una etapa; se ejecuta en un proceso nuevo para que el RSS pico sea solo el de la etapa
+def medir_etapa(etapa, carpeta, datos, opciones, formato_json=None):
+    """
+    Ejecuta una etapa del pipeline sobre los datos sintéticos y mide su tiempo y memoria.
+
+    Args:
+        etapa (str): Una de ETAPAS.
+        carpeta (str): La carpeta de trabajo con los datos generados por `datosSinteticos.generar_datos`.
+        datos (dict): Lo que devolvió `datosSinteticos.generar_datos`.
+        opciones (dict): Opciones de `procesar_archivos` (streaming, formato_salida, motor, workers).
+        formato_json (serializacion.FormatoJson, opcional): Cómo se escribe el archivo final.
+
+    Returns:
+        dict: Segundos de reloj y de CPU, filas de entrada, filas por segundo y RSS pico en MB.
+    """
+    # Los scripts escriben en ./logs y ./Json al importarse, así que se importan dentro de la carpeta de trabajo
+    os.chdir(carpeta)
+    os.makedirs("logs", exist_ok=True)
+    import generarJson
+    import funcionesFinal
+    import generarExcel
+
+    carpeta_json = datos["carpeta_json"]
+    generarJson.carpeta_data = carpeta_json
+    formato_json = formato_json or serializacion.FORMATO_PREDETERMINADO
+    ruta_salida = formato_json.ruta(os.path.join(carpeta_json, "sell_out_final." + opciones["formato_salida"]))
+    detalle = {}
+
+    # Preparación que no se mide: cargar la entrada que la etapa recibe en memoria
+    if etapa == "ofertas":
+        ruta_negociacion = intermedios.resolver_ruta(os.path.join(carpeta_json, "negociacion_sell-out.parquet"))
+        entrada = pd.DataFrame(intermedios.cargar_registros(ruta_negociacion))
+        filas = len(entrada)
+    elif etapa == "enriquecimiento":
+        funcionesFinal.RUTA_ARCHIVO = datos["rutas"]["ventas"]
+        funcionesFinal.RUTA_PRODUCTOS = datos["rutas"]["productos"]
+        funcionesFinal.RUTA_CLIENTES = datos["rutas"]["clientes"]
+        funcionesFinal.RUTA_OFERTAS = os.path.join(carpeta_json, "ofertaSellOut.parquet")
+        funcionesFinal.OUTPUT_FILE_PATH = os.path.join(carpeta_json, "sell_out_final.json")
+        filas = datos["ventas"]
+    elif etapa == "excel":
+        filas = datos["ventas"]
+    else:
+        filas = datos["negociaciones"]
+
+    inicio, inicio_cpu = time.perf_counter(), time.process_time()
+    if etapa == "negociacion":
+        resultado = generarJson.generar_json_negociacion(datos["rutas"]["negociacion"], carpeta_json)
+    elif etapa == "ofertas":
+        generarJson.generar_json_ofertas(entrada, "parquet")
+        resultado = intermedios.resolver_ruta(os.path.join(carpeta_json, "ofertaFinal.parquet"))
+        resultado = resultado if os.path.isfile(resultado) else None
+    elif etapa == "enriquecimiento":
+        resultado = funcionesFinal.procesar_archivos(**opciones, formato_json=formato_json)
+        if resultado is not None:
+            # Tiempos de cada etapa y de cada hito (como el primer lote procesado)
+            detalle = {nombre: round(segundos, 3) for nombre, segundos in {**resultado.etapas, **resultado.hitos}.items()}
+    else:
+        resultado, _ = generarExcel.exportar_excel(ruta_salida, os.path.join(carpeta, "sell_out_final_output.xlsx"))
+    segundos, segundos_cpu = time.perf_counter() - inicio, time.process_time() - inicio_cpu
+
+    if resultado is None:
+        raise RuntimeError(f"La etapa '{etapa}' no se pudo completar (ver el log de la etapa).")
+    return {
+        "etapa": etapa,
+        "filas": filas,
+        "segundos": round(segundos, 3),
+        "segundos_cpu": round(segundos_cpu, 3),
+        "filas_por_segundo": round(filas / segundos, 1) if segundos > 0 else None,
+        "rss_pico_mb": memoria_pico_mb(),
+        "rss_pico_hijos_mb": memoria_pico_mb(hijos=True),
+        "detalle": detalle,
+    }
+
+# Función para ejecutar una etapa en un proceso nuevo
+def ejecutar_etapa(etapa, carpeta, datos, opciones, formato_json=None):
+    contexto = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=contexto) as executor:
+        return executor.submit(medir_etapa, etapa, carpeta, datos, opciones, formato_json).result()
+
+# Función para comparar los resultados con los de una ejecución anterior
+def comparar_resultados(resultados, anteriores, tolerancia=TOLERANCIA):
+    """
+    Compara filas por segundo y RSS pico de cada etapa y tamaño con una ejecución anterior.
+
+    Args:
+        resultados (list): Los resultados de esta ejecución.
+        anteriores (list): Los resultados de la ejecución de referencia.
+        tolerancia (float): Variación aceptada (0.2 = 20 %).
+
+    Returns:
+        list: Un texto por cada regresión encontrada.
+    """
+    referencia = {(anterior["filas_ventas"], anterior["etapa"]): anterior for anterior in anteriores}
+    regresiones = []
+    for actual in resultados:
+        anterior = referencia.get((actual["filas_ventas"], actual["etapa"]))
+        if anterior is None:
+            continue
+        nombre = f"{actual['etapa']} con {actual['filas_ventas']:,} ventas"
+        if anterior["filas_por_segundo"] and actual["filas_por_segundo"] < anterior["filas_por_segundo"] * (1 - tolerancia):
+            regresiones.append(f"{nombre}: {actual['filas_por_segundo']:,.0f} filas/s (antes {anterior['filas_por_segundo']:,.0f})")
+        if anterior["rss_pico_mb"] and actual["rss_pico_mb"] > anterior["rss_pico_mb"] * (1 + tolerancia):
+            regresiones.append(f"{nombre}: {actual['rss_pico_mb']:,.0f} MB de RSS pico (antes {anterior['rss_pico_mb']:,.0f})")
+    return regresiones
+
+# Función para interpretar cantidades como 1e5
+def cantidad_filas(texto):
+    return int(float(texto))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mide el pipeline completo sobre datos sintéticos.")
+    parser.add_argument("--filas", type=cantidad_filas, nargs="+", default=list(FILAS_PREDETERMINADAS),
+                        help="Cantidades de ventas a medir, por ejemplo 1e4 1e5 1e6 1e7.")
+    parser.add_argument("--etapas", choices=ETAPAS, nargs="+", default=list(ETAPAS),
+                        help="Etapas a medir (las anteriores se ejecutan igual, porque generan su entrada).")
+    parser.add_argument("--motor", choices=("registro", "vectorizado", "compacto"), default="registro")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--sin-streaming", action="store_true",
+                        help="Enriquece con todas las ventas en memoria (por defecto se usa --streaming).")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--carpeta", help="Carpeta de trabajo (por defecto una carpeta temporal que se borra al terminar).")
+    parser.add_argument("--salida", default=ARCHIVO_RESULTADOS, help="Archivo JSON con los resultados.")
+    parser.add_argument("--comparar", metavar="ARCHIVO", help="Resultados anteriores contra los que se buscan regresiones.")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA)
+    serializacion.agregar_argumentos(parser)
+    args = parser.parse_args()
+
+    opciones = {"streaming": not args.sin_streaming, "formato_salida": "json",
+                "motor": args.motor, "workers": args.workers}
+    formato_json = serializacion.crear_formato(args)
+    carpeta_base = os.path.abspath(args.carpeta) if args.carpeta else tempfile.mkdtemp(prefix="benchmark_bonificaciones_")
+    ejecucion = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "procesadores": os.cpu_count(),
+        "opciones": opciones,
+        "serializacion": formato_json.parametros(),
+        "resultados": [],
+    }
+
+    try:
+        for filas_ventas in args.filas:
+            carpeta = os.path.join(carpeta_base, str(filas_ventas))
+            print(f"Generando datos sintéticos para {filas_ventas:,} ventas en '{carpeta}'...")
+            datos = datosSinteticos.generar_datos(carpeta, filas_ventas, args.semilla)
+
+            # Cada etapa necesita la salida de la anterior, así que se ejecutan todas hasta la última pedida
+            ultima = max(ETAPAS.index(etapa) for etapa in args.etapas)
+            for etapa in ETAPAS[:ultima + 1]:
+                resultado = ejecutar_etapa(etapa, carpeta, datos, opciones, formato_json)
+                if etapa not in args.etapas:
+                    continue
+                resultado["filas_ventas"] = filas_ventas
+                ejecucion["resultados"].append(resultado)
+                print(f"  {etapa}: {resultado['filas']:,} filas en {resultado['segundos']:.2f} s "
+                      f"({resultado['filas_por_segundo'] or 0:,.0f} filas/s, RSS pico {resultado['rss_pico_mb'] or 0:,.0f} MB)")
+    finally:
+        if not args.carpeta:
+            shutil.rmtree(carpeta_base, ignore_errors=True)
+
+    with open(args.salida, "w", encoding="utf-8") as archivo:
+        json.dump(ejecucion, archivo, ensure_ascii=False, indent=4)
+    print(f"Resultados guardados en '{args.salida}'.")
+
+    if args.comparar:
+        with open(args.comparar, "r", encoding="utf-8") as archivo:
+            regresiones = comparar_resultados(ejecucion["resultados"], json.load(archivo)["resultados"], args.tolerancia)
+        for regresion in regresiones:
+            print(f"Regresión: {regresion}")
+        if regresiones:
+            sys.exit(1)
+        print("Sin regresiones respecto de la ejecución anterior.")
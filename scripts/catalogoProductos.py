@@ -0,0 +1,352 @@
+import hashlib
+import json
+import logging
+import os
+from bisect import bisect_left
+from collections.abc import Mapping
+from functools import lru_cache
+
+import numpy as np
+import pyarrow as pa
+
+import intermedios
+import serializacion
+
+# Índice persistente del catálogo de productos, junto al archivo del catálogo
+EXTENSION_CATALOGO = ".catalogo.arrow"
+VERSION_CATALOGO = 1  # Cambia si cambia el contenido del índice, para reconstruir los anteriores.
+CAMPO_CLAVE = "__clave"  # EAN (`Producto Código` sin los 2 últimos dígitos).
+CAMPO_HASH = "__hash"  # Hash de 64 bits del EAN; las filas están ordenadas por este campo.
+CLAVE_METADATOS = b"bonificaciones.catalogo"
+POSICIONES_EN_CACHE = 65_536  # EAN cuya posición recuerda el catálogo mapeado (incluidos los que no existen).
+VALORES_EN_CACHE = 65_536  # Pares (EAN, campo) cuyo valor recuerda el catálogo mapeado para `valor`.
+
+
+# Función para calcular el hash estable (igual en todos los procesos) de una clave
+def hash_clave(clave):
+    return int.from_bytes(hashlib.blake2b(clave.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+# Función para obtener la ruta del índice de un catálogo de productos
+def ruta_catalogo(ruta_productos):
+    base, extension = os.path.splitext(ruta_productos)
+    if extension in serializacion.EXTENSIONES_COMPRESION.values():
+        base, extension = os.path.splitext(base)
+    return base + EXTENSION_CATALOGO
+
+
+# Función para obtener la huella del archivo del que se construye el índice
+def huella_origen(ruta_productos):
+    """
+    Returns:
+        dict: Nombre, tamaño y fecha de modificación del archivo, más la versión del índice. Si
+        alguno cambia, el índice se vuelve a construir.
+    """
+    estado = os.stat(ruta_productos)
+    return {"archivo": os.path.basename(ruta_productos), "tamano": estado.st_size,
+            "modificado": estado.st_mtime_ns, "version": VERSION_CATALOGO}
+
+
+# Función para convertir los valores de un campo a una columna Arrow
+def columna_arrow(valores):
+    """
+    Conserva el tipo de Python de cada valor: una columna de enteros, decimales, texto o
+    booleanos queda tipada; si mezcla tipos se guarda como texto JSON (como en `intermedios`).
+
+    Returns:
+        tuple: (pyarrow.Array, True si la columna se guardó como texto JSON).
+    """
+    tipos = {type(valor) for valor in valores if valor is not None}
+    tipos_arrow = {int: pa.int64(), float: pa.float64(), str: pa.string(), bool: pa.bool_()}
+    if len(tipos) <= 1 and tipos <= set(tipos_arrow):
+        try:
+            return pa.array(valores, type=tipos_arrow[tipos.pop()] if tipos else pa.null()), False
+        except (OverflowError, pa.ArrowException):
+            pass  # Por ejemplo, enteros que no caben en 64 bits
+    texto = [None if valor is None else json.dumps(valor, ensure_ascii=False) for valor in valores]
+    return pa.array(texto, type=pa.string()), True
+
+
+# Función para obtener una columna del índice sin copiarla
+def columna_mapeada(tabla, campo):
+    # El índice se escribe en un solo bloque: esa columna se usa tal cual, sobre las páginas mapeadas
+    columna = tabla.column(campo)
+    return columna.chunk(0) if columna.num_chunks == 1 else columna.combine_chunks()
+
+
+# Función para construir el índice persistente del catálogo de productos
+def construir_catalogo(productos_dict, ruta, huella):
+    """
+    Escribe el catálogo como un archivo Arrow IPC sin comprimir, que se lee mapeado en memoria
+    y sin copias: una fila por EAN ordenada por el hash del EAN y una columna tipada por campo
+    (Costo de Reposicion y cada columna de valuación).
+
+    Args:
+        productos_dict (dict): Productos indexados por EAN.
+        ruta (str): La ruta del índice.
+        huella (dict): La huella del archivo de origen (`huella_origen`).
+    """
+    claves = list(productos_dict)
+    hashes = np.fromiter((hash_clave(clave) for clave in claves), dtype=np.uint64, count=len(claves))
+    orden = np.lexsort((np.asarray(claves, dtype=object), hashes))
+    productos = [productos_dict[claves[posicion]] for posicion in orden]
+    campos = list(dict.fromkeys(campo for producto in productos for campo in producto))
+
+    columnas = {CAMPO_CLAVE: pa.array([claves[posicion] for posicion in orden], type=pa.string()),
+                CAMPO_HASH: pa.array(hashes[orden], type=pa.uint64())}
+    columnas_json = []
+    for campo in campos:
+        columnas[campo], es_json = columna_arrow([producto.get(campo) for producto in productos])
+        if es_json:
+            columnas_json.append(campo)
+    tabla = pa.table(columnas)
+    metadatos = {CLAVE_METADATOS: json.dumps(huella).encode("utf-8"),
+                 intermedios.CLAVE_COLUMNAS_JSON: json.dumps(columnas_json).encode("utf-8")}
+    tabla = tabla.replace_schema_metadata(metadatos)
+
+    # Se escribe en un archivo temporal y se reemplaza, para que nadie mapee un índice a medias
+    temporal = f"{ruta}.{os.getpid()}.tmp"
+    try:
+        with pa.OSFile(temporal, "wb") as archivo, pa.ipc.new_file(archivo, tabla.schema) as escritor:
+            escritor.write_table(tabla, max_chunksize=max(len(tabla), 1))
+        os.replace(temporal, ruta)
+    finally:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+
+
+# Función para abrir el índice persistente del catálogo de productos
+def abrir_catalogo(ruta, huella=None):
+    """
+    Args:
+        ruta (str): La ruta del índice.
+        huella (dict, opcional): Si se indica, el índice solo se usa si fue construido a partir
+            de un archivo con esa huella.
+
+    Returns:
+        CatalogoMapeado: El catálogo, o None si no existe, no es válido o está desactualizado.
+    """
+    if not os.path.isfile(ruta):
+        return None
+    try:
+        tabla = pa.ipc.open_file(pa.memory_map(ruta, "r")).read_all()
+    except (OSError, pa.ArrowException):
+        return None
+    metadatos = tabla.schema.metadata or {}
+    if huella is not None and json.loads(metadatos.get(CLAVE_METADATOS, b"null")) != huella:
+        return None
+    return CatalogoMapeado(tabla, ruta)
+
+
+class CatalogoMapeado(Mapping):
+    """
+    Catálogo de productos leído de su índice persistente, mapeado en memoria: los datos no se
+    copian ni se decodifican al abrirlo, y varios procesos (o ejecuciones) que lo abren comparten
+    las mismas páginas del archivo.
+
+    Los EAN se buscan por búsqueda binaria sobre el hash de 64 bits de cada EAN (ordenado); las
+    colisiones de hash se resuelven comparando el EAN.
+
+    Se puede usar como un diccionario EAN -> producto (dict): cada producto se arma al pedirlo,
+    leyendo su fila de las columnas mapeadas (los campos que un producto no tenía aparecen con
+    None, lo mismo que devuelve `.get(campo)`). Se recuerda, en una caché LRU de
+    POSICIONES_EN_CACHE EAN, la posición de los últimos EAN buscados (incluidos los que no
+    existen), nunca los productos armados. Armar el producto completo en cada venta es lento, así
+    que el motor por registro pide solo el campo que usa con `valor` (a través de
+    `valor_producto`), que recuerda en otra caché LRU los últimos VALORES_EN_CACHE valores
+    leídos; el motor vectorizado usa `ubicar` y `valores_en`, que trabajan por lotes sobre las
+    columnas.
+
+    Al serializarse (por ejemplo, para un proceso trabajador) solo se envía la ruta del índice.
+    """
+
+    def __init__(self, tabla, ruta):
+        self.tabla = tabla
+        self.ruta = ruta
+        self.columnas_json = set(intermedios.columnas_json_de(tabla.schema))
+        self.campos = [campo for campo in tabla.column_names if campo not in (CAMPO_CLAVE, CAMPO_HASH)]
+        self._claves = columna_mapeada(tabla, CAMPO_CLAVE)
+        self._hashes = columna_mapeada(tabla, CAMPO_HASH).to_numpy(zero_copy_only=True)
+        self._vista_hashes = memoryview(self._hashes)  # Sus elementos se leen como int de Python
+        self._columnas = [(campo, columna_mapeada(tabla, campo)) for campo in self.campos]
+        self.posicion = lru_cache(maxsize=POSICIONES_EN_CACHE)(self._buscar_posicion)
+        self._indices_campos = {campo: indice for indice, campo in enumerate(self.campos)}
+        self._valor = lru_cache(maxsize=VALORES_EN_CACHE)(self._leer_valor)
+
+    def __reduce__(self):
+        return abrir_catalogo, (self.ruta,)
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def __iter__(self):
+        for clave in self._claves:
+            yield clave.as_py()
+
+    def __getitem__(self, clave):
+        posicion = self.posicion(clave)
+        if posicion < 0:
+            raise KeyError(clave)
+        return self.producto_en(posicion)
+
+    # Se redefinen `get` y `in` (que `Mapping` resuelve con __getitem__ y KeyError) porque el
+    # motor por registro los llama una o dos veces por venta
+    def get(self, clave, predeterminado=None):
+        posicion = self.posicion(clave)
+        return predeterminado if posicion < 0 else self.producto_en(posicion)
+
+    def __contains__(self, clave):
+        return self.posicion(clave) >= 0
+
+    # Función para obtener un campo de un producto sin armar el producto completo
+    def valor(self, clave, campo, predeterminado=None):
+        """
+        Returns:
+            El valor del campo del producto con ese EAN; `predeterminado` si el EAN no existe o
+            el catálogo no tiene el campo, y None si el producto no tenía el campo.
+        """
+        if campo not in self._indices_campos:
+            return predeterminado if self.posicion(clave) < 0 else None
+        encontrado, valor = self._valor(clave, campo)
+        return valor if encontrado else predeterminado
+
+    # Función para leer un campo de un producto (a través de la caché `_valor`)
+    def _leer_valor(self, clave, campo):
+        """
+        Returns:
+            tuple: (True si el EAN existe, el valor del campo).
+        """
+        posicion = self.posicion(clave)
+        if posicion < 0:
+            return False, None
+        columna = self._columnas[self._indices_campos[campo]][1]
+        return True, self._decodificar(campo, columna[posicion].as_py())
+
+    # Función para armar el producto de una posición del índice
+    def producto_en(self, posicion):
+        return {campo: self._decodificar(campo, columna[posicion].as_py()) for campo, columna in self._columnas}
+
+    # Función para decodificar el valor de un campo guardado como texto JSON
+    def _decodificar(self, campo, valor):
+        return json.loads(valor) if valor is not None and campo in self.columnas_json else valor
+
+    # Función para buscar la posición de un EAN (a través de la caché `posicion`)
+    def _buscar_posicion(self, clave):
+        """
+        Returns:
+            int: La posición del EAN en el índice, o -1 si no existe.
+        """
+        # Igual que `ubicar` con un solo EAN, pero sin arreglos ni escalares de numpy, que cuestan
+        # más que la búsqueda misma (se llama una vez por EAN distinto)
+        if not isinstance(clave, str):
+            return -1
+        valor_hash = hash_clave(clave)
+        hashes = self._vista_hashes
+        candidata = bisect_left(hashes, valor_hash)
+        while candidata < len(hashes) and hashes[candidata] == valor_hash:
+            if self._claves[candidata].as_py() == clave:
+                return candidata
+            candidata += 1
+        return -1
+
+    # Función para ubicar varios EAN a la vez
+    def ubicar(self, claves):
+        """
+        Args:
+            claves (array-like): Los EAN a buscar.
+
+        Returns:
+            numpy.ndarray: La posición de cada EAN en el índice, o -1 si no existe.
+        """
+        claves = list(claves)
+        posiciones = np.full(len(claves), -1, dtype=np.int64)
+        buscables = [indice for indice, clave in enumerate(claves) if isinstance(clave, str)]
+        if not buscables or not len(self._hashes):
+            return posiciones
+        hashes = np.fromiter((hash_clave(claves[indice]) for indice in buscables), dtype=np.uint64, count=len(buscables))
+        candidatas = np.searchsorted(self._hashes, hashes, side="left")
+        for indice, candidata, valor_hash in zip(buscables, candidatas.tolist(), hashes.tolist()):
+            # Se recorren las filas con el mismo hash (más de una solo si hay colisiones)
+            while candidata < len(self._hashes) and int(self._hashes[candidata]) == valor_hash:
+                if self._claves[candidata].as_py() == claves[indice]:
+                    posiciones[indice] = candidata
+                    break
+                candidata += 1
+        return posiciones
+
+    # Función para obtener un campo de los productos en las posiciones dadas
+    def valores_en(self, campo, posiciones, predeterminado=None):
+        """
+        Obtiene el campo solo de los productos distintos que aparecen en `posiciones`.
+
+        Args:
+            campo (str): El campo del producto (por ejemplo "Costo de Reposicion").
+            posiciones (numpy.ndarray): Posición de cada producto, o -1 si no existe.
+            predeterminado: Valor para las posiciones -1. Los productos sin el campo dan None.
+
+        Returns:
+            tuple: (posiciones locales, valores): `valores[posiciones locales]` es el campo de
+            cada posición pedida; el último valor es el predeterminado.
+        """
+        posiciones = np.asarray(posiciones, dtype=np.int64)
+        encontradas = posiciones >= 0
+        distintas, inversa = np.unique(posiciones[encontradas], return_inverse=True)
+        valores = np.empty(len(distintas) + 1, dtype=object)
+        if campo in self.campos and len(distintas):
+            columna = self.tabla.column(campo).take(pa.array(distintas))
+            valores[:-1] = [self._decodificar(campo, valor) for valor in columna.to_pylist()]
+        valores[-1] = predeterminado
+        locales = np.full(len(posiciones), -1, dtype=np.int64)
+        locales[encontradas] = inversa.reshape(-1)
+        return locales, valores
+
+
+# Función para obtener un campo de un producto del catálogo, mapeado o en memoria
+def valor_producto(productos, clave, campo, predeterminado=None):
+    """
+    Args:
+        productos (CatalogoMapeado | dict): El catálogo de productos indexado por EAN.
+        clave (str): El EAN.
+        campo (str): El campo del producto (por ejemplo "Costo de Reposicion").
+        predeterminado: Valor si el EAN no existe. Los productos sin el campo dan None.
+    """
+    if isinstance(productos, CatalogoMapeado):
+        return productos.valor(clave, campo, predeterminado)
+    producto = productos.get(clave, None)
+    return predeterminado if producto is None else producto.get(campo, None)
+
+
+# Función para obtener el catálogo de productos, construyendo su índice si hace falta
+def obtener_catalogo(ruta_productos, cargar_productos):
+    """
+    Abre el índice persistente del catálogo si está al día con el archivo de productos; si no,
+    carga los productos, construye el índice y lo abre.
+
+    Args:
+        ruta_productos (str): La ruta del archivo de productos, ya resuelta con `intermedios.resolver_ruta`.
+        cargar_productos (callable): Función sin argumentos que devuelve los productos indexados
+            por EAN (dict); se llama solo si hay que construir el índice.
+
+    Returns:
+        CatalogoMapeado | dict: El catálogo mapeado o, si el índice no se puede escribir, el
+        diccionario de productos. Vacío o None si los productos no se pudieron cargar.
+    """
+    if not os.path.isfile(ruta_productos):
+        return cargar_productos()
+    ruta = ruta_catalogo(ruta_productos)
+    huella = huella_origen(ruta_productos)
+    catalogo = abrir_catalogo(ruta, huella)
+    if catalogo is not None:
+        logging.info(f"Catálogo de productos mapeado desde: {ruta} ({len(catalogo)} productos)")
+        return catalogo
+
+    productos_dict = cargar_productos()
+    if not productos_dict:
+        return productos_dict
+    try:
+        construir_catalogo(productos_dict, ruta, huella)
+    except (OSError, TypeError, ValueError, pa.ArrowException) as e:
+        logging.warning(f"No se pudo guardar el índice del catálogo en {ruta}: {e}. Se usa el catálogo en memoria.")
+        return productos_dict
+    logging.info(f"Índice del catálogo de productos guardado en: {ruta}")
+    return abrir_catalogo(ruta) or productos_dict
@@ -0,0 +1,177 @@
+import queue
+import threading
+
+ESPERA_COLA = 0.1  # Segundos entre comprobaciones mientras se espera lugar en una cola llena.
+_FIN = object()  # Marca el final de los elementos de una cola.
+_CANCELAR = object()  # Marca que los elementos de una cola no se terminaron de generar.
+
+
+class ErrorLectura(Exception):
+    """Error al recorrer el iterable de una `LecturaAnticipada` (la causa queda en __cause__)."""
+
+
+class EscrituraCancelada(Exception):
+    """Los elementos de una `EscrituraEnSegundoPlano` no se terminaron de generar."""
+
+
+# Función para poner un valor en una cola acotada mientras `seguir()` sea verdadero
+def _poner(cola, valor, seguir):
+    """
+    Returns:
+        bool: True si el valor se puso en la cola; False si `seguir()` dejó de ser verdadero antes.
+    """
+    while seguir():
+        try:
+            cola.put(valor, timeout=ESPERA_COLA)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+class LecturaAnticipada:
+    """
+    Recorre un iterable en un hilo aparte, hasta `capacidad` elementos por delante de quien lo
+    consume. El hilo empieza a leer al crear el objeto, así que la lectura de un archivo avanza
+    mientras el hilo principal hace otra cosa (por ejemplo, cargar los catálogos). La lectura de
+    Parquet, la descompresión y la E/S ocurren en buena parte sin el GIL.
+
+    Se usa como context manager: al salir el hilo se detiene aunque no se haya consumido todo.
+    """
+
+    def __init__(self, elementos, capacidad=2, nombre="lectura-anticipada"):
+        """
+        Args:
+            elementos (iterable): Lo que se recorre en el hilo (por ejemplo, lotes de ventas).
+            capacidad (int): Cantidad máxima de elementos leídos y aún no consumidos.
+            nombre (str): El nombre del hilo.
+        """
+        self._cola = queue.Queue(capacidad)
+        self._detener = threading.Event()
+        self._hilo = threading.Thread(target=self._producir, args=(elementos,), name=nombre, daemon=True)
+        self._hilo.start()
+
+    # Función que ejecuta el hilo: recorre los elementos y los pone en la cola
+    def _producir(self, elementos):
+        seguir = lambda: not self._detener.is_set()
+        try:
+            for elemento in elementos:
+                if not _poner(self._cola, (elemento, None), seguir):
+                    return
+            _poner(self._cola, (_FIN, None), seguir)
+        except Exception as error:
+            _poner(self._cola, (_FIN, error), seguir)
+        finally:
+            # Cierra el generador (y sus archivos) si la lectura se detuvo antes de terminar
+            cerrar = getattr(elementos, "close", None)
+            if cerrar is not None:
+                cerrar()
+
+    def __iter__(self):
+        """
+        Yields:
+            Cada elemento, en el orden original.
+
+        Raises:
+            ErrorLectura: Si recorrer el iterable falló en el hilo.
+        """
+        while True:
+            elemento, error = self._cola.get()
+            if error is not None:
+                raise ErrorLectura(str(error)) from error
+            if elemento is _FIN:
+                return
+            yield elemento
+
+    # Función para detener el hilo y esperar a que termine
+    def cerrar(self):
+        self._detener.set()
+        self._hilo.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excepcion):
+        self.cerrar()
+
+
+class EscrituraEnSegundoPlano:
+    """
+    Ejecuta `escribir(elementos)` en un hilo aparte mientras el hilo que la crea genera los
+    elementos y los envía por grupos con `enviar`, de modo que la serialización, la compresión y
+    la E/S de la salida se superponen con el cálculo. Como mucho `capacidad` grupos esperan en cola.
+
+    Se usa como context manager: al salir se envía el final de los elementos y se espera a que la
+    escritura termine; su resultado queda en `resultado`. Si se sale por una excepción, la
+    escritura se cancela (`cancelar`) en lugar de terminarse, para no dejar una salida incompleta
+    que parezca completa.
+    """
+
+    def __init__(self, escribir, capacidad=4, nombre="escritura"):
+        """
+        Args:
+            escribir (callable): Recibe un iterable con todos los elementos y los escribe.
+            capacidad (int): Cantidad máxima de grupos enviados y aún no escritos.
+            nombre (str): El nombre del hilo.
+        """
+        self._cola = queue.Queue(capacidad)
+        self._error = None
+        self.resultado = None
+        self._hilo = threading.Thread(target=self._escribir, args=(escribir,), name=nombre, daemon=True)
+        self._hilo.start()
+
+    # Función que entrega al escritor los elementos de los grupos recibidos
+    def _elementos(self):
+        while (grupo := self._cola.get()) is not _FIN:
+            if grupo is _CANCELAR:
+                raise EscrituraCancelada("los elementos no se terminaron de generar")
+            yield from grupo
+
+    # Función que ejecuta el hilo
+    def _escribir(self, escribir):
+        try:
+            self.resultado = escribir(self._elementos())
+        except BaseException as error:
+            self._error = error
+
+    # Función para enviar un grupo de elementos al escritor
+    def enviar(self, grupo):
+        """
+        Returns:
+            bool: False si la escritura ya terminó (por ejemplo, por un error) y no recibe más elementos.
+        """
+        return _poner(self._cola, grupo, self._hilo.is_alive)
+
+    # Función para terminar la escritura
+    def terminar(self):
+        """
+        Returns:
+            Lo que devolvió `escribir`.
+
+        Raises:
+            Exception: La excepción de `escribir`, si falló.
+        """
+        _poner(self._cola, _FIN, self._hilo.is_alive)
+        self._hilo.join()
+        if self._error is not None:
+            raise self._error
+        return self.resultado
+
+    # Función para cancelar la escritura
+    def cancelar(self):
+        """
+        Hace que el iterable que recibió `escribir` lance EscrituraCancelada, así `escribir` no
+        cierra la salida como si tuviera todos los elementos, y espera a que el hilo termine. El
+        resultado o el error de `escribir` se descartan.
+        """
+        _poner(self._cola, _CANCELAR, self._hilo.is_alive)
+        self._hilo.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        if tipo is None:
+            self.terminar()
+        else:
+            self.cancelar()
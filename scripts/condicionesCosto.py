@@ -0,0 +1,158 @@
+import numpy as np
+
+# Mensajes de "Valor condicion Costo" que no son un cálculo
+VALOR_CONDICION_MONTO_FIJO = "Hola monto fijo"
+VALOR_CONDICION_NO_RECONOCIDA = "No especificado o no reconocido en tipo de condición de costo"
+
+# Campos que puede calcular una condición de costo ("Valor condicion Costo" siempre)
+CAMPOS_CONDICION = ("Costo Total", "Valor condicion Costo")
+
+
+class CondicionCosto:
+    """
+    Un tipo de condición de costo ("Tipo condicion costo") y la función que lo calcula.
+
+    La función recibe las ventas con esa condición (`VentasCondicion` o `VentaCondicion`) y
+    devuelve un diccionario con los campos de CAMPOS_CONDICION que calcula, en el orden en que se
+    agregan a cada venta. Se escribe con operaciones aritméticas, así que sirve igual para un lote
+    (arreglos de NumPy, motor vectorizado) que para una sola venta (números, motor por registro).
+    """
+
+    def __init__(self, tipo, calcular, financieros_previos=False):
+        """
+        Args:
+            tipo (str): El valor de "Tipo condicion costo".
+            calcular (callable): La función que calcula los campos de la condición.
+            financieros_previos (bool): Si es True, el motor por registro agrega los campos
+                financieros (Valor CAP, Costo con CAP, Valor Oferta y Total Beneficio) antes que
+                "Valor condicion Costo", como lo hacía cada rama de `calcular_condicion_costo`.
+        """
+        self.tipo = tipo
+        self.calcular = calcular
+        self.financieros_previos = financieros_previos
+
+
+CONDICIONES = {}  # "Tipo condicion costo" -> CondicionCosto
+
+
+# Función para registrar un tipo de condición de costo
+def registrar_condicion(tipo, financieros_previos=False):
+    """
+    Decorador que registra la función como el cálculo de una condición de costo. Agregar un tipo
+    de condición nuevo es registrar su función; los dos motores la usan.
+
+    Args:
+        tipo (str): El valor de "Tipo condicion costo".
+        financieros_previos (bool): Ver `CondicionCosto`.
+    """
+    def decorador(calcular):
+        CONDICIONES[tipo] = CondicionCosto(tipo, calcular, financieros_previos)
+        return calcular
+    return decorador
+
+
+@registrar_condicion("% DESCUENTO SOBRE COSTO")
+def descuento_sobre_costo(ventas):
+    costo_total = ventas.piezas * ventas.valuacion
+    return {"Costo Total": costo_total, "Valor condicion Costo": costo_total - ventas.descuento}
+
+
+@registrar_condicion("Costo Fijo", financieros_previos=True)
+def costo_fijo(ventas):
+    return {"Valor condicion Costo": 0}
+
+
+@registrar_condicion("Monto Fijo", financieros_previos=True)
+def monto_fijo(ventas):
+    return {"Valor condicion Costo": VALOR_CONDICION_MONTO_FIJO}
+
+
+class VentaCondicion:
+    """
+    Los valores de una venta (dict) que usan las condiciones de costo, convertidos a float recién
+    cuando una condición los pide, igual que en el cálculo original por venta.
+    """
+
+    __slots__ = ("elemento",)
+
+    def __init__(self, elemento):
+        self.elemento = elemento
+
+    @property
+    def piezas(self):
+        return float(self.elemento.get("Pzas Facturadas", 1))  # 1 si no existe
+
+    @property
+    def valuacion(self):
+        return float(self.elemento.get("Valor Tipo de Valuacion", 0.0))
+
+    @property
+    def descuento(self):
+        descuento = self.elemento.get("Descuento Factura")
+        return 0.0 if descuento is None else float(descuento)
+
+
+class VentasCondicion:
+    """
+    Los valores de las ventas de un lote que usan las condiciones de costo, como arreglos de
+    float: Pzas Facturadas (1 si es nulo), Valor Tipo de Valuacion y Descuento Factura (0 si es nulo).
+    """
+
+    __slots__ = ("piezas", "valuacion", "descuento")
+
+    def __init__(self, piezas, valuacion, descuento):
+        self.piezas = piezas
+        self.valuacion = valuacion
+        self.descuento = descuento
+
+    # Función para tomar solo algunas ventas del lote
+    def filtrar(self, mascara):
+        return VentasCondicion(self.piezas[mascara], self.valuacion[mascara], self.descuento[mascara])
+
+
+# Función para calcular las condiciones de costo de un lote, agrupado por tipo de condición
+def calcular_condiciones(tipo_condicion, aplica, ventas, costo_total):
+    """
+    Aplica a cada grupo de ventas con el mismo tipo de condición la función registrada, en una
+    sola pasada por grupo.
+
+    Args:
+        tipo_condicion (numpy.ndarray): El "Tipo condicion costo" de cada venta.
+        aplica (numpy.ndarray): Máscara de las ventas con oferta vigente (las que reciben la condición).
+        ventas (VentasCondicion): Los valores de cada venta que usan las condiciones.
+        costo_total (numpy.ndarray): El Costo Total que traía cada venta (NaN si no tenía).
+
+    Returns:
+        tuple: (valor condición, costo total, con costo total, reconocida): "Valor condicion
+        Costo" de cada venta, el Costo Total (el calculado o el que traía), la máscara de las
+        ventas cuya condición calculó el Costo Total y la de las ventas con una condición registrada.
+    """
+    n = len(tipo_condicion)
+    valor_condicion = np.full(n, VALOR_CONDICION_NO_RECONOCIDA, dtype=object)
+    costo_total = costo_total.copy()
+    con_costo_total = np.zeros(n, dtype=bool)
+    reconocida = np.zeros(n, dtype=bool)
+    for tipo, condicion in CONDICIONES.items():
+        mascara = aplica & (tipo_condicion == tipo)
+        if not mascara.any():
+            continue
+        reconocida |= mascara
+        campos = condicion.calcular(ventas.filtrar(mascara))
+        valor_condicion[mascara] = campos["Valor condicion Costo"]
+        if "Costo Total" in campos:
+            costo_total[mascara] = campos["Costo Total"]
+            con_costo_total |= mascara
+    return valor_condicion, costo_total, con_costo_total, reconocida
+
+
+# Función para calcular los campos financieros (el encadenamiento CAP -> OFERTA)
+def calcular_financieros(cap, oferta, costo_total):
+    """
+    Returns:
+        tuple: (Valor CAP, Costo con CAP, Valor Oferta, Total Beneficio), como números o
+        arreglos según lo que se reciba.
+    """
+    valor_cap = cap * costo_total
+    costo_con_cap = costo_total - valor_cap
+    valor_oferta = costo_con_cap * oferta
+    return valor_cap, costo_con_cap, valor_oferta, valor_cap + valor_oferta
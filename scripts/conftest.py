@@ -0,0 +1,15 @@
+import os
+
+import pytest
+
+
+# Los scripts escriben en carpetas relativas al directorio actual (logs/ al importar
+# funcionesFinal, Json/ al importar generarJson): las pruebas corren en una carpeta temporal
+@pytest.fixture(scope="session", autouse=True)
+def carpeta_trabajo(tmp_path_factory):
+    carpeta = tmp_path_factory.mktemp("trabajo")
+    os.makedirs(carpeta / "logs")
+    anterior = os.getcwd()
+    os.chdir(carpeta)
+    yield carpeta
+    os.chdir(anterior)
@@ -0,0 +1,198 @@
+import os
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+import intermedios
+import serializacion
+
+# Dimensiones y medidas del cubo de beneficio. Las medidas son sumas (y la cantidad de ventas),
+# así que el cubo de varias ejecuciones, lotes o procesos se combina sumando celda a celda.
+DIMENSIONES = ["RETAIL PAGO", "Llave", "Tipo de Valuacion", "Mes"]
+MEDIDAS = ["Total Beneficio", "Valor CAP", "Valor Oferta"]
+CAMPO_VENTAS = "Ventas"  # Cantidad de ventas de cada celda.
+SIN_RETAIL_PAGO = "sin_retail_pago"  # RETAIL PAGO de las ventas sin ACCOUNT_NUMBER (con la Llave que traen).
+
+# Resúmenes que se derivan del cubo (nombre de la hoja de Excel -> dimensiones del resumen)
+RESUMENES = {
+    "Por RETAIL PAGO": ["RETAIL PAGO", "Mes"],
+    "Por Llave": ["RETAIL PAGO", "Llave", "Mes"],
+    "Por Tipo de Valuacion": ["Tipo de Valuacion", "Mes"],
+    "Detalle": DIMENSIONES,
+}
+SUFIJO_CUBO = "_cubo"  # El cubo se guarda junto a la salida final: sell_out_final_cubo.parquet
+
+
+# Función para obtener el mes ("AAAA-MM") de un ordinal de día
+def mes_de_ordinal(ordinal):
+    fecha = date.fromordinal(ordinal)
+    return f"{fecha.year:04d}-{fecha.month:02d}"
+
+
+# Función para obtener la ruta del cubo que acompaña a un archivo de salida
+def ruta_cubo(ruta_salida):
+    if intermedios.es_indice(ruta_salida):
+        # Salida particionada (procesamiento incremental): sell_out_final.indice.json
+        return ruta_salida[:-len(intermedios.EXTENSION_INDICE)] + SUFIJO_CUBO + intermedios.EXTENSIONES["parquet"]
+    base, extension = os.path.splitext(ruta_salida)
+    if extension in serializacion.EXTENSIONES_COMPRESION.values():
+        base = os.path.splitext(base)[0]
+    return base + SUFIJO_CUBO + intermedios.EXTENSIONES["parquet"]
+
+
+class CuboBeneficio:
+    """
+    Agregado de Total Beneficio, Valor CAP y Valor Oferta por RETAIL PAGO, Llave, Tipo de
+    Valuacion y mes, que el enriquecimiento mantiene mientras procesa las ventas. Solo cuentan
+    las ventas con campos financieros (las que tienen Total Beneficio).
+
+    Cada celda guarda [ventas, Total Beneficio, Valor CAP, Valor Oferta]. Como todas las medidas
+    son aditivas, el cubo de ventas nuevas se combina con uno guardado sin recalcular nada.
+    """
+
+    def __init__(self):
+        self.celdas = {}  # (RETAIL PAGO, Llave, Tipo de Valuacion, Mes) -> [ventas, medidas...]
+        self._meses = {}  # Ordinal de día -> mes, para no formatear cada fecha
+
+    # Función para sumar una venta al cubo (motor por registro)
+    def agregar(self, retail_pago, llave, tipo_valuacion, fecha_ordinal, elemento):
+        """
+        Args:
+            retail_pago (str): El RETAIL PAGO del cliente, o SIN_RETAIL_PAGO.
+            llave (str): La Llave de la venta.
+            tipo_valuacion (str): El Tipo de Valuacion de la venta, o None.
+            fecha_ordinal (int): El ordinal del día de la venta.
+            elemento (dict): La venta ya enriquecida, con los campos de MEDIDAS.
+        """
+        mes = self._meses.get(fecha_ordinal)
+        if mes is None:
+            mes = self._meses[fecha_ordinal] = mes_de_ordinal(fecha_ordinal)
+        clave = (retail_pago, llave, tipo_valuacion, mes)
+        celda = self.celdas.get(clave)
+        if celda is None:
+            celda = self.celdas[clave] = [0, 0.0, 0.0, 0.0]
+        celda[0] += 1
+        celda[1] += elemento["Total Beneficio"]
+        celda[2] += elemento["Valor CAP"]
+        celda[3] += elemento["Valor Oferta"]
+
+    # Función para sumar un lote de ventas al cubo (motores vectorizado y compacto)
+    def agregar_columnas(self, dimensiones, medidas):
+        """
+        Agrupa las ventas del lote por sus códigos de dimensión con NumPy y suma cada grupo a
+        su celda.
+
+        Args:
+            dimensiones (list): Por cada dimensión de DIMENSIONES, una tupla (códigos, valores):
+                el código de cada venta (-1 para nulo) y los valores distintos.
+            medidas (list): Por cada medida de MEDIDAS, el arreglo con el valor de cada venta.
+        """
+        if not len(medidas[0]):
+            return
+        combinado = np.zeros(len(medidas[0]), dtype=np.int64)
+        for codigos, valores in dimensiones:
+            combinado = combinado * (len(valores) + 1) + (np.asarray(codigos, dtype=np.int64) + 1)
+        claves, inversa = np.unique(combinado, return_inverse=True)
+        inversa = inversa.reshape(-1)
+        ventas = np.bincount(inversa, minlength=len(claves)).tolist()
+        sumas = [np.bincount(inversa, weights=valores, minlength=len(claves)).tolist() for valores in medidas]
+
+        # Cada clave combinada se vuelve a separar en el valor de cada dimensión
+        restos = claves.copy()
+        columnas = []
+        for codigos, valores in reversed(dimensiones):
+            base = len(valores) + 1
+            opciones = np.append(np.asarray([None], dtype=object), np.asarray(valores, dtype=object))
+            columnas.append(opciones[restos % base].tolist())
+            restos //= base
+        for clave, valores in zip(zip(*reversed(columnas)), zip(ventas, *sumas)):
+            self.combinar_celda(clave, valores)
+
+    # Función para quitar del cubo todas las celdas de algunos meses
+    def descartar_meses(self, meses):
+        meses = set(meses)
+        self.celdas = {clave: valores for clave, valores in self.celdas.items() if clave[3] not in meses}
+
+    # Función para combinar otro cubo con este
+    def combinar(self, otro):
+        for clave, valores in otro.celdas.items():
+            self.combinar_celda(clave, valores)
+
+    # Función para sumar una celda al cubo
+    def combinar_celda(self, clave, valores):
+        celda = self.celdas.get(clave)
+        if celda is None:
+            self.celdas[clave] = list(valores)
+        else:
+            for indice, valor in enumerate(valores):
+                celda[indice] += valor
+
+    def __len__(self):
+        return len(self.celdas)
+
+    # Función para obtener el cubo como tabla
+    def tabla(self):
+        """
+        Returns:
+            pandas.DataFrame: Una fila por celda, con las DIMENSIONES, Ventas y las MEDIDAS,
+            ordenada por las dimensiones.
+        """
+        filas = [list(clave) + valores for clave, valores in self.celdas.items()]
+        df = pd.DataFrame(filas, columns=DIMENSIONES + [CAMPO_VENTAS] + MEDIDAS)
+        df[CAMPO_VENTAS] = df[CAMPO_VENTAS].astype(np.int64)
+        return df.sort_values(DIMENSIONES, na_position="first", ignore_index=True)
+
+    # Función para obtener un resumen del cubo por algunas dimensiones
+    def resumen(self, dimensiones):
+        """
+        Args:
+            dimensiones (list): Las dimensiones que se conservan; las demás se suman.
+
+        Returns:
+            pandas.DataFrame: El resumen, ordenado por las dimensiones.
+        """
+        df = self.tabla()
+        if list(dimensiones) == DIMENSIONES:
+            return df
+        resumen = df.groupby(list(dimensiones), dropna=False, sort=True)[[CAMPO_VENTAS] + MEDIDAS].sum()
+        return resumen.reset_index()
+
+    # Función para crear un cubo a partir de su tabla
+    @classmethod
+    def desde_registros(cls, registros):
+        """
+        Args:
+            registros (list): Las filas de la tabla del cubo (dict), como las guarda `guardar_cubo`.
+        """
+        cubo = cls()
+        for registro in registros:
+            clave = tuple(None if intermedios.es_nulo(registro.get(campo)) else registro[campo] for campo in DIMENSIONES)
+            valores = [int(registro[CAMPO_VENTAS])] + [float(registro[campo]) for campo in MEDIDAS]
+            cubo.combinar_celda(clave, valores)
+        return cubo
+
+
+# Función para guardar el cubo como tabla Parquet
+def guardar_cubo(cubo, ruta):
+    """
+    Args:
+        cubo (CuboBeneficio): El cubo a guardar.
+        ruta (str): La ruta del archivo (`ruta_cubo`).
+
+    Returns:
+        str: La ruta del archivo escrito.
+    """
+    base = os.path.splitext(ruta)[0]
+    return intermedios.guardar_tabla(cubo.tabla(), base, "parquet")
+
+
+# Función para cargar un cubo guardado
+def cargar_cubo(ruta):
+    """
+    Returns:
+        CuboBeneficio: El cubo guardado, o un cubo vacío si el archivo no existe.
+    """
+    if not os.path.isfile(ruta):
+        return CuboBeneficio()
+    return CuboBeneficio.desde_registros(intermedios.cargar_registros(ruta))
@@ -0,0 +1,184 @@
+import os
+from datetime import date
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import intermedios  # Los catálogos y las ventas se escriben como los genera generarJson.py.
+
+# Datos sintéticos con la misma forma que los archivos reales, para medir el pipeline sin datos de clientes.
+RETAILS = ["BENAVIDES", "AHORRO", "GUADALAJARA", "SAN PABLO", "YZA", "ROMA", "NADRO", "FANASA"]
+TIPOS_CONDICION_COSTO = ["% DESCUENTO SOBRE COSTO", "Costo Fijo", "Monto Fijo"]
+REGLAS = ["Costo de Reposicion", "Precio Farmacia", "Precio Publico", "Costo Fijo"]
+EAN_BASE = 7_500_000_000_000
+INICIO_ANIO = date(2024, 1, 1).toordinal()
+DIAS_ANIO = 366
+TAMANO_BLOQUE = 1_000_000  # Ventas que se generan y escriben a la vez.
+PROPORCION_DESCONOCIDOS = 0.05  # Ventas con un producto o cliente que no está en los catálogos.
+
+# Función para limitar un valor a un rango
+def _limitar(valor, minimo, maximo):
+    return max(minimo, min(valor, maximo))
+
+# Función para calcular el tamaño de los catálogos según la cantidad de ventas
+def dimensiones(filas_ventas):
+    """
+    Calcula el tamaño de cada archivo para una cantidad de ventas, con proporciones parecidas
+    a las de los archivos reales.
+
+    Returns:
+        dict: Cantidad de productos, clientes y llaves (RETAIL + EAN) con negociación.
+    """
+    productos = _limitar(filas_ventas // 1_000, 200, 20_000)
+    return {
+        "productos": productos,
+        "clientes": _limitar(filas_ventas // 200, 200, 20_000),
+        # Alrededor de un tercio de los pares RETAIL + EAN tiene negociación
+        "llaves": _limitar(productos * len(RETAILS) // 3, 100, 12_000),
+    }
+
+# Función para generar los códigos de producto
+def _codigos(indices):
+    # 'Producto Código' es el EAN seguido de dos dígitos; funcionesFinal.py los quita con [:-2]
+    return np.char.add((EAN_BASE + indices).astype(str), "01")
+
+# Función para generar el catálogo de productos
+def generar_catalogo(rng, productos):
+    costo = np.round(rng.uniform(5, 500, productos), 2)
+    return pd.DataFrame({
+        "Producto Código": _codigos(np.arange(productos)),
+        "Nombre": [f"ARTICULO {indice}" for indice in range(productos)],
+        "Costo de Reposicion": costo,
+        "Precio Farmacia": np.round(costo * rng.uniform(1.05, 1.3, productos), 2),
+        "Precio Publico": np.round(costo * rng.uniform(1.3, 1.8, productos), 2),
+    })
+
+# Función para generar los clientes aplicables
+def generar_clientes(rng, clientes):
+    return pd.DataFrame({
+        "NUMERO FARMACIA": (100_000 + np.arange(clientes)).astype(str),
+        "Aplica": rng.choice(["Si", "No"], clientes, p=[0.8, 0.2]),
+        "RETAIL PAGO": rng.choice(RETAILS, clientes),
+    })
+
+# Función para generar las negociaciones
+def generar_negociaciones(rng, llaves, productos):
+    """
+    Genera las negociaciones como las trae enf.xlsx: por cada llave (RETAIL + EAN) de una a tres
+    ventanas de vigencia dentro del año, y por cada ventana un registro con Folio caso 1 (CAP) y
+    otro con Folio caso 2 (Oferta). Entre ventanas quedan días sin vigencia.
+
+    Returns:
+        pandas.DataFrame: Las negociaciones, con las columnas de la hoja de Excel.
+    """
+    pares = rng.choice(productos * len(RETAILS), llaves, replace=False)
+    ventanas = rng.integers(1, 4, llaves)
+    # Una fila por llave, ventana y folio de caso
+    por_llave = np.repeat(np.arange(llaves), ventanas)
+    ventana = np.arange(len(por_llave)) - np.repeat(np.cumsum(ventanas) - ventanas, ventanas)
+    duracion = DIAS_ANIO // ventanas[por_llave]
+    inicio = INICIO_ANIO + ventana * duracion
+    fin = inicio + duracion - 15
+    filas = np.repeat(np.arange(len(por_llave)), 2)
+    folio_caso = np.tile([1, 2], len(por_llave))
+    llave = por_llave[filas]
+    n = len(filas)
+
+    def fechas(ordinales):
+        return pd.to_datetime(ordinales - date(1970, 1, 1).toordinal(), unit="D")
+
+    return pd.DataFrame({
+        "Folio": rng.integers(1, 100_000, llaves)[llave],
+        "Folio caso": folio_caso,
+        "Tipo condicion": rng.choice(["SELL-OUT", "SELL-IN"], llaves, p=[0.85, 0.15])[llave],
+        "Nombre alias": np.array(RETAILS)[pares % len(RETAILS)][llave],
+        "Sivec": _codigos(pares // len(RETAILS))[llave],
+        "Nombre Laboratorio": np.char.add("LABORATORIO ", (pares % 97).astype(str))[llave],
+        "Nombre articulo": np.char.add("ARTICULO ", (pares // len(RETAILS)).astype(str))[llave],
+        "Nombre cliente": rng.choice(np.array(["TODOS", "CLIENTE", None], dtype=object), n),
+        "Numero Cliente": rng.choice(np.array([0, 12345, None], dtype=object), n),
+        "Nombre subsegmento": rng.choice(np.array(["TODOS", "CADENAS", None], dtype=object), n),
+        "Nombre segmento": rng.choice(np.array(["TODOS", "MAYOREO", ""], dtype=object), n),
+        "Oferta costo": np.round(rng.uniform(0, 0.25, n), 3),
+        "Nombre regla": rng.choice(REGLAS, llaves)[llave],
+        "Costo Fijo": np.round(rng.uniform(1, 50, llaves), 2)[llave],
+        "Tipo condicion costo": rng.choice(TIPOS_CONDICION_COSTO, llaves)[llave],
+        "Fecha inicio vigencia": fechas(inicio[filas]),
+        "Fecha fin vigencia": fechas(fin[filas]),
+    })
+
+# Función para generar un bloque de ventas
+def generar_bloque_ventas(rng, inicio, filas, productos, clientes):
+    # Una parte de las ventas apunta a productos y clientes que no existen en los catálogos
+    producto = rng.integers(0, int(productos / (1 - PROPORCION_DESCONOCIDOS)), filas)
+    cliente = rng.integers(0, int(clientes / (1 - PROPORCION_DESCONOCIDOS)), filas)
+    descuento = np.round(rng.uniform(0, 10, filas), 2)
+    return pa.table({
+        "ID": pa.array(np.char.add("V", (inicio + np.arange(filas)).astype(str))),
+        "Producto Código": pa.array(_codigos(producto)),
+        "ACCOUNT_NUMBER": pa.array((100_000 + cliente).astype(str)),
+        "Fecha": pa.array(INICIO_ANIO + rng.integers(0, DIAS_ANIO, filas)),
+        "Pzas Facturadas": pa.array(rng.integers(1, 50, filas)),
+        "Descuento Factura": pa.array(descuento, mask=rng.random(filas) < 0.2),
+        "Venta neta": pa.array(np.round(rng.uniform(10, 5_000, filas), 2)),
+    })
+
+# Función para escribir las ventas por bloques
+def generar_ventas(rng, ruta, filas, productos, clientes):
+    """
+    Escribe `filas` ventas en Parquet, por bloques de TAMANO_BLOQUE, sin tenerlas todas en memoria.
+
+    Returns:
+        str: La ruta del archivo generado.
+    """
+    escritor = None
+    try:
+        for inicio in range(0, filas, TAMANO_BLOQUE):
+            bloque = generar_bloque_ventas(rng, inicio, min(TAMANO_BLOQUE, filas - inicio), productos, clientes)
+            if escritor is None:
+                escritor = pq.ParquetWriter(ruta, bloque.schema, compression=intermedios.COMPRESION_PARQUET)
+            escritor.write_table(bloque)
+    finally:
+        if escritor is not None:
+            escritor.close()
+    return ruta
+
+# Función para generar todos los archivos de entrada
+def generar_datos(carpeta, filas_ventas, semilla=0):
+    """
+    Genera en `carpeta` los archivos de entrada del pipeline:
+      - data/enf.xlsx: las negociaciones, de donde parte generarJson.py.
+      - Json/Catalogo_de_Productos.parquet, Json/Clientes_Aplicables.parquet y
+        Json/Base_Venta_detalle_Fanasa.parquet: las hojas de "Calculo Carnot.xlsx" ya convertidas,
+        como las deja generarJson.py (el Excel de ventas no se genera: no cabe en una hoja).
+
+    Args:
+        carpeta (str): La carpeta donde se generan los archivos.
+        filas_ventas (int): La cantidad de ventas.
+        semilla (int): Semilla del generador, para obtener siempre los mismos datos.
+
+    Returns:
+        dict: Las rutas generadas y la cantidad de filas de cada archivo.
+    """
+    rng = np.random.default_rng(semilla)
+    tamanos = dimensiones(filas_ventas)
+    carpeta_excel = os.path.join(carpeta, "data")
+    carpeta_json = os.path.join(carpeta, "Json")
+    os.makedirs(carpeta_excel, exist_ok=True)
+    os.makedirs(carpeta_json, exist_ok=True)
+
+    negociaciones = generar_negociaciones(rng, tamanos["llaves"], tamanos["productos"])
+    ruta_negociacion = os.path.join(carpeta_excel, "enf.xlsx")
+    negociaciones.to_excel(ruta_negociacion, index=False)
+
+    rutas = {
+        "negociacion": ruta_negociacion,
+        "productos": intermedios.guardar_tabla(generar_catalogo(rng, tamanos["productos"]),
+                                               os.path.join(carpeta_json, "Catalogo_de_Productos")),
+        "clientes": intermedios.guardar_tabla(generar_clientes(rng, tamanos["clientes"]),
+                                              os.path.join(carpeta_json, "Clientes_Aplicables")),
+        "ventas": generar_ventas(rng, os.path.join(carpeta_json, "Base_Venta_detalle_Fanasa.parquet"),
+                                 filas_ventas, tamanos["productos"], tamanos["clientes"]),
+    }
+    return {"rutas": rutas, "carpeta_json": carpeta_json, "negociaciones": len(negociaciones),
+            "ventas": filas_ventas, **tamanos}
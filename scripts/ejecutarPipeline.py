@@ -0,0 +1,307 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from graphlib import TopologicalSorter
+
+import almacenCatalogos
+import catalogoProductos
+import concurrencia
+import condicionesCosto
+import cuboBeneficio
+import estadoIncremental
+import fechas
+import funcionesFinal  # Configura el logging del pipeline (logs/funcionesFinal.log) al importarse.
+import generarExcel
+import generarJson
+import intermedios
+import lecturaExcel
+import metricas
+import motorVectorizado
+import particionesSalida
+import perfilado
+import puntosControl
+import serializacion
+
+# Etapas del pipeline y las etapas de las que depende cada una
+DEPENDENCIAS = {
+    "clientes": [],
+    "negociacion": [],
+    "ofertas": ["negociacion"],
+    "enriquecimiento": ["clientes", "ofertas"],
+    "excel": ["enriquecimiento"],
+}
+# Código de cada etapa: si cambia, la etapa se vuelve a ejecutar aunque sus datos no hayan cambiado.
+# Incluye todos los módulos que importa el script de la etapa, directa o indirectamente: un
+# módulo nuevo se agrega aquí en el mismo cambio que lo importa.
+CODIGO_ETAPAS = {
+    "clientes": [generarJson, lecturaExcel, almacenCatalogos, fechas, intermedios, metricas, perfilado, serializacion],
+    "negociacion": [generarJson, lecturaExcel, almacenCatalogos, fechas, intermedios, metricas, perfilado, serializacion],
+    "ofertas": [generarJson, lecturaExcel, almacenCatalogos, fechas, intermedios, metricas, perfilado, serializacion],
+    "enriquecimiento": [funcionesFinal, motorVectorizado, almacenCatalogos, catalogoProductos, concurrencia,
+                        condicionesCosto, cuboBeneficio, estadoIncremental, fechas, intermedios, metricas,
+                        particionesSalida, perfilado, puntosControl, serializacion],
+    "excel": [generarExcel, cuboBeneficio, fechas, intermedios, metricas, particionesSalida, perfilado, serializacion],
+}
+RUTA_ESTADO = os.path.join(generarJson.carpeta_data, "pipeline_estado.json")  # Huellas de la última ejecución.
+TAMANO_BLOQUE_HASH = 1 << 20  # Bytes que se leen a la vez al calcular el hash de un archivo.
+
+
+# Función para calcular el hash del contenido de un archivo
+def hash_archivo(ruta, hashes):
+    """
+    Calcula el SHA-256 del contenido de un archivo.
+
+    El hash de cada archivo se guarda junto con su tamaño y fecha de modificación; si ninguno de
+    los dos cambió desde la ejecución anterior, se reutiliza en lugar de volver a leer el archivo.
+
+    Args:
+        ruta (str): La ruta del archivo.
+        hashes (dict): Los hashes conocidos por ruta; se actualiza con el de este archivo.
+
+    Returns:
+        str: El hash en hexadecimal, o None si el archivo no existe.
+    """
+    if not os.path.isfile(ruta):
+        return None
+    estado = os.stat(ruta)
+    anterior = hashes.get(ruta)
+    if anterior and anterior["tamano"] == estado.st_size and anterior["mtime_ns"] == estado.st_mtime_ns:
+        return anterior["hash"]
+    sha = hashlib.sha256()
+    with open(ruta, "rb") as archivo:
+        while bloque := archivo.read(TAMANO_BLOQUE_HASH):
+            sha.update(bloque)
+    hashes[ruta] = {"tamano": estado.st_size, "mtime_ns": estado.st_mtime_ns, "hash": sha.hexdigest()}
+    return hashes[ruta]["hash"]
+
+
+# Función para calcular la huella de una etapa
+def huella_etapa(nombre, entradas, parametros, hashes):
+    """
+    Combina en un solo hash el contenido de las entradas de la etapa, el de su código y los
+    parámetros que cambian su resultado.
+    """
+    archivos = list(entradas) + [modulo.__file__ for modulo in CODIGO_ETAPAS[nombre]]
+    contenido = {
+        "parametros": parametros,
+        "archivos": {str(ruta): hash_archivo(str(ruta), hashes) for ruta in archivos},
+    }
+    return hashlib.sha256(json.dumps(contenido, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+# Función para obtener la ruta de un archivo intermedio de generarJson.py
+def ruta_intermedia(nombre, formato, formato_json=serializacion.FORMATO_PREDETERMINADO):
+    ruta = os.path.join(generarJson.carpeta_data, nombre + intermedios.EXTENSIONES[formato])
+    # Los JSON comprimidos llevan además la extensión de la compresión
+    return formato_json.ruta(ruta) if formato == "json" else ruta
+
+
+# Función para obtener el nombre de archivo (sin carpeta ni extensión) de una ruta de funcionesFinal.py
+def nombre_archivo(ruta):
+    nombre, extension = os.path.splitext(os.path.basename(ruta.replace("\\", "/")))
+    if extension in serializacion.EXTENSIONES_COMPRESION.values():
+        nombre = os.path.splitext(nombre)[0]
+    return nombre
+
+
+class Pipeline:
+    """
+    Ejecuta las etapas del pipeline (hojas de clientes, negociación, ofertas, enriquecimiento y
+    exportación a Excel) en el orden de sus dependencias.
+
+    Cada etapa tiene una huella: el hash del contenido de sus archivos de entrada y de su código,
+    más los parámetros que afectan su resultado. Si la huella es igual a la de la última ejecución
+    y sus salidas siguen existiendo, la etapa se omite. Cuando una etapa se ejecuta, sus salidas
+    cambian y con ellas la huella de las etapas que dependen de ella.
+
+    Las etapas que se ejecutan en la misma corrida se pasan los datos en memoria (negociaciones,
+    ofertas y hojas de clientes) en lugar de volver a leer los archivos intermedios.
+    """
+
+    def __init__(self, formato="parquet", streaming=False, motor="registro", workers=1, perfil=None, formato_json=None):
+        self.formato = formato
+        self.formato_json = formato_json or serializacion.FORMATO_PREDETERMINADO
+        self.opciones = {"streaming": streaming, "formato_salida": "json", "motor": motor, "workers": workers}
+        self.perfil = perfil or perfilado.INACTIVO
+        self.memoria = {}  # Datos que una etapa entrega a las siguientes en esta corrida
+
+        # funcionesFinal.py lee de las mismas rutas en las que generarJson.py escribe
+        self.rutas_enriquecimiento = {
+            "ventas": self.intermedia(nombre_archivo(funcionesFinal.RUTA_ARCHIVO)),
+            "productos": self.intermedia(nombre_archivo(funcionesFinal.RUTA_PRODUCTOS)),
+            "clientes": self.intermedia(nombre_archivo(funcionesFinal.RUTA_CLIENTES)),
+            "ofertas": self.intermedia(nombre_archivo(funcionesFinal.RUTA_OFERTAS)),
+        }
+        self.ruta_salida = os.path.join(generarJson.carpeta_data, "sell_out_final.json")
+        self.ruta_final = self.formato_json.ruta(self.ruta_salida)  # Con la extensión de la compresión
+        self.ruta_cubo = cuboBeneficio.ruta_cubo(self.ruta_salida)
+
+        self.estado = {"archivos": {}, "etapas": {}}
+        if os.path.isfile(RUTA_ESTADO):
+            with open(RUTA_ESTADO, "r", encoding="utf-8") as archivo:
+                self.estado = json.load(archivo)
+
+    # Función para obtener la ruta de un archivo intermedio con el formato del pipeline
+    def intermedia(self, nombre):
+        return ruta_intermedia(nombre, self.formato, self.formato_json)
+
+    # Función para obtener las entradas y parámetros de una etapa
+    def definicion(self, nombre):
+        """
+        Returns:
+            tuple: (archivos de entrada, parámetros que cambian el resultado de la etapa).
+        """
+        parametros = {"formato": self.formato}
+        if self.formato == "json":
+            parametros.update(self.formato_json.parametros())
+        if nombre == "clientes":
+            return [generarJson.archivo_clientes], parametros
+        if nombre == "negociacion":
+            return [generarJson.archivo_negociacion], parametros
+        if nombre == "ofertas":
+            return [self.intermedia("negociacion_sell-out")], parametros
+        if nombre == "enriquecimiento":
+            parametros = {clave: valor for clave, valor in self.opciones.items() if clave != "workers"}
+            parametros.update(self.formato_json.parametros())
+            return list(self.rutas_enriquecimiento.values()), parametros
+        return [self.ruta_final, self.ruta_cubo], {}
+
+    # Funciones de cada etapa: ejecutan el paso y devuelven los archivos que generaron
+    def ejecutar_clientes(self):
+        hojas = {}
+        rutas = generarJson.generar_json_clientes(generarJson.archivo_clientes, self.formato, hojas, self.formato_json)
+        if rutas is None:
+            raise RuntimeError("No se pudieron convertir las hojas de clientes.")
+        self.memoria["hojas"] = hojas
+        return rutas
+
+    def ejecutar_negociacion(self):
+        df = generarJson.generar_json_negociacion(generarJson.archivo_negociacion, generarJson.carpeta_data, self.formato,
+                                                  self.formato_json)
+        if df is None:
+            raise RuntimeError("No se pudo procesar el archivo de negociación.")
+        self.memoria["negociacion"] = df
+        return [self.intermedia(f"negociacion_{condicion}") for condicion in ("sell-in", "sell-out")]
+
+    def ejecutar_ofertas(self):
+        df = self.memoria.get("negociacion")
+        negociacion = df[df['Tipo condicion'] == 'SELL-OUT'] if df is not None else self.intermedia("negociacion_sell-out")
+        ofertas = generarJson.generar_json_ofertas(negociacion, self.formato, self.formato_json)
+        if ofertas is None:
+            raise RuntimeError("No se pudieron generar las ofertas.")
+        self.memoria["ofertas"] = ofertas
+        rutas = [self.intermedia(nombre) for nombre in generarJson.CONDICIONES_OFERTA.values()]
+        return rutas + [os.path.join(generarJson.carpeta_data, "ofertaFinal" + intermedios.EXTENSION_INDICE)]
+
+    def ejecutar_enriquecimiento(self):
+        funcionesFinal.RUTA_ARCHIVO = self.rutas_enriquecimiento["ventas"]
+        funcionesFinal.RUTA_PRODUCTOS = self.rutas_enriquecimiento["productos"]
+        funcionesFinal.RUTA_CLIENTES = self.rutas_enriquecimiento["clientes"]
+        funcionesFinal.RUTA_OFERTAS = self.rutas_enriquecimiento["ofertas"]
+        funcionesFinal.OUTPUT_FILE_PATH = self.ruta_salida  # procesar_archivos agrega la extensión de la compresión
+
+        # Tablas que ya están en memoria porque su etapa se ejecutó en esta corrida (las ventas
+        # no en streaming ni con el motor compacto, que las leen del archivo por lotes)
+        tablas = {}
+        hojas = self.memoria.get("hojas", {})
+        ventas_por_lotes = self.opciones["streaming"] or self.opciones["motor"] == "compacto"
+        for nombre, ruta in self.rutas_enriquecimiento.items():
+            hoja = nombre_archivo(ruta)
+            if hoja in hojas and not (nombre == "ventas" and ventas_por_lotes):
+                tablas[nombre] = intermedios.registros_de(hojas[hoja])
+        if "ofertas" in self.memoria:
+            condicion = {archivo: condicion for condicion, archivo in generarJson.CONDICIONES_OFERTA.items()}
+            ofertas = self.memoria["ofertas"]
+            ofertas = ofertas[ofertas['Tipo condicion'] == condicion[nombre_archivo(funcionesFinal.RUTA_OFERTAS)]]
+            tablas["ofertas"] = intermedios.registros_de(ofertas)
+
+        if funcionesFinal.procesar_archivos(**self.opciones, tablas=tablas, formato_json=self.formato_json) is None:
+            raise RuntimeError("No se pudo completar el enriquecimiento.")
+        return [self.ruta_final, self.ruta_cubo]
+
+    def ejecutar_excel(self):
+        archivos, _ = generarExcel.exportar_excel(self.ruta_final, generarExcel.nombre_archivo_excel)
+        resumen, _ = generarExcel.exportar_resumen(self.ruta_cubo, generarExcel.nombre_archivo_resumen)
+        return archivos + resumen
+
+    # Función para guardar las huellas de las etapas ejecutadas
+    def guardar_estado(self):
+        with open(RUTA_ESTADO, "w", encoding="utf-8") as archivo:
+            json.dump(self.estado, archivo, ensure_ascii=False, indent=4)
+
+    # Función para ejecutar el pipeline
+    def ejecutar(self, hasta=None, forzar=()):
+        """
+        Ejecuta las etapas necesarias, en el orden de sus dependencias.
+
+        Args:
+            hasta (str, opcional): Última etapa a ejecutar; solo se consideran ella y sus dependencias.
+            forzar (iterable): Etapas que se ejecutan aunque su huella no haya cambiado.
+
+        Returns:
+            dict: Por cada etapa considerada, "ejecutada" u "omitida".
+        """
+        pendientes = set(DEPENDENCIAS) if hasta is None else {hasta}
+        incluidas = set()
+        while pendientes:
+            etapa = pendientes.pop()
+            incluidas.add(etapa)
+            pendientes.update(set(DEPENDENCIAS[etapa]) - incluidas)
+
+        resultado = {}
+        for nombre in TopologicalSorter(DEPENDENCIAS).static_order():
+            if nombre not in incluidas:
+                continue
+            entradas, parametros = self.definicion(nombre)
+            huella = huella_etapa(nombre, entradas, parametros, self.estado["archivos"])
+            anterior = self.estado["etapas"].get(nombre)
+            if (nombre not in forzar and anterior and anterior["huella"] == huella
+                    and all(os.path.isfile(ruta) for ruta in anterior["salidas"])):
+                logging.info(f"Etapa '{nombre}' omitida: sus entradas no cambiaron.")
+                resultado[nombre] = "omitida"
+                continue
+
+            logging.info(f"Ejecutando la etapa '{nombre}'.")
+            # Si la etapa falla, sus salidas pueden quedar a medias: se olvida su huella anterior
+            # para que la próxima corrida la vuelva a ejecutar en lugar de omitirla
+            if self.estado["etapas"].pop(nombre, None) is not None:
+                self.guardar_estado()
+            inicio = time.perf_counter()
+            with self.perfil.etapa(nombre, entradas) as registro:
+                salidas = getattr(self, f"ejecutar_{nombre}")()
+                registro["salidas"] = salidas
+            self.estado["etapas"][nombre] = {
+                "huella": huella,
+                "salidas": [str(ruta) for ruta in salidas],
+                "fecha": datetime.now().isoformat(timespec="seconds"),
+                "segundos": round(time.perf_counter() - inicio, 3),
+            }
+            self.guardar_estado()
+            resultado[nombre] = "ejecutada"
+        return resultado
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ejecuta el pipeline completo, omitiendo las etapas cuyas entradas no cambiaron.")
+    parser.add_argument("--formato", choices=intermedios.FORMATOS_INTERMEDIOS, default="parquet",
+                        help="Formato de los archivos intermedios (por defecto parquet).")
+    parser.add_argument("--streaming", action="store_true", help="Enriquece las ventas en flujo, con memoria constante.")
+    parser.add_argument("--motor", choices=funcionesFinal.MOTORES, default="registro", help="Motor de enriquecimiento.")
+    parser.add_argument("--workers", type=int, default=1, help="Procesos para el enriquecimiento.")
+    parser.add_argument("--hasta", choices=list(DEPENDENCIAS), help="Última etapa a ejecutar (con sus dependencias).")
+    parser.add_argument("--forzar", choices=list(DEPENDENCIAS), nargs="+", default=[],
+                        help="Etapas que se ejecutan aunque sus entradas no hayan cambiado.")
+    parser.add_argument("--forzar-todo", action="store_true", help="Ejecuta todas las etapas.")
+    serializacion.agregar_argumentos(parser)
+    perfilado.agregar_argumentos(parser)
+    args = parser.parse_args()
+
+    perfil = perfilado.crear_perfilador("ejecutarPipeline", args)
+    pipeline = Pipeline(args.formato, args.streaming, args.motor, args.workers, perfil, serializacion.crear_formato(args))
+    resultado = pipeline.ejecutar(args.hasta, list(DEPENDENCIAS) if args.forzar_todo else args.forzar)
+    logging.info("Resultado del pipeline: " + ", ".join(f"{nombre} {estado}" for nombre, estado in resultado.items()))
+    perfil.guardar()
@@ -0,0 +1,245 @@
+import hashlib
+import json
+import os
+import sqlite3
+
+import intermedios
+from almacenCatalogos import consultar_en_grupos
+from particionesSalida import mes_de_venta
+
+# Estado del procesamiento incremental, junto a la salida: sell_out_final.estado.sqlite
+EXTENSION_ESTADO = ".estado.sqlite"
+VERSION_ESTADO = 2  # Cambia si cambia el esquema o los campos de las ventas enriquecidas, para reconstruir los estados anteriores.
+CAMPOS_SIN_VERSION = ("ID",)  # generarJson.py genera un ID nuevo en cada ejecución; no es un cambio.
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS ventas (
+    clave BLOB PRIMARY KEY, particion TEXT NOT NULL, orden INTEGER NOT NULL, ean, cuenta, llave
+);
+CREATE INDEX IF NOT EXISTS ventas_particion ON ventas (particion, orden);
+CREATE INDEX IF NOT EXISTS ventas_ean ON ventas (ean);
+CREATE INDEX IF NOT EXISTS ventas_cuenta ON ventas (cuenta);
+CREATE INDEX IF NOT EXISTS ventas_llave ON ventas (llave);
+CREATE TABLE IF NOT EXISTS versiones (catalogo TEXT NOT NULL, clave, huella BLOB NOT NULL, PRIMARY KEY (catalogo, clave));
+CREATE TABLE IF NOT EXISTS particiones (particion TEXT PRIMARY KEY, ruta TEXT NOT NULL, filas INTEGER NOT NULL, huella TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS archivos (nombre TEXT PRIMARY KEY, huella TEXT NOT NULL);
+"""
+TABLAS = ("ventas", "versiones", "particiones", "archivos")
+
+# Columna de `ventas` con la que se buscan las ventas afectadas por cada catálogo
+COLUMNAS_CATALOGO = {"productos": "ean", "clientes": "cuenta", "ofertas": "llave"}
+
+
+# Función para obtener la ruta del estado que acompaña a un archivo de salida
+def ruta_estado(ruta_salida):
+    return os.path.splitext(ruta_salida)[0] + EXTENSION_ESTADO
+
+
+# Función para calcular la huella de un registro (venta, producto, cliente u ofertas de una Llave)
+def huella_registro(registro):
+    """
+    Returns:
+        bytes: Hash de 128 bits del registro serializado, sin los CAMPOS_SIN_VERSION.
+    """
+    if isinstance(registro, dict):
+        registro = {campo: valor for campo, valor in registro.items() if campo not in CAMPOS_SIN_VERSION}
+    else:
+        registro = [huella_registro(elemento).hex() for elemento in registro]
+    texto = json.dumps(registro, ensure_ascii=False, default=str)
+    return hashlib.blake2b(texto.encode("utf-8"), digest_size=16).digest()
+
+
+# Función para calcular la versión de cada clave de un catálogo
+def versiones_catalogo(nombre, indice):
+    """
+    Args:
+        nombre (str): "productos", "clientes" u "ofertas".
+        indice (Mapping): El índice de búsqueda del catálogo (para ofertas, el de
+            `construir_indice_ofertas`: la versión de una Llave cubre todas sus ventanas).
+
+    Returns:
+        dict: Clave -> huella del registro (o de las ofertas de la Llave).
+    """
+    if nombre == "ofertas":
+        return {llave: huella_registro(ventanas["ofertas"]) for llave, ventanas in indice.items()}
+    return {clave: huella_registro(registro) for clave, registro in indice.items()}
+
+
+# Función para obtener la huella de un archivo (tamaño y fecha de modificación)
+def huella_archivo(ruta):
+    if intermedios.es_indice(ruta):
+        # La de un índice (como ofertaFinal) cambia si cambia cualquiera de sus archivos
+        return ";".join(huella_archivo(particion) for particion in [ruta] + intermedios.rutas_de_indice(ruta))
+    estado = os.stat(ruta)
+    return f"{estado.st_size}:{estado.st_mtime_ns}"
+
+
+# Función para obtener la partición (mes de la fecha, o particionesSalida.MES_SIN_FECHA) de una venta
+def particion_de(venta):
+    return mes_de_venta(venta)
+
+
+class ClavesVentas:
+    """
+    Clave de cada venta del archivo de ventas: la huella de su contenido más el número de
+    aparición de ese contenido (dos ventas idénticas son dos ventas). Recuerda cuántas veces se
+    vio cada huella, lo que alcanza para saber qué ventas del estado siguen en el archivo.
+    """
+
+    def __init__(self):
+        self.apariciones = {}  # Huella -> veces que apareció en el archivo
+
+    # Función para obtener la clave de la siguiente venta del archivo
+    def clave(self, venta):
+        huella = huella_registro(venta)
+        aparicion = self.apariciones.get(huella, 0)
+        self.apariciones[huella] = aparicion + 1
+        return huella + aparicion.to_bytes(4, "little")
+
+    def __contains__(self, clave):
+        return int.from_bytes(clave[16:], "little") < self.apariciones.get(clave[:16], 0)
+
+
+class EstadoIncremental:
+    """
+    Lo que recuerda el procesamiento incremental entre ejecuciones, en una base SQLite: cada
+    venta ya enriquecida (con su partición, su posición en ella y el EAN, la cuenta y la Llave
+    con que se enriqueció), la versión de cada producto, cliente y Llave de ofertas con que se
+    enriquecieron, y la huella de cada partición escrita.
+
+    Los cambios se confirman con `confirmar` después de escribir las particiones; si la
+    ejecución falla antes, el estado anterior queda intacto y las particiones que no coinciden
+    con su huella se reconstruyen en la ejecución siguiente.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        carpeta = os.path.dirname(ruta)
+        if carpeta:
+            os.makedirs(carpeta, exist_ok=True)
+        self.conexion = sqlite3.connect(ruta)
+        version = self.conexion.execute("PRAGMA user_version").fetchone()[0]
+        if version != VERSION_ESTADO:
+            with self.conexion:
+                for tabla in TABLAS:
+                    self.conexion.execute(f"DROP TABLE IF EXISTS {tabla}")
+        self.conexion.executescript(ESQUEMA)
+        self.conexion.execute(f"PRAGMA user_version = {VERSION_ESTADO}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excepcion):
+        self.conexion.close()  # Sin `confirmar`, los cambios se descartan
+
+    # Función para confirmar todos los cambios de la ejecución
+    def confirmar(self):
+        self.conexion.commit()
+
+    # Funciones para leer y guardar la huella de un archivo de entrada
+    def huella(self, nombre):
+        fila = self.conexion.execute("SELECT huella FROM archivos WHERE nombre = ?", (nombre,)).fetchone()
+        return fila[0] if fila else None
+
+    def guardar_huella(self, nombre, huella):
+        self.conexion.execute("INSERT OR REPLACE INTO archivos (nombre, huella) VALUES (?, ?)", (nombre, huella))
+
+    # Función para comparar las versiones de un catálogo con las guardadas
+    def cambios_catalogo(self, nombre, versiones):
+        """
+        Guarda las versiones nuevas (solo las claves que cambiaron) y devuelve esas claves.
+
+        Args:
+            nombre (str): "productos", "clientes" u "ofertas".
+            versiones (dict): Clave -> huella (`versiones_catalogo`).
+
+        Returns:
+            set: Las claves nuevas, modificadas o eliminadas del catálogo.
+        """
+        guardadas = dict(self.conexion.execute("SELECT clave, huella FROM versiones WHERE catalogo = ?", (nombre,)))
+        cambiadas = {clave for clave, huella in versiones.items() if guardadas.get(clave) != huella}
+        eliminadas = set(guardadas).difference(versiones)
+        self.conexion.executemany("DELETE FROM versiones WHERE catalogo = ? AND clave IS ?",
+                                  ((nombre, clave) for clave in cambiadas | eliminadas))
+        self.conexion.executemany("INSERT INTO versiones (catalogo, clave, huella) VALUES (?, ?, ?)",
+                                  ((nombre, clave, versiones[clave]) for clave in cambiadas))
+        return cambiadas | eliminadas
+
+    # Función para obtener las ventas enriquecidas con alguna clave de catálogo que cambió
+    def claves_afectadas(self, cambios):
+        """
+        Args:
+            cambios (dict): Catálogo -> claves que cambiaron (`cambios_catalogo`).
+
+        Returns:
+            set: Las claves de las ventas que hay que volver a enriquecer.
+        """
+        afectadas = set()
+        for nombre, claves in cambios.items():
+            columna = COLUMNAS_CATALOGO[nombre]
+            filas = consultar_en_grupos(self.conexion, f"SELECT clave FROM ventas WHERE {columna} {{condicion}}", claves)
+            afectadas.update(clave for clave, in filas)
+        return afectadas
+
+    # Función para saber cuáles de varias ventas ya están en el estado
+    def existentes(self, claves):
+        return {clave for clave, in consultar_en_grupos(self.conexion, "SELECT clave FROM ventas WHERE clave {condicion}", claves)}
+
+    # Función para obtener las ventas del estado que ya no están en el archivo de ventas
+    def ausentes(self, claves_ventas):
+        """
+        Args:
+            claves_ventas (ClavesVentas): Las claves de todas las ventas del archivo.
+
+        Returns:
+            list: Tuplas (clave, partición) de las ventas que ya no están.
+        """
+        filas = self.conexion.execute("SELECT clave, particion FROM ventas")
+        return [(clave, particion) for clave, particion in filas if clave not in claves_ventas]
+
+    # Función para obtener las particiones cuyo archivo no coincide con el estado
+    def particiones_inconsistentes(self):
+        """
+        Returns:
+            set: Las particiones cuyo archivo no existe o cambió desde que se escribió (por
+            ejemplo, una ejecución que falló antes de confirmar el estado).
+        """
+        inconsistentes = set()
+        for particion, ruta, huella in self.conexion.execute("SELECT particion, ruta, huella FROM particiones"):
+            if not os.path.isfile(ruta) or huella_archivo(ruta) != huella:
+                inconsistentes.add(particion)
+        return inconsistentes
+
+    # Función para obtener las claves de las ventas de una partición, en su orden
+    def claves_particion(self, particion):
+        filas = self.conexion.execute("SELECT clave FROM ventas WHERE particion = ? ORDER BY orden", (particion,))
+        return [clave for clave, in filas]
+
+    # Función para obtener la ruta del archivo de una partición (None si no tiene)
+    def ruta_particion(self, particion):
+        fila = self.conexion.execute("SELECT ruta FROM particiones WHERE particion = ?", (particion,)).fetchone()
+        return fila[0] if fila else None
+
+    # Función para obtener la ruta de cada partición, en el orden de las particiones
+    def rutas_particiones(self):
+        filas = self.conexion.execute("SELECT particion, ruta FROM particiones ORDER BY particion")
+        return [ruta for _, ruta in filas]
+
+    # Función para reemplazar las ventas de una partición por las de su archivo nuevo
+    def reemplazar_particion(self, particion, ruta, ventas):
+        """
+        Args:
+            particion (str): La partición.
+            ruta (str): El archivo de la partición, ya escrito (None si quedó vacía y se eliminó).
+            ventas (list): Tuplas (clave, EAN, cuenta, Llave) de las ventas de la partición, en
+                el orden del archivo.
+        """
+        self.conexion.execute("DELETE FROM ventas WHERE particion = ?", (particion,))
+        self.conexion.execute("DELETE FROM particiones WHERE particion = ?", (particion,))
+        if ruta is None:
+            return
+        self.conexion.executemany("INSERT INTO ventas (clave, particion, orden, ean, cuenta, llave) VALUES (?, ?, ?, ?, ?, ?)",
+                                  ((clave, particion, orden, ean, cuenta, llave)
+                                   for orden, (clave, ean, cuenta, llave) in enumerate(ventas)))
+        self.conexion.execute("INSERT INTO particiones (particion, ruta, filas, huella) VALUES (?, ?, ?, ?)",
+                              (particion, ruta, len(ventas), huella_archivo(ruta)))
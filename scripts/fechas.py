@@ -0,0 +1,47 @@
+from datetime import date, datetime
+from functools import lru_cache
+
+
+FORMATO_FECHA = '%m/%d/%Y'  # Formato de las fechas en texto ('MM/DD/YYYY').
+ORDINAL_EPOCH = date(1970, 1, 1).toordinal()  # Ordinal de 1970-01-01, para convertir desde días epoch.
+
+
+# Función para convertir una fecha a su número ordinal de día
+@lru_cache(maxsize=100_000)
+def convertir_fecha_ordinal(fecha):
+    """
+    Convierte una fecha al ordinal del día (`date.toordinal`).
+
+    Acepta el ordinal ya calculado (archivos generados por generarJson.py) o, por compatibilidad
+    con archivos anteriores, texto con formato 'MM/DD/YYYY'. Cada valor distinto se convierte
+    una sola vez.
+
+    Args:
+        fecha (int | str): La fecha a convertir.
+
+    Returns:
+        int: El ordinal del día, o None si la fecha está vacía o no es válida.
+    """
+    if isinstance(fecha, int) and not isinstance(fecha, bool):
+        return fecha if fecha > 0 else None
+    if not fecha or not isinstance(fecha, str):
+        return None
+    try:
+        return datetime.strptime(fecha, FORMATO_FECHA).toordinal()
+    except ValueError:
+        return None
+
+
+# Función para convertir un ordinal de día a texto
+@lru_cache(maxsize=100_000)
+def formatear_fecha_ordinal(ordinal):
+    """
+    Convierte el ordinal de un día a texto con formato 'MM/DD/YYYY'.
+
+    Args:
+        ordinal (int): El ordinal del día.
+
+    Returns:
+        str: La fecha en texto.
+    """
+    return date.fromordinal(ordinal).strftime(FORMATO_FECHA)
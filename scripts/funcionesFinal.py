@@ -1,7 +1,28 @@
 import json  # Importa el módulo json para trabajar con archivos JSON.
 import os  # Importa el módulo os para interactuar con el sistema operativo.
 import logging
-from datetime import datetime  # Importa la clase datetime del módulo datetime.
+import argparse
+from itertools import chain, islice
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from bisect import bisect_right
+from functools import lru_cache, partial
+
+import motorVectorizado  # Motor columnar (pandas/NumPy) equivalente a procesar_elemento.
+from fechas import convertir_fecha_ordinal, formatear_fecha_ordinal
+import intermedios  # Archivos intermedios (Parquet o JSON) generados por generarJson.py.
+from metricas import MetricasEjecucion  # Contadores y tiempos de la ejecución (en lugar de log por elemento).
+import perfilado  # Perfil por etapa (tiempos, tamaños, memoria y cProfile), solo con --perfil.
+import serializacion  # Serializador, indentación y compresión de los archivos JSON.
+import concurrencia  # Lectura anticipada y escritura en segundo plano (hilos).
+import catalogoProductos  # Índice persistente del catálogo de productos, mapeado en memoria.
+import condicionesCosto  # Funciones de cada tipo de condición de costo (registro de tipos).
+import cuboBeneficio  # Agregado de Total Beneficio por RETAIL PAGO, Llave, Tipo de Valuacion y mes.
+import almacenCatalogos  # Catálogos en una base SQLite local, consultados por lote de ventas.
+import estadoIncremental  # Ventas ya enriquecidas y versiones de los catálogos, para el modo incremental.
+import particionesSalida  # Salida particionada por mes y RETAIL PAGO, con su manifiesto.
+import puntosControl  # Partes ya enriquecidas y progreso, para reanudar una ejecución que falló.
 
 
 #Configuración de logging
@@ -16,16 +37,24 @@ logging.basicConfig(
 
 
 # Rutas de los archivos que se utilizarán en el script.
-RUTA_ARCHIVO = ".\\json\\Base_Venta_detalle_Fanasa.json"  # Ruta del archivo sell_out.json.
-RUTA_PRODUCTOS = ".\\json\\Catalogo_de_Productos.json"  # Ruta del archivo productos.json.
-RUTA_CLIENTES = ".\\json\\Clientes_Aplicables.json"  # Ruta del archivo clientes_aplicables.json.
-RUTA_OFERTAS = ".\\json\\ofertaSellOut.json"  # Ruta del archivo ofertas.json.
+# Si el .parquet no existe se usa el .json con el mismo nombre (ver `intermedios.resolver_ruta`).
+RUTA_ARCHIVO = ".\\json\\Base_Venta_detalle_Fanasa.parquet"  # Ruta del archivo sell_out.
+RUTA_PRODUCTOS = ".\\json\\Catalogo_de_Productos.parquet"  # Ruta del archivo productos.
+RUTA_CLIENTES = ".\\json\\Clientes_Aplicables.parquet"  # Ruta del archivo clientes_aplicables.
+RUTA_OFERTAS = ".\\json\\ofertaSellOut.parquet"  # Ruta del archivo ofertas.
 OUTPUT_FILE_PATH = "./json/sell_out_final.json"  # Ruta donde se guardará el archivo de salida.
+FORMATOS_SALIDA = ("json", "jsonl")  # Formatos de salida soportados en modo streaming.
+MOTORES = ("registro", "vectorizado", "compacto")  # Motores de enriquecimiento disponibles.
+TAMANO_LOTE = 100_000  # Ventas por lote (motor vectorizado en streaming, motor compacto y ejecución en paralelo).
+LOTE_LECTURA_VENTAS = 10_000  # Ventas (dict) por lote leído por adelantado con los motores por registro y vectorizado.
+LOTES_ANTICIPADOS = 2  # Lotes de ventas que se leen por adelantado mientras se procesan los anteriores.
+GRUPO_ESCRITURA = 2_000  # Elementos por grupo que se envían al hilo de escritura en streaming.
+TAMANO_CACHE_OFERTAS = 50_000  # Combinaciones (Llave, Fecha) resueltas que se recuerdan con el motor por registro.
 
 # Función para cargar archivos JSON
 def cargar_json(ruta):
     """
-    Carga un archivo JSON desde la ruta especificada.
+    Carga un archivo JSON desde la ruta especificada, comprimido (gzip o zstd) o no.
 
     Args:
         ruta (str): La ruta del archivo JSON a cargar.
@@ -41,8 +70,7 @@ def cargar_json(ruta):
     """
     try:
         logging.info(f"Cargando archivo: {ruta}")
-        with open(ruta, 'r', encoding='utf-8') as file:
-            return json.load(file)
+        return serializacion.cargar(ruta)
     except FileNotFoundError:
         logging.error(f"El archivo no se encontró en la ruta especificada: {ruta}")
     except json.JSONDecodeError:
@@ -51,6 +79,69 @@ def cargar_json(ruta):
         logging.error(f"Error al cargar el archivo {ruta}: {e}")
     return None
 
+# Función para cargar un archivo intermedio (Parquet o JSON)
+def cargar_datos(ruta):
+    """
+    Carga un archivo intermedio generado por generarJson.py, en formato Parquet o JSON, o un
+    índice de varios archivos (como ofertaFinal).
+
+    Args:
+        ruta (str): La ruta del archivo. Si no existe, se busca el mismo nombre en el otro formato.
+
+    Returns:
+        list: Los registros del archivo.
+        None: Si ocurre un error al cargar el archivo.
+    """
+    ruta = intermedios.resolver_ruta(ruta)
+    if not ruta.endswith(intermedios.EXTENSIONES["parquet"]) and not intermedios.es_indice(ruta):
+        return cargar_json(ruta)
+    try:
+        logging.info(f"Cargando archivo: {ruta}")
+        return intermedios.cargar_registros(ruta)
+    except FileNotFoundError:
+        logging.error(f"El archivo no se encontró en la ruta especificada: {ruta}")
+    except Exception as e:
+        logging.error(f"Error al cargar el archivo {ruta}: {e}")
+    return None
+
+# Función para leer un archivo intermedio elemento por elemento
+def leer_datos_stream(ruta):
+    """
+    Lee un archivo intermedio (Parquet, JSON o un índice de varios archivos) entregando un
+    elemento a la vez, con memoria constante.
+
+    Args:
+        ruta (str): La ruta del archivo, ya resuelta con `intermedios.resolver_ruta`.
+
+    Yields:
+        dict: Cada elemento del archivo.
+    """
+    if intermedios.es_indice(ruta):
+        for particion in intermedios.rutas_de_indice(ruta):
+            yield from leer_datos_stream(particion)
+    elif ruta.endswith(intermedios.EXTENSIONES["parquet"]):
+        logging.info(f"Leyendo archivo en flujo: {ruta}")
+        yield from intermedios.leer_registros_stream(ruta)
+    else:
+        yield from leer_json_stream(ruta)
+
+# Función para leer un archivo JSON elemento por elemento
+def leer_json_stream(ruta):
+    """
+    Lee un arreglo JSON (o JSON Lines) desde la ruta especificada, entregando un elemento a la vez.
+
+    A diferencia de `cargar_json`, el archivo nunca se carga completo en memoria, por lo
+    que el consumo se mantiene constante sin importar el tamaño del archivo.
+
+    Args:
+        ruta (str): La ruta del archivo JSON (un arreglo de objetos) a leer, comprimido o no.
+
+    Yields:
+        dict: Cada objeto del arreglo, con los números convertidos a float.
+    """
+    logging.info(f"Leyendo archivo en flujo: {ruta}")
+    yield from serializacion.leer_elementos(ruta)
+
 # Función para calcular los campos financieros
 def calcular_campos_financieros(elemento):
     """
@@ -60,7 +151,6 @@ def calcular_campos_financieros(elemento):
     El diccionario `elemento` debe contener las siguientes claves para que los cálculos se realicen correctamente:
         - "CAP": El valor CAP como cadena que puede convertirse a float.
         - "Costo Total": El costo total como cadena que puede convertirse a float.
-        - "Valor Tipo de Valuacion": El valor de tipo de valuación como cadena que puede convertirse a float.
         - "OFERTA": El valor de la oferta como cadena que puede convertirse a float.
     Los siguientes campos serán agregados al diccionario `elemento` si las claves necesarias están presentes:
         - "Valor CAP": El resultado de multiplicar el valor CAP por el costo total.
@@ -68,12 +158,9 @@ def calcular_campos_financieros(elemento):
         - "Valor Oferta": El resultado de multiplicar el costo con CAP por el valor de la oferta.
         - "Total Beneficio": La suma del valor CAP y el valor de la oferta.
     """
-    logging.info("Calculando campos financieros...")
     if "CAP" in elemento and "Costo Total" in elemento:
         
         cap = float(elemento["CAP"])
-        costo_reposicion = float(elemento["Valor Tipo de Valuacion"])\
-        
         costo_total = float(elemento.get("Costo Total"))
         
         
@@ -87,282 +174,1298 @@ def calcular_campos_financieros(elemento):
         elemento["Total Beneficio"] = elemento["Valor CAP"] + elemento["Valor Oferta"]
     
 # Función para calcular las condiciones de costo según el tipo
-def calcular_condicion_costo(primer_elemento):
+def calcular_condicion_costo(primer_elemento, financieros=False):
     """
-    Calcula el costo basado en el tipo de condición especificado en el diccionario `primer_elemento`.
+    Calcula el costo basado en el tipo de condición especificado en el diccionario `primer_elemento`,
+    con la función registrada para ese tipo en `condicionesCosto.CONDICIONES` (la misma que usa
+    el motor vectorizado sobre cada grupo de ventas).
     Args:
         primer_elemento (dict): Un diccionario que contiene los datos necesarios para calcular el costo. 
             Las claves esperadas en el diccionario incluyen:
-            - "Tipo condicion costo" (str): El tipo de condición de costo a aplicar. Puede ser "% DESCUENTO SOBRE COSTO", "Costo Fijo", o "Monto Fijo".
+            - "Tipo condicion costo" (str): El tipo de condición de costo a aplicar. Puede ser "% DESCUENTO SOBRE COSTO", "Costo Fijo", "Monto Fijo" o cualquier otro tipo registrado.
             - "Pzas Facturadas" (float, opcional): El número de piezas facturadas. Valor predeterminado es 1 si no existe.
             - "Valor Tipo de Valuacion" (float, opcional): El valor del tipo de valuación. Valor predeterminado es 0.0 si no existe.
             - "Descuento Factura" (float, opcional): El descuento aplicado a la factura. Valor predeterminado es 0.0 si no existe.
-            - "Costo Fijo" (float, opcional): El costo fijo aplicado. Valor predeterminado es 0.0 si no existe.
+        financieros (bool): Si es True, también se calculan los campos financieros con
+            `calcular_campos_financieros`, antes o después de la condición según lo indique el tipo
+            (así cada venta conserva el orden de sus campos).
     Returns:
         None: La función modifica el diccionario `primer_elemento` en lugar de devolver un valor. 
         Agrega las siguientes claves al diccionario:
         - "Costo Total" (float): El costo total calculado (solo para "% DESCUENTO SOBRE COSTO").
         - "Valor condicion Costo" (float o str): El resultado del cálculo basado en la condición de costo.
     """
-    logging.info("Calculando condiciones de costo...")
-    tipo_condicion_costo = primer_elemento.get("Tipo condicion costo", None)
-    resultado_condicion = 0
-
-    if tipo_condicion_costo == "% DESCUENTO SOBRE COSTO":
-        # Obtener los campos necesarios, asegurándonos de que sean numéricos
-        piezas_facturadas = float(primer_elemento.get("Pzas Facturadas", 1))  # Valor predeterminado de 1 si no existe
-        valor_tipo_valuacion = float(primer_elemento.get("Valor Tipo de Valuacion", 0.0))
-        
-        
-        # Verificar si descuento_factura es None y manejarlo
-        descuento_factura = primer_elemento.get("Descuento Factura")
-        if descuento_factura is None:
-            descuento_factura = 0.0
-        else:
-            descuento_factura = float(descuento_factura)
-            
-        resultado_condicion = (piezas_facturadas * valor_tipo_valuacion) - descuento_factura
-        
-        
-        
-        costo_total = piezas_facturadas * valor_tipo_valuacion 
-        primer_elemento["Costo Total"] = costo_total
-    elif tipo_condicion_costo == "Costo Fijo":
-        '''
-        #(pzas facturadas * valor tipo de valuacion) - (costo_fijo * pzas facturadas)
-        piezas_facturadas = float(primer_elemento.get("Pzas Facturadas", 1))
-        valor_tipo_valuacion = float(primer_elemento.get("Valor Tipo de Valuacion", 0.0))
-        costo_fijo = float(primer_elemento.get("Costo Fijo", 0.0))
-        
-        
-        resultado_condicion = (piezas_facturadas * valor_tipo_valuacion) - (costo_fijo * piezas_facturadas)
-        
-        '''
-        
-        piezas_facturadas = float(primer_elemento.get("Pzas Facturadas", 1))
-        
-        if "CAP" in primer_elemento and "Costo Total" in primer_elemento:
-            cap = float(primer_elemento["CAP"])
-            costo_total = float(primer_elemento.get("Costo Total"))
-            
-            primer_elemento["Valor CAP"] = float(primer_elemento.get("Costo Total", 0.0)) - (cap * piezas_facturadas)
-            primer_elemento["Costo con CAP"] = costo_total - primer_elemento["Valor CAP"]
-            
-        if "Costo con CAP" in primer_elemento and "OFERTA" in primer_elemento: 
-            primer_elemento["Valor Oferta"] = primer_elemento["Costo con CAP"] * float(primer_elemento["OFERTA"])
-            
-        if "Valor CAP" in primer_elemento and "Valor Oferta" in primer_elemento:
-            primer_elemento["Total Beneficio"] = primer_elemento["Valor CAP"] + primer_elemento["Valor Oferta"]
-            
-            
-        
-    elif tipo_condicion_costo == "Monto Fijo":
-        #==============================
-        #AGREGAR CODIGO CRIS 
-        #==============================
-        
-        piezas_facturadas = float(primer_elemento.get("Pzas Facturadas", 1))
-        
-        if "CAP" in primer_elemento and "Costo Total" in primer_elemento:
-            cap = float(primer_elemento["CAP"])
-            costo_total = float(primer_elemento.get("Costo Total"))
-            
-            primer_elemento["Valor CAP"] = cap * piezas_facturadas
-            primer_elemento["Costo con CAP"] = costo_total - primer_elemento["Valor CAP"]
-        
-        if "Costo con CAP" in primer_elemento and "OFERTA" in primer_elemento:
-            primer_elemento["Valor Oferta"] = primer_elemento["Costo con CAP"] * float(primer_elemento["OFERTA"])
-            
-        if "Valor CAP" in primer_elemento and "Valor Oferta" in primer_elemento:
-            primer_elemento["Total Beneficio"] = primer_elemento["Valor CAP"] + primer_elemento["Valor Oferta"]
-            
-        # Realiza la operación correspondiente a "condicion3"
-        resultado_condicion = "Hola monto fijo" # Ejemplo de cálculo
+    condicion = condicionesCosto.CONDICIONES.get(primer_elemento.get("Tipo condicion costo", None))
+    if condicion is None:
+        # Si no se encuentra una condición válida, se usa un valor predeterminado
+        primer_elemento["Valor condicion Costo"] = condicionesCosto.VALOR_CONDICION_NO_RECONOCIDA
     else:
-        # Si no se encuentra una condición válida, se puede definir un valor predeterminado
-        resultado_condicion = "No especificado o no reconocido en tipo de condición de costo"
-        logging.warning(f"Tipo de condición de costo no reconocido: {tipo_condicion_costo} para el producto {primer_elemento.get('Producto Código', 'No especificado')}")
+        if financieros and condicion.financieros_previos:
+            calcular_campos_financieros(primer_elemento)
+            financieros = False
+        primer_elemento.update(condicion.calcular(condicionesCosto.VentaCondicion(primer_elemento)))
+    if financieros:
+        calcular_campos_financieros(primer_elemento)
 
-    # Agregar el resultado de la condición al JSON
-    primer_elemento["Valor condicion Costo"] = resultado_condicion
+# Función para construir el índice de ofertas por Llave
+def construir_indice_ofertas(ofertas):
+    """
+    Construye un índice con todas las ventanas de vigencia de cada Llave.
 
-# Función para procesar un elemento de sell_out
-# Función para verificar si la fecha está dentro del rango de vigencia
-def verificar_vigencia(fecha, fecha_inicio_vigencia, fecha_fin_vigencia):
+    Las fechas de vigencia se convierten una sola vez. Para cada Llave se guardan las ofertas
+    ordenadas por fecha de inicio, junto con sus fechas de inicio y fin (ordinales) y el fin
+    máximo acumulado, que permite descartar ventanas anteriores sin revisarlas una a una.
+    Las ofertas con fechas vacías o inválidas nunca son vigentes, pero su Llave sí queda en el índice.
+
+    Args:
+        ofertas (list): Lista de ofertas (dict) con "Llave", "Fecha inicio vigencia" y "Fecha fin vigencia".
+
+    Returns:
+        dict: Llave -> {"inicios": [...], "fines": [...], "fines_maximos": [...], "ofertas": [...]}.
+    """
+    ventanas_por_llave = {}
+    for oferta in ofertas:
+        inicio = convertir_fecha_ordinal(oferta.get("Fecha inicio vigencia", None))
+        fin = convertir_fecha_ordinal(oferta.get("Fecha fin vigencia", None))
+        ventanas = ventanas_por_llave.setdefault(oferta["Llave"], [])
+        if inicio is not None and fin is not None:
+            ventanas.append((inicio, fin, oferta))
+
+    indice = {}
+    for llave, ventanas in ventanas_por_llave.items():
+        # Orden estable: con la misma fecha de inicio, la última oferta del archivo queda al final
+        ventanas.sort(key=lambda ventana: ventana[0])
+        fines_maximos = []
+        for _, fin, _ in ventanas:
+            fines_maximos.append(max(fin, fines_maximos[-1]) if fines_maximos else fin)
+        indice[llave] = {
+            "inicios": [ventana[0] for ventana in ventanas],
+            "fines": [ventana[1] for ventana in ventanas],
+            "fines_maximos": fines_maximos,
+            "ofertas": [ventana[2] for ventana in ventanas],
+        }
+    return indice
+
+
+# Función para buscar la oferta vigente de una Llave en una fecha
+def buscar_oferta_vigente(ventanas, fecha):
     """
-    Verifica si una fecha dada está dentro del rango de vigencia especificado.
+    Busca por búsqueda binaria la oferta cuya vigencia incluye la fecha dada.
+    Si varias ventanas incluyen la fecha, se elige la de inicio más reciente.
+
     Args:
-        fecha (str): La fecha a verificar en formato 'MM/DD/YYYY'.
-        fecha_inicio_vigencia (str): La fecha de inicio de la vigencia en formato 'MM/DD/YYYY'.
-        fecha_fin_vigencia (str): La fecha de fin de la vigencia en formato 'MM/DD/YYYY'.
+        ventanas (dict): Las ventanas de una Llave, tal como las genera `construir_indice_ofertas`.
+        fecha (int): El ordinal del día a buscar.
+
     Returns:
-        bool: True si la fecha está dentro del rango de vigencia, False en caso contrario.
+        dict: La oferta vigente, o None si ninguna ventana incluye la fecha.
     """
-    try:
-        # Convertir las fechas a objetos datetime
-        formato_fecha = '%m/%d/%Y'  # Ajusta el formato según sea necesario
-        fecha = datetime.strptime(fecha, formato_fecha)
-        fecha_inicio_vigencia = datetime.strptime(fecha_inicio_vigencia, formato_fecha)
-        fecha_fin_vigencia = datetime.strptime(fecha_fin_vigencia, formato_fecha)
-        
-        
-        # Verificar si la fecha está en el rango
-        return fecha_inicio_vigencia <= fecha <= fecha_fin_vigencia
-    except ValueError as e:
-        logging.error(f"Error al convertir las fechas: {e} - {fecha}, {fecha_inicio_vigencia}, {fecha_fin_vigencia}")
-        return False
+    posicion = bisect_right(ventanas["inicios"], fecha) - 1
+    # Retroceder solo mientras alguna ventana anterior pueda seguir vigente en la fecha
+    while posicion >= 0 and ventanas["fines_maximos"][posicion] >= fecha:
+        if ventanas["fines"][posicion] >= fecha:
+            return ventanas["ofertas"][posicion]
+        posicion -= 1
+    return None
+
+
+# Función para resolver la oferta de una Llave en una fecha
+def resolver_oferta(ofertas_dict, productos_dict, llave, fecha, codigo_base):
+    """
+    Resuelve todo lo que `procesar_elemento` obtiene de la oferta, que es igual para todas las
+    ventas con la misma Llave y Fecha: la búsqueda de la oferta vigente, el "Nombre regla" con su
+    valor de valuación y el "Tipo condicion costo". Lo que depende de cada venta (Pzas Facturadas,
+    Descuento Factura) se sigue calculando por venta.
+
+    Args:
+        ofertas_dict (dict): Índice de ofertas por Llave generado por `construir_indice_ofertas`.
+        productos_dict (dict): Productos indexados por EAN.
+        llave (str): La Llave de la venta, que debe estar en `ofertas_dict`.
+        fecha (int): El ordinal del día de la venta, o None.
+        codigo_base (str): El EAN de la venta, o None si no tiene "Producto Código".
+
+    Returns:
+        tuple: Los campos (nombre, valor) que la oferta agrega a cada venta, en orden, o una tupla
+        vacía si ninguna oferta de la Llave está vigente en la fecha.
+    """
+    oferta_encontrada = buscar_oferta_vigente(ofertas_dict[llave], fecha) if fecha is not None else None
+    if not oferta_encontrada:
+        return ()
+
+    campos = [("CAP", float(oferta_encontrada.get("CAP", 0.0))),
+              ("OFERTA", float(oferta_encontrada.get("Oferta", 0.0)))]
+    # Obtener el "Tipo de Valuacion" desde el diccionario de ofertas
+    tipo_valuacion = oferta_encontrada.get("Nombre regla", None)
+    if tipo_valuacion and codigo_base is not None and codigo_base in productos_dict:
+        #Si tipo_valuacion es Costo FIjo entonces se debe obtener el valor de "Costo Fijo" que viene en la oferta
+        if tipo_valuacion == "Costo Fijo":
+            campos.append(("Valor Tipo de Valuacion", oferta_encontrada.get("Costo Fijo", None)))
+        else:
+            campos.append(("Valor Tipo de Valuacion", catalogoProductos.valor_producto(productos_dict, codigo_base, tipo_valuacion)))
+        campos.append(("Tipo de Valuacion", tipo_valuacion))
+    # Obtener el "Tipo condicion costo" desde el diccionario de ofertas
+    tipo_condicion_costo = oferta_encontrada.get("Tipo condicion costo", None)
+    if tipo_condicion_costo:
+        campos.append(("Tipo condicion costo", tipo_condicion_costo))
+    return tuple(campos)
+
+
+class CacheOfertas:
+    """
+    Caché LRU de `resolver_oferta` para el motor por registro: en un mes, miles de ventas
+    comparten Llave y Fecha, y solo la primera resuelve la oferta. La clave incluye también el
+    EAN, porque el valor de valuación sale del producto (y la Llave puede venir en la venta).
+
+    Los aciertos y fallos se suman a las métricas de la ejecución con `reportar`.
+    """
+
+    def __init__(self, ofertas_dict, productos_dict, tamano=TAMANO_CACHE_OFERTAS):
+        """
+        Args:
+            ofertas_dict (dict): Índice de ofertas por Llave generado por `construir_indice_ofertas`.
+            productos_dict (dict): Productos indexados por EAN.
+            tamano (int): Cantidad máxima de combinaciones que se recuerdan (las menos usadas
+                recientemente se descartan). 0 desactiva la caché.
+        """
+        self.resolver = lru_cache(maxsize=tamano)(partial(resolver_oferta, ofertas_dict, productos_dict))
+        self._reportados = (0, 0)  # Aciertos y fallos ya sumados a las métricas
+
+    # Función para sumar a las métricas los aciertos y fallos desde el último reporte
+    def reportar(self, metricas):
+        info = self.resolver.cache_info()
+        if metricas is not None:
+            metricas.contar("cache_ofertas_aciertos", info.hits - self._reportados[0])
+            metricas.contar("cache_ofertas_fallos", info.misses - self._reportados[1])
+        self._reportados = (info.hits, info.misses)
 
 
 # Función para procesar un elemento de sell_out
-def procesar_elemento(primer_elemento, productos_dict, clientes_dict, ofertas_dict):
+def procesar_elemento(primer_elemento, productos_dict, clientes_dict, ofertas_dict, metricas=None, cache_ofertas=None):
     """
     Procesa un elemento de datos y actualiza sus valores basándose en la información de productos, clientes y ofertas.
     Args:
         primer_elemento (dict): Diccionario que contiene los datos del elemento a procesar.
-        productos_dict (dict): Diccionario que contiene información de productos.
+        productos_dict (dict): Diccionario que contiene información de productos (o el catálogo
+            mapeado de `catalogoProductos`; los campos se leen con `valor_producto`).
         clientes_dict (dict): Diccionario que contiene información de clientes.
-        ofertas_dict (dict): Diccionario que contiene información de ofertas.
+        ofertas_dict (dict): Índice de ofertas por Llave generado por `construir_indice_ofertas`.
+        metricas (MetricasEjecucion, opcional): Si se indica, se cuenta el resultado del elemento
+            (con oferta, sin oferta, fuera de vigencia, tipo de condición no reconocido).
+        cache_ofertas (CacheOfertas, opcional): Caché de la oferta resuelta por Llave y Fecha.
+            Sin caché, la oferta se resuelve para cada venta.
     Returns:
         None: La función modifica el diccionario `primer_elemento` directamente.
     El procesamiento incluye:
         - Asignación de EAN y Valuacion Unitaria basándose en el código del producto.
-        - Validación del cliente y generación de una llave única.
+        - Validación del cliente, su RETAIL PAGO y generación de una llave única.
         - Verificación de ofertas aplicables y actualización de datos financieros y de condiciones de costo.
     """
-    logging.info(f"Procesando elemento: {primer_elemento.get('Producto Código', 'Desconocido')}")
-    
+    # Procesar Fecha: se convierte una sola vez a ordinal para comparar con la vigencia como entero.
+    # Si viene como ordinal (generarJson.py), la salida final la conserva en texto para Excel y Node.
+    fecha_ordinal = convertir_fecha_ordinal(primer_elemento.get("Fecha", None))
+    if fecha_ordinal is not None and isinstance(primer_elemento["Fecha"], int):
+        primer_elemento["Fecha"] = formatear_fecha_ordinal(fecha_ordinal)
+
     # Procesar Producto Código y EAN
+    codigo_base = None
     if "Producto Código" in primer_elemento:
         producto_codigo = primer_elemento["Producto Código"]
         codigo_base = producto_codigo[:-2]
         primer_elemento["EAN"] = codigo_base
-        primer_elemento["Valuacion Unitaria"] = productos_dict.get(codigo_base, {}).get("Costo de Reposicion", None)
+        primer_elemento["Valuacion Unitaria"] = catalogoProductos.valor_producto(productos_dict, codigo_base, "Costo de Reposicion")
 
-    # Procesar ACCOUNT_NUMBER y Validacion Cliente
+    # Procesar ACCOUNT_NUMBER y Validacion Cliente (sin ACCOUNT_NUMBER, la venta usa la Llave que trae)
+    retail_pago = cuboBeneficio.SIN_RETAIL_PAGO
     if "ACCOUNT_NUMBER" in primer_elemento:
         account_number = primer_elemento["ACCOUNT_NUMBER"]
         cliente_encontrado = clientes_dict.get(account_number, {})
         primer_elemento["Validacion Cliente"] = cliente_encontrado.get("Aplica", "No")
         retail_pago = cliente_encontrado.get("RETAIL PAGO", "No")
-        
+        primer_elemento["RETAIL PAGO"] = retail_pago
+
         primer_elemento["Llave"] = f"{retail_pago}{primer_elemento['EAN']}"
 
     # Procesar Llave y ofertas
     if "Llave" in primer_elemento:
         llave = primer_elemento["Llave"]
-        oferta_encontrada = ofertas_dict.get(llave, {})
-        
-        # Verificar si hay una oferta para esa llave
-        if oferta_encontrada:
-            # Obtener la fecha del archivo 'Base_Venta_detalle_Fanasa.json'
-            fecha = primer_elemento.get("Fecha", None)
-            
-            # Obtener las fechas de vigencia de la oferta
-            fecha_inicio_vigencia = oferta_encontrada.get("Fecha inicio vigencia", None)
-            fecha_fin_vigencia = oferta_encontrada.get("Fecha fin vigencia", None)
-            
-            # Verificar si las fechas son válidas y si la fecha está dentro del rango
-            if fecha and fecha_inicio_vigencia and fecha_fin_vigencia and verificar_vigencia(fecha, fecha_inicio_vigencia, fecha_fin_vigencia):
-                # Asignar datos de oferta si la fecha está dentro del rango de vigencia
-                primer_elemento["CAP"] = float(oferta_encontrada.get("CAP", 0.0))
-                primer_elemento["OFERTA"] = float(oferta_encontrada.get("Oferta", 0.0))
-
-                
-                #ajustar aquiiiiiiiiiiiiiiiiiiiii
-                # Obtener el "Tipo de Valuacion" desde el diccionario de ofertas
-                tipo_valuacion = oferta_encontrada.get("Nombre regla", None)
-                if tipo_valuacion and codigo_base in productos_dict:
-                    #Si tipo_valuacion es Costo FIjo entonces se debe obtener el valor de "Costo Fijo" que viene en la oferta
-                    if tipo_valuacion == "Costo Fijo":
-                        primer_elemento["Valor Tipo de Valuacion"] = oferta_encontrada.get("Costo Fijo", None)
-                        primer_elemento["Tipo de Valuacion"] = tipo_valuacion
-                    else:
-                        primer_elemento["Valor Tipo de Valuacion"] = productos_dict[codigo_base].get(tipo_valuacion, None)
-                        primer_elemento["Tipo de Valuacion"] = tipo_valuacion  # Agregamos el tipo de valuación
-                    #!================AQUI HACER EL AJUSTE DE NOMBRE REGLA
-                    
-                    
-                # Obtener el "Tipo condicion costo" desde el diccionario de ofertas 
-                tipo_condicion_costo = oferta_encontrada.get("Tipo condicion costo", None)
-                if tipo_condicion_costo:
-                    primer_elemento["Tipo condicion costo"] = tipo_condicion_costo
-
-                # Calcular condiciones de costo
-                calcular_condicion_costo(primer_elemento)
-
-                # Calcular campos financieros
-                calcular_campos_financieros(primer_elemento)
+
+        # Verificar si hay una oferta para esa llave (las llaves sin ofertas no ocupan la caché)
+        if llave in ofertas_dict:
+            if cache_ofertas is not None:
+                campos_oferta = cache_ofertas.resolver(llave, fecha_ordinal, codigo_base)
             else:
-                logging.warning(f"La fecha {fecha} no está dentro del rango de vigencia para la oferta con llave {llave} fecha inicio {fecha_inicio_vigencia} {fecha_fin_vigencia}" )
-        else:
-            logging.warning(f"No se encontró oferta para la llave {llave}")   
+                campos_oferta = resolver_oferta(ofertas_dict, productos_dict, llave, fecha_ordinal, codigo_base)
+            if campos_oferta:
+                # Asignar datos de oferta (CAP, OFERTA, valuación y tipo de condición) si la fecha
+                # está dentro del rango de vigencia
+                primer_elemento.update(campos_oferta)
+
+                # Calcular condiciones de costo y campos financieros
+                calcular_condicion_costo(primer_elemento, financieros=True)
+
+                if metricas is not None:
+                    metricas.contar("con_oferta")
+                    if metricas.cubo is not None and "Total Beneficio" in primer_elemento:
+                        metricas.cubo.agregar(retail_pago, llave, primer_elemento.get("Tipo de Valuacion", None),
+                                              fecha_ordinal, primer_elemento)
+                    if primer_elemento.get("Tipo condicion costo", None) not in condicionesCosto.CONDICIONES:
+                        metricas.contar("condicion_no_reconocida")
+            elif metricas is not None:
+                # La fecha no está dentro del rango de vigencia de ninguna oferta de la llave
+                metricas.contar("fuera_de_vigencia")
+        elif metricas is not None:
+            metricas.registrar_sin_oferta(llave)
+
+# Función para agrupar un iterable en lotes
+def agrupar_en_lotes(elementos, tamano):
+    """
+    Agrupa los elementos de un iterable en listas de hasta `tamano` elementos.
+
+    Args:
+        elementos (iterable): Los elementos a agrupar.
+        tamano (int): La cantidad máxima de elementos por lote.
+
+    Yields:
+        list: Cada lote, en el orden original.
+    """
+    iterador = iter(elementos)
+    while lote := list(islice(iterador, tamano)):
+        yield lote
+
+# Función para procesar en flujo los elementos de sell_out
+def procesar_elementos_stream(elementos, productos_dict, clientes_dict, ofertas_dict, motor="registro", metricas=None,
+                              cache_ofertas=None):
+    """
+    Procesa los elementos de sell_out a medida que se consumen.
+
+    Args:
+        elementos (iterable): Los elementos de sell_out a procesar.
+        productos_dict (dict): Diccionario que contiene información de productos.
+        clientes_dict (dict): Diccionario que contiene información de clientes.
+        ofertas_dict (dict): Índice de ofertas por Llave generado por `construir_indice_ofertas`.
+        motor (str): "registro" procesa uno a uno con `procesar_elemento`; "vectorizado" procesa
+            lotes de TAMANO_LOTE elementos con `motorVectorizado.procesar_ventas_vectorizado`.
+        metricas (MetricasEjecucion, opcional): Métricas donde se cuentan los resultados.
+        cache_ofertas (CacheOfertas, opcional): Caché de ofertas del motor por registro, para
+            compartirla entre varias llamadas; por defecto se crea una de TAMANO_CACHE_OFERTAS.
+
+    Yields:
+        dict: Cada elemento ya enriquecido, en el orden original.
+    """
+    if motor == "vectorizado":
+        for lote in agrupar_en_lotes(elementos, TAMANO_LOTE):
+            yield from motorVectorizado.procesar_ventas_vectorizado(lote, productos_dict, clientes_dict, ofertas_dict, metricas)
+        return
+
+    if cache_ofertas is None:
+        cache_ofertas = CacheOfertas(ofertas_dict, productos_dict)
+    try:
+        for index, primer_elemento in enumerate(elementos):
+            procesar_elemento(primer_elemento, productos_dict, clientes_dict, ofertas_dict, metricas, cache_ofertas)
+            if metricas is not None:
+                metricas.contar("procesados")
+                metricas.muestrear(index, primer_elemento)
+            yield primer_elemento
+    finally:
+        cache_ofertas.reportar(metricas)
+
+# Función para verificar si las ventas se pueden leer por lotes Arrow (motor compacto)
+def admite_lotes(ruta):
+    if intermedios.es_indice(ruta):
+        return all(admite_lotes(particion) for particion in intermedios.rutas_de_indice(ruta))
+    return ruta.endswith(intermedios.EXTENSIONES["parquet"]) and os.path.isfile(ruta)
+
+# Función para enriquecer lotes Arrow con el motor compacto
+def procesar_lotes_compactos(lotes, productos_dict, clientes_dict, ofertas_dict, metricas=None):
+    """
+    Enriquece las ventas lote por lote sin convertirlas a diccionarios: cada lote queda como un
+    `motorVectorizado.LoteCompacto`, que arma los diccionarios recién al serializarse.
+
+    Args:
+        lotes (iterable): Tuplas (pyarrow.RecordBatch, columnas JSON) de `intermedios.leer_lotes`.
+        productos_dict (dict): Diccionario que contiene información de productos.
+        clientes_dict (dict): Diccionario que contiene información de clientes.
+        ofertas_dict (dict): Índice de ofertas por Llave generado por `construir_indice_ofertas`.
+        metricas (MetricasEjecucion, opcional): Métricas donde se cuentan los resultados.
+
+    Yields:
+        motorVectorizado.LoteCompacto: Cada lote enriquecido, en el orden original.
+    """
+    desplazamiento = 0
+    for lote, columnas_json in lotes:
+        yield motorVectorizado.procesar_lote_compacto(lote, columnas_json, productos_dict, clientes_dict,
+                                                      ofertas_dict, metricas, desplazamiento)
+        desplazamiento += lote.num_rows
+
+# Función para recorrer como diccionarios las ventas de varios lotes compactos
+def registros_compactos(lotes):
+    for lote in lotes:
+        yield from lote.registros()
+
+# Tablas de búsqueda de cada proceso trabajador. Se reciben una sola vez al iniciar el proceso
+# (con 'fork' se heredan sin copiarse), nunca con cada lote.
+_tablas_trabajador = {}
+
+# Función para inicializar un proceso trabajador
+def _inicializar_trabajador(productos_dict, clientes_dict, ofertas_dict, motor, muestreo, cubo, tamano_cache):
+    # La caché de ofertas dura lo que el proceso, así que sirve para todos sus lotes
+    cache_ofertas = CacheOfertas(ofertas_dict, productos_dict, tamano_cache) if motor == "registro" else None
+    _tablas_trabajador.update(productos_dict=productos_dict, clientes_dict=clientes_dict,
+                              ofertas_dict=ofertas_dict, motor=motor, muestreo=muestreo, cubo=cubo,
+                              cache_ofertas=cache_ofertas)
+
+# Función que ejecuta cada proceso trabajador sobre un lote de ventas
+def _procesar_lote_trabajador(lote):
+    tablas = dict(_tablas_trabajador)
+    metricas_lote = MetricasEjecucion(tablas.pop("muestreo"), cuboBeneficio.CuboBeneficio() if tablas.pop("cubo") else None)
+    for _ in procesar_elementos_stream(lote, metricas=metricas_lote, **tablas):
+        pass
+    return lote, metricas_lote
+
+# Función para procesar los elementos de sell_out en varios procesos
+def procesar_en_paralelo(elementos, productos_dict, clientes_dict, ofertas_dict, workers, motor="registro", metricas=None,
+                         tamano_cache=TAMANO_CACHE_OFERTAS):
+    """
+    Procesa los elementos de sell_out en lotes de TAMANO_LOTE repartidos en un grupo de procesos.
+
+    Las tablas de búsqueda se entregan a cada proceso una sola vez al iniciarlo y son de solo lectura.
+    Solo se mantienen `2 * workers` lotes en proceso a la vez, por lo que la entrada puede ser un flujo.
+
+    Args:
+        elementos (iterable): Los elementos de sell_out a procesar.
+        productos_dict (dict): Diccionario que contiene información de productos.
+        clientes_dict (dict): Diccionario que contiene información de clientes.
+        ofertas_dict (dict): Índice de ofertas por Llave generado por `construir_indice_ofertas`.
+        workers (int): Cantidad de procesos trabajadores.
+        motor (str): El motor de enriquecimiento que usa cada proceso ("registro" o "vectorizado").
+        metricas (MetricasEjecucion, opcional): Métricas donde se combinan las de cada lote.
+        tamano_cache (int): Tamaño de la caché de ofertas de cada proceso (`CacheOfertas`).
+
+    Yields:
+        dict: Cada elemento ya enriquecido, en el orden original.
+    """
+    logging.info(f"Procesando en paralelo con {workers} procesos y lotes de {TAMANO_LOTE} elementos.")
+    with ProcessPoolExecutor(max_workers=workers, initializer=_inicializar_trabajador,
+                             initargs=(productos_dict, clientes_dict, ofertas_dict, motor,
+                                       metricas.muestreo if metricas is not None else 0,
+                                       metricas is not None and metricas.cubo is not None, tamano_cache)) as executor:
+        pendientes = deque()
+
+        # Función para recibir el lote más antiguo y combinar sus métricas
+        def recibir_lote():
+            lote, metricas_lote = pendientes.popleft().result()
+            if metricas is not None:
+                metricas.combinar(metricas_lote)
+            return lote
+
+        for lote in agrupar_en_lotes(elementos, TAMANO_LOTE):
+            pendientes.append(executor.submit(_procesar_lote_trabajador, lote))
+            if len(pendientes) >= 2 * workers:
+                yield from recibir_lote()
+        while pendientes:
+            yield from recibir_lote()
+
+# Funciones para armar el índice de búsqueda de productos y de clientes
+def indice_productos(productos):
+    return {producto["Producto Código"][:-2]: producto for producto in productos}
+
+def indice_clientes(clientes):
+    return {cliente["NUMERO FARMACIA"]: cliente for cliente in clientes}
+
+# Catálogo -> función que arma su índice de búsqueda a partir de los registros
+INDICES_CATALOGOS = {"productos": indice_productos, "clientes": indice_clientes, "ofertas": construir_indice_ofertas}
+
+# Función para cargar un catálogo y armar su índice (se ejecuta en un hilo del grupo de carga)
+def preparar_catalogo(nombre, ruta, tablas):
+    """
+    Args:
+        nombre (str): "productos", "clientes" u "ofertas".
+        ruta (str): La ruta del archivo del catálogo.
+        tablas (dict): Registros ya cargados en memoria, por nombre; se usan en lugar del archivo.
+
+    Returns:
+        tuple: (registros, índice de búsqueda). El índice es None si el catálogo no se pudo
+        cargar o está vacío. Los productos leídos de un archivo se devuelven como el catálogo
+        mapeado de `catalogoProductos`, tanto en lugar de los registros como del índice.
+    """
+    ruta_resuelta = intermedios.resolver_ruta(ruta)
+    if nombre == "productos" and nombre not in tablas and not intermedios.es_indice(ruta_resuelta):
+        catalogo = catalogoProductos.obtener_catalogo(ruta_resuelta, lambda: indice_productos(cargar_datos(ruta) or []))
+        return catalogo, catalogo or None
+    registros = tablas[nombre] if nombre in tablas else cargar_datos(ruta)
+    if not registros:
+        return registros, None
+    return registros, INDICES_CATALOGOS[nombre](registros)
+
+# Función para obtener las rutas de los archivos de cada catálogo
+def rutas_catalogos():
+    return {"productos": RUTA_PRODUCTOS, "clientes": RUTA_CLIENTES, "ofertas": RUTA_OFERTAS}
+
+# Función para cargar los catálogos y armar sus índices, un hilo por catálogo
+def cargar_catalogos(tablas, metricas, perfil):
+    """
+    Args:
+        tablas (dict): Registros ya cargados en memoria, por nombre (ver `preparar_catalogo`).
+        metricas (MetricasEjecucion): Métricas donde se registra la etapa de carga.
+        perfil (perfilado.Perfilador): Perfilador donde se registra la etapa de carga.
+
+    Returns:
+        dict: El índice de búsqueda de "productos", "clientes" y "ofertas", en ese orden, o
+        None si algún catálogo no se pudo cargar o está vacío.
+    """
+    rutas = rutas_catalogos()
+    entradas = [intermedios.resolver_ruta(ruta) for nombre, ruta in rutas.items() if nombre not in tablas]
+    with metricas.etapa("carga"), perfil.etapa("carga", entradas) as etapa:
+        with ThreadPoolExecutor(max_workers=len(INDICES_CATALOGOS), thread_name_prefix="catalogo") as executor:
+            futuros = {nombre: executor.submit(preparar_catalogo, nombre, rutas[nombre], tablas) for nombre in INDICES_CATALOGOS}
+            catalogos = {nombre: futuro.result() for nombre, futuro in futuros.items()}
+        etapa["filas_entrada"] = sum(len(registros) for registros, _ in catalogos.values() if registros)
+    if any(indice is None for _, indice in catalogos.values()):
+        return None
+    return {nombre: catalogos[nombre][1] for nombre in ("productos", "clientes", "ofertas")}
+
+# Campos de las ventas con los que se buscan sus filas en el almacén de catálogos
+CAMPOS_CONSULTA_ALMACEN = ["Producto Código", "EAN", "ACCOUNT_NUMBER", "Llave", "Fecha"]
+
+# Función para armar, desde el almacén, los índices de búsqueda que usa un lote de ventas
+def catalogos_de_lote(almacen, ventas):
+    """
+    Consulta al almacén solo las filas que puede usar el lote: los productos de sus EAN, los
+    clientes de sus ACCOUNT_NUMBER y las ofertas de sus Llaves (la que traen o la que arma
+    `procesar_elemento` con el RETAIL PAGO del cliente) que se superponen con sus fechas. Los
+    índices tienen la misma forma que los de los archivos completos, así que los motores no cambian.
+
+    Args:
+        almacen (almacenCatalogos.AlmacenCatalogos): El almacén de catálogos.
+        ventas (list): Las ventas (dict) del lote; pueden tener solo los CAMPOS_CONSULTA_ALMACEN.
+
+    Returns:
+        tuple: (productos_dict, clientes_dict, ofertas_dict) con las filas del lote.
+    """
+    codigos = [venta["Producto Código"] for venta in ventas if isinstance(venta.get("Producto Código"), str)]
+    productos_dict = indice_productos(almacen.productos({codigo[:-2] for codigo in codigos}))
+    clientes_dict = indice_clientes(almacen.clientes({venta["ACCOUNT_NUMBER"] for venta in ventas if "ACCOUNT_NUMBER" in venta}))
+
+    llaves = set()
+    fechas = set()
+    for venta in ventas:
+        if "Llave" in venta:
+            llaves.add(venta["Llave"])
+        if "ACCOUNT_NUMBER" in venta:
+            codigo = venta.get("Producto Código")
+            ean = codigo[:-2] if isinstance(codigo, str) else venta.get("EAN")
+            llaves.add(f"{clientes_dict.get(venta['ACCOUNT_NUMBER'], {}).get('RETAIL PAGO', 'No')}{ean}")
+        fechas.add(convertir_fecha_ordinal(venta.get("Fecha", None)))
+    fechas.discard(None)
+    existentes, ofertas = almacen.ofertas(llaves, min(fechas, default=None), max(fechas, default=None))
+    ofertas_dict = construir_indice_ofertas(ofertas)
+    for llave in existentes:
+        # Llaves con ofertas, pero ninguna en las fechas del lote: la venta queda fuera de vigencia
+        ofertas_dict.setdefault(llave, construir_indice_ofertas([{"Llave": llave}])[llave])
+    return productos_dict, clientes_dict, ofertas_dict
+
+# Función para procesar las ventas con los catálogos consultados al almacén lote por lote
+def procesar_con_almacen(lotes, almacen, motor="registro", metricas=None, tamano_cache=TAMANO_CACHE_OFERTAS):
+    """
+    Args:
+        lotes (iterable): Los lotes de `leer_ventas_por_lotes` (tuplas Arrow con el motor compacto).
+        almacen (almacenCatalogos.AlmacenCatalogos): El almacén de catálogos.
+        motor (str): El motor de enriquecimiento ("registro", "vectorizado" o "compacto").
+        metricas (MetricasEjecucion, opcional): Métricas donde se cuentan los resultados.
+        tamano_cache (int): Tamaño de la caché de ofertas de cada lote (`CacheOfertas`).
+
+    Yields:
+        Con el motor compacto, cada `motorVectorizado.LoteCompacto`; con los demás, cada venta
+        ya enriquecida, en el orden original.
+    """
+    if motor == "compacto":
+        desplazamiento = 0
+        for lote, columnas_json in lotes:
+            campos = [campo for campo in CAMPOS_CONSULTA_ALMACEN if campo in lote.schema.names]
+            columnas = lote.select(campos)
+            tablas = catalogos_de_lote(almacen, intermedios.a_registros(columnas, [c for c in columnas_json if c in campos]))
+            yield motorVectorizado.procesar_lote_compacto(lote, columnas_json, *tablas, metricas, desplazamiento)
+            desplazamiento += lote.num_rows
+        return
+
+    tamano = TAMANO_LOTE if motor == "vectorizado" else LOTE_LECTURA_VENTAS
+    for lote in agrupar_en_lotes(chain.from_iterable(lotes), tamano):
+        productos_dict, clientes_dict, ofertas_dict = catalogos_de_lote(almacen, lote)
+        cache_ofertas = CacheOfertas(ofertas_dict, productos_dict, tamano_cache) if motor == "registro" else None
+        yield from procesar_elementos_stream(lote, productos_dict, clientes_dict, ofertas_dict, motor, metricas, cache_ofertas)
+
+# Función para leer las ventas por lotes, en la forma que usa cada motor
+def leer_ventas_por_lotes(ruta, compacto=False, streaming=False):
+    """
+    Lee el archivo de ventas de a un lote por vez, para enriquecer cada lote en cuanto se lee.
+
+    Args:
+        ruta (str): La ruta del archivo de ventas, ya resuelta con `intermedios.resolver_ruta`.
+        compacto (bool): Si es True, entrega lotes Arrow para el motor compacto.
+        streaming (bool): Sin streaming, un archivo JSON se carga completo como un solo lote
+            (más rápido que leerlo en flujo); en streaming se lee en flujo.
+
+    Yields:
+        Con el motor compacto, tuplas (pyarrow.RecordBatch, columnas JSON); con los demás, listas
+        de ventas (dict).
+    """
+    if compacto:
+        yield from intermedios.leer_lotes(ruta, TAMANO_LOTE, categoricas=motorVectorizado.CAMPOS_CATEGORICOS)
+    elif admite_lotes(ruta):
+        logging.info(f"Leyendo archivo en flujo: {ruta}")
+        for lote, columnas_json in intermedios.leer_lotes(ruta, LOTE_LECTURA_VENTAS):
+            yield intermedios.a_registros(lote, columnas_json)
+    elif streaming:
+        yield from agrupar_en_lotes(leer_datos_stream(ruta), LOTE_LECTURA_VENTAS)
+    elif ventas := cargar_datos(ruta):
+        yield ventas
+
+# Función para registrar como hito el momento en que se obtiene el primer elemento de un iterable
+def con_hito(elementos, metricas, nombre):
+    iterador = iter(elementos)
+    for primero in iterador:
+        metricas.marcar(nombre)
+        yield primero
+        break
+    yield from iterador
 
 # Función principal para procesar los archivos
-def procesar_archivos():
+def procesar_archivos(streaming=False, formato_salida="json", motor="registro", workers=1, muestreo_debug=0, perfil=None, tablas=None,
+                      formato_json=None, cubo=True, acumular_cubo=False, tamano_cache_ofertas=TAMANO_CACHE_OFERTAS,
+                      ruta_almacen=None, particionar=False, punto_control=0, reanudar=False):
     """
     Procesa varios archivos JSON y realiza operaciones sobre los datos cargados.
     La función realiza las siguientes operaciones:
-    1. Carga varios archivos JSON: datos, productos, clientes y ofertas.
-    2. Verifica que todos los archivos se hayan cargado correctamente.
-    3. Crea diccionarios a partir de los datos cargados para facilitar el acceso.
-    4. Itera sobre los elementos de los datos cargados y los procesa.
-    5. Guarda los datos modificados en un archivo de salida.
+    1. Empieza a leer las ventas por lotes en un hilo aparte (lectura anticipada).
+    2. Mientras tanto, carga productos, clientes y ofertas en paralelo (un hilo por catálogo),
+       cada uno con su diccionario de búsqueda, y verifica que se hayan cargado correctamente.
+       Con `ruta_almacen` no se cargan: cada lote consulta al almacén solo las filas que usa.
+    3. Procesa cada lote de ventas en cuanto está leído y los catálogos están listos.
+    4. Guarda los datos modificados en un archivo de salida (en streaming, desde un hilo de
+       escritura que serializa mientras se procesan los lotes siguientes).
+    5. Guarda el cubo de beneficio que los motores acumularon mientras procesaban las ventas
+       (`cuboBeneficio`), junto al archivo de salida.
     Si alguno de los archivos no se puede cargar, la función imprime un mensaje de error y termina.
     Variables globales esperadas:
-    - RUTA_ARCHIVO: Ruta del archivo JSON de datos.
-    - RUTA_PRODUCTOS: Ruta del archivo JSON de productos.
-    - RUTA_CLIENTES: Ruta del archivo JSON de clientes.
-    - RUTA_OFERTAS: Ruta del archivo JSON de ofertas.
-    - OUTPUT_FILE_PATH: Ruta del archivo JSON donde se guardarán los datos modificados.
+    - RUTA_ARCHIVO: Ruta del archivo de datos (Parquet o JSON).
+    - RUTA_PRODUCTOS: Ruta del archivo de productos (Parquet o JSON).
+    - RUTA_CLIENTES: Ruta del archivo de clientes (Parquet o JSON).
+    - RUTA_OFERTAS: Ruta del archivo de ofertas (Parquet o JSON).
+    - OUTPUT_FILE_PATH: Ruta del archivo JSON donde se guardarán los datos modificados (con la
+      extensión de la compresión, si `formato_json` comprime).
+    Args:
+        streaming (bool): Si es True, las ventas se leen, procesan y escriben una a una, de modo
+            que la memoria no depende del tamaño de RUTA_ARCHIVO.
+        formato_salida (str): "json" para un arreglo JSON o "jsonl" para JSON Lines (un objeto
+            por línea). JSON Lines solo está disponible en modo streaming.
+        motor (str): "registro" aplica `procesar_elemento` a cada venta; "vectorizado" usa el
+            motor columnar de `motorVectorizado`, con el mismo resultado; "compacto" usa el mismo
+            motor columnar pero mantiene las ventas en lotes Arrow y arreglos de NumPy, y solo arma
+            los diccionarios al escribir la salida (requiere las ventas en Parquet y un solo proceso).
+        workers (int): Cantidad de procesos para el enriquecimiento. Con más de 1, las ventas se
+            reparten en lotes entre varios procesos y se reúnen en el orden original.
+        muestreo_debug (int): Si es mayor que 0, se escribe en el log de depuración uno de cada
+            `muestreo_debug` elementos procesados.
+        perfil (perfilado.Perfilador, opcional): Perfilador donde se registra cada etapa (carga de
+            catálogos e índices, enriquecimiento y escritura). Sin perfilador las etapas no se perfilan.
+        tablas (dict, opcional): Registros ya cargados en memoria, por nombre ("ventas", "productos",
+            "clientes" u "ofertas"), que se usan en lugar de leer el archivo correspondiente.
+        formato_json (serializacion.FormatoJson, opcional): Serializador, indentación y compresión
+            del archivo de salida; por defecto JSON indentado con 4 espacios, sin comprimir.
+        cubo (bool): Si es True, se acumula el cubo de beneficio y se guarda en
+            `cuboBeneficio.ruta_cubo(OUTPUT_FILE_PATH)`.
+        acumular_cubo (bool): Si es True, el cubo de esta ejecución se suma al cubo ya guardado en
+            lugar de reemplazarlo (para agregar ventas o días nuevos sin reprocesar los anteriores).
+        tamano_cache_ofertas (int): Combinaciones (Llave, Fecha) cuya oferta resuelta recuerda el
+            motor por registro (`CacheOfertas`); 0 la resuelve en cada venta.
+        ruta_almacen (str, opcional): Base SQLite de `almacenCatalogos` (la que actualiza
+            generarJson.py con --almacen) de la que se consultan los catálogos lote por lote, en
+            lugar de cargar sus archivos completos. Se ignora si los catálogos vienen en `tablas`.
+        particionar (bool): Si es True, la salida se escribe en un archivo por mes de la Fecha y
+            RETAIL PAGO (`particionesSalida`) en la carpeta de OUTPUT_FILE_PATH sin extensión, con
+            un manifiesto (particiones, filas y checksums) en su índice .indice.json.
+        punto_control (int): Si es mayor que 0, las ventas se enriquecen de a partes de
+            `punto_control` filas y cada parte se guarda en disco con el progreso (`puntosControl`)
+            antes de seguir; al final la salida se arma desde las partes. Con --workers, cada
+            parte se reparte entre los procesos por separado.
+        reanudar (bool): Si es True (con `punto_control`), se sigue desde la última parte completa
+            de una ejecución anterior que falló, si sus archivos de entrada y su motor son los mismos.
+    Returns:
+        MetricasEjecucion: Las métricas de la ejecución (también se escriben en el log como
+        resumen), o None si la ejecución no se pudo completar.
+    """
+    if formato_salida not in FORMATOS_SALIDA:
+        logging.error(f"Formato de salida no reconocido: {formato_salida}")
+        return
+    if motor not in MOTORES:
+        logging.error(f"Motor no reconocido: {motor}")
+        return
+    if formato_salida == "jsonl" and not streaming:
+        logging.error("El formato 'jsonl' solo está disponible en modo streaming.")
+        return
+
+    metricas = MetricasEjecucion(muestreo_debug, cuboBeneficio.CuboBeneficio() if cubo else None)
+    if perfil is None:
+        perfil = perfilado.INACTIVO
+    formato_json = formato_json or serializacion.FORMATO_PREDETERMINADO
+    tablas = tablas or {}
+
+    ruta_ventas = intermedios.resolver_ruta(RUTA_ARCHIVO)
+    compacto = motor == "compacto"
+    if compacto and ("ventas" in tablas or not admite_lotes(ruta_ventas)):
+        logging.warning("El motor compacto requiere las ventas en Parquet; se usa el motor vectorizado.")
+        motor, compacto = "vectorizado", False
+    if compacto and workers > 1:
+        logging.warning("El motor compacto se ejecuta en un solo proceso; se ignora --workers.")
+        workers = 1
+    if ruta_almacen and any(nombre in tablas for nombre in INDICES_CATALOGOS):
+        logging.warning("Los catálogos ya están en memoria; no se consulta el almacén de catálogos.")
+        ruta_almacen = None
+    if ruta_almacen and workers > 1:
+        logging.warning("El almacén de catálogos se consulta en un solo proceso; se ignora --workers.")
+        workers = 1
+
+    if reanudar and punto_control <= 0:
+        logging.warning("Solo se puede reanudar con puntos de control (--punto-control); se ignora --reanudar.")
+
+    if "ventas" not in tablas and not os.path.isfile(ruta_ventas):
+        logging.error(f"El archivo no se encontró en la ruta especificada: {ruta_ventas}")
+        return
+
+    almacen = None
+    if ruta_almacen:
+        with metricas.etapa("carga"), perfil.etapa("carga", [ruta_almacen]):
+            almacen = almacenCatalogos.abrir_almacen(ruta_almacen)
+        if almacen is None or not almacen.completo():
+            logging.error(f"El almacén de catálogos no existe o no tiene todos los catálogos: {ruta_almacen}")
+            if almacen is not None:
+                almacen.conexion.close()
+            return
+
+    if particionar:
+        ruta_salida = os.path.splitext(OUTPUT_FILE_PATH)[0] + intermedios.EXTENSION_INDICE
+    elif formato_salida == "jsonl":
+        ruta_salida = formato_json.ruta(os.path.splitext(OUTPUT_FILE_PATH)[0] + ".jsonl")
+    else:
+        ruta_salida = formato_json.ruta(OUTPUT_FILE_PATH)
+
+    puntos = None
+    if punto_control > 0:
+        rutas = {"ventas": None if "ventas" in tablas else ruta_ventas}
+        if ruta_almacen:
+            rutas["almacen"] = ruta_almacen
+        else:
+            rutas.update((nombre, None if nombre in tablas else intermedios.resolver_ruta(ruta))
+                         for nombre, ruta in rutas_catalogos().items())
+        puntos = puntosControl.PuntosControl(puntosControl.carpeta_puntos_control(OUTPUT_FILE_PATH),
+                                             puntosControl.huellas_entradas(rutas),
+                                             {"motor": motor, "cubo": cubo, "serializador": formato_json.serializador,
+                                              "indentacion": formato_json.indentacion}, reanudar)
+        if puntos.reanudada:
+            puntos.restaurar(metricas)
+            logging.info(f"Se reanuda la ejecución anterior: {puntos.progreso['filas']} ventas ya enriquecidas "
+                         f"en {len(puntos.progreso['partes'])} partes.")
+        elif reanudar:
+            logging.warning(f"No se puede reanudar ({puntos.motivo}); se empieza desde el principio.")
+
+    # Las ventas se empiezan a leer en otro hilo mientras se cargan los catálogos
+    if puntos is not None and puntos.progreso["completo"]:
+        lectura = nullcontext([])  # Ya están todas enriquecidas; solo falta armar la salida
+    elif "ventas" in tablas:
+        lectura = nullcontext([tablas["ventas"]])
+    else:
+        lectura = concurrencia.LecturaAnticipada(leer_ventas_por_lotes(ruta_ventas, compacto, streaming or puntos is not None),
+                                                 LOTES_ANTICIPADOS, "lectura-ventas")
+    with lectura as lotes_ventas, almacen or nullcontext():
+        if almacen is None:
+            indices = cargar_catalogos(tablas, metricas, perfil)
+            if indices is None:
+                logging.error("No se pudieron cargar todos los archivos necesarios.")
+                return
+            productos_dict, clientes_dict, ofertas_dict = indices.values()
+        cache_ofertas = CacheOfertas(ofertas_dict, productos_dict, tamano_cache_ofertas) if almacen is None else None
+
+        # Función para enriquecer unos lotes de ventas con el motor elegido
+        def enriquecer(lotes, metricas_lotes):
+            if almacen is not None:
+                return procesar_con_almacen(lotes, almacen, motor, metricas_lotes, tamano_cache_ofertas)
+            if compacto:
+                return procesar_lotes_compactos(lotes, productos_dict, clientes_dict, ofertas_dict, metricas_lotes)
+            ventas = chain.from_iterable(lotes)
+            if workers > 1:
+                return procesar_en_paralelo(ventas, productos_dict, clientes_dict, ofertas_dict, workers, motor, metricas_lotes,
+                                            tamano_cache_ofertas)
+            return procesar_elementos_stream(ventas, productos_dict, clientes_dict, ofertas_dict, motor, metricas_lotes,
+                                             cache_ofertas)
+
+        if puntos is not None:
+            # Cada parte se enriquece y se guarda con su punto de control antes de seguir con la siguiente
+            with metricas.etapa("enriquecimiento"), perfil.etapa("enriquecimiento", [ruta_ventas]) as etapa:
+                try:
+                    etapa["filas_entrada"] = enriquecer_por_partes(lotes_ventas, enriquecer, puntos, metricas,
+                                                                   punto_control, compacto, formato_json)
+                except concurrencia.ErrorLectura as e:
+                    logging.error(f"Error al leer el archivo {ruta_ventas}: {e}")
+                    return
+                etapa["filas_salida"] = etapa["filas_entrada"]
+        elif streaming:
+            procesados = con_hito(enriquecer(lotes_ventas, metricas), metricas, "primer lote procesado")
+            elementos = registros_compactos(procesados) if compacto else procesados
+
+            # Función que ejecuta el hilo de escritura
+            def escribir(elementos_escritura):
+                if particionar:
+                    return guardar_particiones(OUTPUT_FILE_PATH, elementos_escritura, formato_salida, formato_json)
+                return guardar_json_stream(ruta_salida, elementos_escritura, formato_salida, formato_json)
+
+            # En streaming la lectura, el enriquecimiento y la escritura ocurren a la vez, en tres hilos
+            with metricas.etapa("enriquecimiento"), perfil.etapa("enriquecimiento", [ruta_ventas], [ruta_salida]) as etapa:
+                try:
+                    with concurrencia.EscrituraEnSegundoPlano(escribir) as escritura:
+                        for grupo in agrupar_en_lotes(elementos, GRUPO_ESCRITURA):
+                            if not escritura.enviar(grupo):
+                                break
+                except concurrencia.ErrorLectura as e:
+                    logging.error(f"Error al leer el archivo {ruta_ventas}: {e}")
+                    return
+                etapa["filas_salida"] = escritura.resultado
+            if escritura.resultado is None:
+                return
+        else:
+            procesados = con_hito(enriquecer(lotes_ventas, metricas), metricas, "primer lote procesado")
+            with metricas.etapa("enriquecimiento"), perfil.etapa("enriquecimiento", [ruta_ventas]) as etapa:
+                try:
+                    data = list(procesados)
+                except concurrencia.ErrorLectura as e:
+                    logging.error(f"Error al cargar el archivo {ruta_ventas}: {e}")
+                    return
+                filas_ventas = sum(map(len, data)) if compacto else len(data)
+                etapa["filas_entrada"] = etapa["filas_salida"] = filas_ventas
+
+    if puntos is not None:
+        if not puntos.progreso["filas"]:
+            logging.error("No se pudieron cargar todos los archivos necesarios.")
+            return
+
+        # La salida se arma desde las partes, con el mismo formato que sin puntos de control
+        with metricas.etapa("escritura"), perfil.etapa("escritura", salidas=[ruta_salida]) as etapa:
+            if particionar:
+                escritas = guardar_particiones(OUTPUT_FILE_PATH, puntos.elementos(), formato_salida, formato_json)
+            elif streaming:
+                # Las líneas de las partes ya son las de la salida en streaming: se copian sin decodificarlas
+                escritas = guardar_json_stream(ruta_salida, puntos.lineas(), formato_salida, formato_json)
+            else:
+                escritas = puntos.progreso["filas"] if guardar_json(ruta_salida, puntos.elementos(), formato_json) else None
+            etapa["filas_salida"] = escritas
+        if escritas is None:
+            logging.error(f"Las ventas enriquecidas quedan en {puntos.carpeta}; con --reanudar solo se vuelve a armar la salida.")
+            return
+    elif not streaming:
+        if not data:
+            logging.error("No se pudieron cargar todos los archivos necesarios.")
+            return
+
+        # Guardar el archivo modificado
+        with metricas.etapa("escritura"), perfil.etapa("escritura", salidas=[ruta_salida]) as etapa:
+            elementos = registros_compactos(data) if compacto else data
+            if particionar:
+                escritas = guardar_particiones(OUTPUT_FILE_PATH, elementos, "json", formato_json)
+            else:
+                escritas = filas_ventas if guardar_json(ruta_salida, elementos, formato_json) else None
+            etapa["filas_salida"] = escritas
+        if escritas is None:
+            return
+
+    if metricas.cubo is not None:
+        ruta_cubo = cuboBeneficio.ruta_cubo(OUTPUT_FILE_PATH)
+        with metricas.etapa("cubo"), perfil.etapa("cubo", salidas=[ruta_cubo]) as etapa:
+            etapa["filas_salida"] = celdas = guardar_cubo(metricas.cubo, ruta_cubo, acumular_cubo)
+        if celdas is None:
+            if puntos is not None:
+                logging.error(f"Las ventas enriquecidas quedan en {puntos.carpeta}; con --reanudar solo se vuelve a armar la salida.")
+            return
+
+    if puntos is not None:
+        puntos.eliminar()
+    logging.info(metricas.resumen())
+    return metricas
+
+# Función para enriquecer las ventas por partes, con un punto de control después de cada una
+def enriquecer_por_partes(lotes, enriquecer, puntos, metricas, tamano, compacto=False, formato_json=None):
+    """
+    Args:
+        lotes (iterable): Los lotes de `leer_ventas_por_lotes`, desde la primera venta.
+        enriquecer (callable): Recibe los lotes de una parte y sus métricas y devuelve las ventas
+            enriquecidas (los `LoteCompacto` con el motor compacto).
+        puntos (puntosControl.PuntosControl): Los puntos de control; las ventas de sus partes
+            completas se saltean.
+        metricas (MetricasEjecucion): Las métricas de la ejecución, a las que se suma cada parte
+            recién cuando está guardada.
+        tamano (int): Las ventas de cada parte.
+        compacto (bool): Si los lotes son del motor compacto.
+        formato_json (serializacion.FormatoJson, opcional): El formato de la salida; las partes
+            usan su serializador, sin compresión.
+
     Returns:
-        None
+        int: Las ventas enriquecidas en esta ejecución.
     """
-    # Cargar los archivos
-    data = cargar_json(RUTA_ARCHIVO)
-    productos = cargar_json(RUTA_PRODUCTOS)
-    clientes = cargar_json(RUTA_CLIENTES)
-    ofertas = cargar_json(RUTA_OFERTAS)
+    formato_json = formato_json or serializacion.FORMATO_PREDETERMINADO
+    # Las partes no se comprimen: son temporales y la salida se comprime una sola vez al armarla
+    formato_partes = serializacion.FormatoJson(formato_json.serializador, formato_json.indentacion)
+    total = 0
+    for lotes_parte in dividir_en_partes(lotes, tamano, puntos.progreso["filas"]):
+        # Cada parte tiene sus propias métricas, para que el progreso cuente solo partes completas
+        metricas_parte = MetricasEjecucion(metricas.muestreo, cuboBeneficio.CuboBeneficio() if metricas.cubo is not None else None)
+        procesados = enriquecer(lotes_parte, metricas_parte)
+        elementos = registros_compactos(procesados) if compacto else procesados
+
+        # La parte se serializa y se escribe en otro hilo mientras se enriquece, como en streaming
+        with concurrencia.EscrituraEnSegundoPlano(partial(puntos.guardar_parte, formato_json=formato_partes)) as escritura:
+            for grupo in agrupar_en_lotes(elementos, GRUPO_ESCRITURA):
+                if not escritura.enviar(grupo):
+                    break
+        nombre, filas = escritura.resultado
+        metricas.combinar(metricas_parte)
+        metricas.marcar("primer punto de control")
+        puntos.registrar(nombre, filas, metricas)
+        total += filas
+        logging.info(f"Punto de control: {puntos.progreso['filas']} ventas enriquecidas ({len(puntos.progreso['partes'])} partes).")
+    puntos.terminar()
+    return total
+
+# Función para dividir los lotes de ventas en partes con la misma cantidad de filas
+def dividir_en_partes(lotes, tamano, omitir=0):
+    """
+    Args:
+        lotes (iterable): Listas de ventas, o tuplas (pyarrow.RecordBatch, columnas JSON) con el
+            motor compacto.
+        tamano (int): Las ventas de cada parte.
+        omitir (int): Las ventas del principio que se saltean (las de partes ya completas).
 
-    if not all([data, productos, clientes, ofertas]):
-        logging.error("No se pudieron cargar todos los archivos necesarios.")
+    Yields:
+        list: Los lotes (o pedazos de lotes) de cada parte, con `tamano` ventas en total; la
+        última parte puede tener menos.
+    """
+    parte, filas = [], 0
+    for lote in lotes:
+        compacto = isinstance(lote, tuple)
+        total = lote[0].num_rows if compacto else len(lote)
+        inicio = min(omitir, total)
+        omitir -= inicio
+        while inicio < total:
+            cantidad = min(tamano - filas, total - inicio)
+            parte.append((lote[0].slice(inicio, cantidad), lote[1]) if compacto else lote[inicio:inicio + cantidad])
+            filas += cantidad
+            inicio += cantidad
+            if filas == tamano:
+                yield parte
+                parte, filas = [], 0
+    if parte:
+        yield parte
+
+# Función para sumar al cubo de beneficio las ventas ya enriquecidas
+def agregar_ventas_al_cubo(cubo, ventas):
+    """
+    Suma las ventas como lo hace el enriquecimiento (las que tienen oferta vigente y campos
+    financieros), con el RETAIL PAGO que guardó en cada venta ya escrita.
+    """
+    for venta in ventas:
+        if "Total Beneficio" in venta and "OFERTA" in venta:
+            cubo.agregar(particionesSalida.retail_pago_de_venta(venta), venta.get("Llave"),
+                         venta.get("Tipo de Valuacion", None), convertir_fecha_ordinal(venta.get("Fecha", None)), venta)
+
+# Función para escribir una partición de la salida incremental
+def escribir_particion(ruta, ventas, formato_json):
+    # Se escribe en un archivo temporal y se reemplaza, para no dejar una partición a medias
+    temporal = f"{ruta}.{os.getpid()}.tmp"
+    try:
+        with formato_json.abrir(temporal) as archivo:
+            formato_json.escribir_arreglo(archivo, ventas)
+        os.replace(temporal, ruta)
+    finally:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+
+# Función para procesar solo las ventas nuevas o afectadas por cambios en los catálogos
+def procesar_incremental(motor="registro", muestreo_debug=0, perfil=None, tablas=None, formato_json=None, cubo=True,
+                         tamano_cache_ofertas=TAMANO_CACHE_OFERTAS):
+    """
+    Enriquece solo lo que cambió desde la ejecución anterior y lo combina con la salida ya
+    escrita, que se guarda particionada por mes de la Fecha (más una partición para las ventas
+    sin fecha) en la carpeta de OUTPUT_FILE_PATH sin extensión, con un índice de las particiones
+    (`intermedios.guardar_indice`) en lugar de un solo archivo:
+    1. Compara la versión de cada producto, cliente y Llave de ofertas con la guardada en el
+       estado (`estadoIncremental`) y obtiene las ventas enriquecidas con alguna que cambió.
+    2. Recorre el archivo de ventas (con toda la historia) y enriquece solo las ventas nuevas o
+       modificadas y las afectadas por el paso 1. Las ventas del estado que ya no están en el
+       archivo se quitan de la salida.
+    3. Reescribe solo las particiones con algún cambio: las ventas que siguen quedan en su lugar,
+       las reenriquecidas se reemplazan y las nuevas se agregan al final, en el orden del archivo.
+    4. Recalcula el cubo de beneficio solo en los meses de las particiones reescritas.
+    Si no cambiaron ni el archivo de ventas ni ninguna venta por los catálogos, no se enriquece ni
+    se escribe ninguna partición.
+    Args:
+        motor (str): "registro" o "vectorizado" (el motor compacto usa el vectorizado).
+        muestreo_debug (int): Ver `procesar_archivos`.
+        perfil (perfilado.Perfilador, opcional): Ver `procesar_archivos`.
+        tablas (dict, opcional): Ver `procesar_archivos`.
+        formato_json (serializacion.FormatoJson, opcional): Serializador, indentación y
+            compresión de las particiones.
+        cubo (bool): Si es True, se mantiene el cubo de beneficio en `cuboBeneficio.ruta_cubo(OUTPUT_FILE_PATH)`.
+        tamano_cache_ofertas (int): Ver `procesar_archivos`.
+    Returns:
+        MetricasEjecucion: Las métricas de la ejecución, o None si no se pudo completar.
+    """
+    if motor not in MOTORES:
+        logging.error(f"Motor no reconocido: {motor}")
+        return
+    if motor == "compacto":
+        logging.warning("El motor compacto no se usa en modo incremental; se usa el motor vectorizado.")
+        motor = "vectorizado"
+
+    metricas = MetricasEjecucion(muestreo_debug)
+    if perfil is None:
+        perfil = perfilado.INACTIVO
+    formato_json = formato_json or serializacion.FORMATO_PREDETERMINADO
+    tablas = tablas or {}
+
+    ruta_ventas = intermedios.resolver_ruta(RUTA_ARCHIVO)
+    if "ventas" not in tablas and not os.path.isfile(ruta_ventas):
+        logging.error(f"El archivo no se encontró en la ruta especificada: {ruta_ventas}")
         return
+    carpeta = os.path.splitext(OUTPUT_FILE_PATH)[0]
+    ruta_cubo = cuboBeneficio.ruta_cubo(OUTPUT_FILE_PATH)
+
+    with estadoIncremental.EstadoIncremental(estadoIncremental.ruta_estado(OUTPUT_FILE_PATH)) as estado:
+        indices = cargar_catalogos(tablas, metricas, perfil)
+        if indices is None:
+            logging.error("No se pudieron cargar todos los archivos necesarios.")
+            return
+        productos_dict, clientes_dict, ofertas_dict = indices.values()
+
+        # 1. Claves de los catálogos que cambiaron y ventas enriquecidas con ellas
+        with metricas.etapa("versiones"):
+            rutas = rutas_catalogos()
+            cambios = {}
+            for nombre, indice in indices.items():
+                huella = None if nombre in tablas else estadoIncremental.huella_archivo(intermedios.resolver_ruta(rutas[nombre]))
+                if huella is not None and huella == estado.huella(nombre):
+                    continue  # El mismo archivo que en la ejecución anterior
+                cambios[nombre] = estado.cambios_catalogo(nombre, estadoIncremental.versiones_catalogo(nombre, indice))
+                if huella is not None:
+                    estado.guardar_huella(nombre, huella)
+                metricas.contar(f"cambios_{nombre}", len(cambios[nombre]))
+            afectadas = estado.claves_afectadas(cambios)
+            inconsistentes = estado.particiones_inconsistentes()
 
-    # Crear diccionario de ofertas
-    ofertas_dict = {oferta["Llave"]: oferta for oferta in ofertas}
-    productos_dict = {producto["Producto Código"][:-2]: producto for producto in productos}
-    clientes_dict = {cliente["NUMERO FARMACIA"]: cliente for cliente in clientes}
+        huella_ventas = None if "ventas" in tablas else estadoIncremental.huella_archivo(ruta_ventas)
+        if huella_ventas is not None and huella_ventas == estado.huella("ventas") and not afectadas and not inconsistentes:
+            # El índice se reescribe por si una ejecución con --particionar lo reemplazó (y con él
+            # se eliminan sus particiones por mes y RETAIL PAGO)
+            particionesSalida.reemplazar_indice(estado.rutas_particiones(), carpeta)
+            estado.confirmar()
+            logging.info("Las ventas no cambiaron y ningún cambio de los catálogos las afecta; no hay nada que procesar.")
+            logging.info(metricas.resumen())
+            return metricas
 
-    total_elementos = len(data)
+        # 2. Ventas nuevas, modificadas o afectadas, en el orden del archivo
+        claves_ventas = estadoIncremental.ClavesVentas()
+        pendientes = []  # (clave, partición, venta)
+        if "ventas" in tablas:
+            lectura = nullcontext([tablas["ventas"]])
+        else:
+            lectura = concurrencia.LecturaAnticipada(leer_ventas_por_lotes(ruta_ventas, streaming=True),
+                                                     LOTES_ANTICIPADOS, "lectura-ventas")
+        with metricas.etapa("lectura"), perfil.etapa("lectura", [ruta_ventas]) as etapa, lectura as lotes_ventas:
+            try:
+                for lote in lotes_ventas:
+                    claves = [claves_ventas.clave(venta) for venta in lote]
+                    existentes = estado.existentes(claves)
+                    for clave, venta in zip(claves, lote):
+                        vigente = clave in existentes and clave not in afectadas
+                        if vigente and not inconsistentes:
+                            continue  # Ya enriquecida y sin cambios (sin calcular su partición)
+                        particion = estadoIncremental.particion_de(venta)
+                        if vigente and particion not in inconsistentes:
+                            continue
+                        pendientes.append((clave, particion, venta))
+                        metricas.contar("ventas_reenriquecidas" if clave in existentes else "ventas_nuevas")
+                    etapa["filas_entrada"] = etapa.get("filas_entrada", 0) + len(lote)
+            except concurrencia.ErrorLectura as e:
+                logging.error(f"Error al leer el archivo {ruta_ventas}: {e}")
+                return
+            ausentes = estado.ausentes(claves_ventas)
+            metricas.contar("ventas_eliminadas", len(ausentes))
+
+        # Enriquecer solo las ventas pendientes
+        with metricas.etapa("enriquecimiento"), perfil.etapa("enriquecimiento") as etapa:
+            cache_ofertas = CacheOfertas(ofertas_dict, productos_dict, tamano_cache_ofertas)
+            enriquecidas = procesar_elementos_stream([venta for _, _, venta in pendientes], productos_dict, clientes_dict,
+                                                     ofertas_dict, motor, metricas, cache_ofertas)
+            por_particion = {}  # Partición -> {clave: venta enriquecida}, en el orden del archivo
+            for (clave, particion, _), venta in zip(pendientes, enriquecidas):
+                por_particion.setdefault(particion, {})[clave] = venta
+            etapa["filas_entrada"] = etapa["filas_salida"] = len(pendientes)
+        eliminadas = {}
+        for clave, particion in ausentes:
+            eliminadas.setdefault(particion, set()).add(clave)
+
+        # 3. Reescribir las particiones con algún cambio y el índice de todas
+        tocadas = sorted(set(por_particion) | set(eliminadas) | inconsistentes)
+        cubo_meses = cuboBeneficio.CuboBeneficio() if cubo else None
+        os.makedirs(carpeta, exist_ok=True)
+        with metricas.etapa("escritura"), perfil.etapa("escritura") as etapa:
+            for particion in tocadas:
+                nuevas = por_particion.get(particion, {})
+                ventas = []  # (clave, venta)
+                ruta_anterior = estado.ruta_particion(particion)
+                if particion not in inconsistentes and ruta_anterior is not None:
+                    quitar = eliminadas.get(particion, ())
+                    for clave, venta in zip(estado.claves_particion(particion), serializacion.cargar(ruta_anterior)):
+                        if clave not in quitar:
+                            ventas.append((clave, nuevas.pop(clave, venta)))
+                ventas.extend(nuevas.items())
+
+                ruta = formato_json.ruta(os.path.join(carpeta, particion + intermedios.EXTENSIONES["json"]))
+                if ventas:
+                    escribir_particion(ruta, (venta for _, venta in ventas), formato_json)
+                if ruta_anterior is not None and ruta_anterior != ruta and os.path.isfile(ruta_anterior):
+                    os.remove(ruta_anterior)  # Escrita antes con otra compresión
+                if not ventas and os.path.isfile(ruta):
+                    os.remove(ruta)
+                estado.reemplazar_particion(particion, ruta if ventas else None,
+                                            [(clave, venta.get("EAN"), venta.get("ACCOUNT_NUMBER"), venta.get("Llave"))
+                                             for clave, venta in ventas])
+                if cubo_meses is not None:
+                    agregar_ventas_al_cubo(cubo_meses, (venta for _, venta in ventas))
+                metricas.contar("particiones_escritas")
+                etapa["filas_salida"] = etapa.get("filas_salida", 0) + len(ventas)
+            ruta_indice = particionesSalida.reemplazar_indice(estado.rutas_particiones(), carpeta)
+            etapa["salidas"] = [ruta_indice]
 
-    for index, primer_elemento in enumerate(data[:total_elementos]):
-        logging.info(f"Procesando elemento {index + 1} de {total_elementos}")
-        procesar_elemento(primer_elemento, productos_dict, clientes_dict, ofertas_dict)
+        # 4. El cubo se recalcula solo en los meses reescritos (todos si no es el que se guardó
+        #    en la ejecución anterior, por ejemplo si no existe o lo reemplazó una ejecución completa)
+        if cubo_meses is not None:
+            with metricas.etapa("cubo"), perfil.etapa("cubo", salidas=[ruta_cubo]) as etapa:
+                if os.path.isfile(ruta_cubo) and estadoIncremental.huella_archivo(ruta_cubo) == estado.huella("cubo"):
+                    cubo_guardado = cuboBeneficio.cargar_cubo(ruta_cubo)
+                    cubo_guardado.descartar_meses(tocadas)
+                else:
+                    cubo_guardado = cuboBeneficio.CuboBeneficio()
+                    for ruta in estado.rutas_particiones():
+                        if os.path.basename(ruta).split(".")[0] not in tocadas:
+                            agregar_ventas_al_cubo(cubo_guardado, serializacion.cargar(ruta))
+                cubo_guardado.combinar(cubo_meses)
+                etapa["filas_salida"] = guardar_cubo(cubo_guardado, ruta_cubo)
+                if etapa["filas_salida"] is not None:
+                    estado.guardar_huella("cubo", estadoIncremental.huella_archivo(ruta_cubo))
 
-    # Guardar el archivo modificado
-    guardar_json(OUTPUT_FILE_PATH, data)
+        if huella_ventas is not None:
+            estado.guardar_huella("ventas", huella_ventas)
+        estado.confirmar()
+
+    logging.info(f"Salida particionada actualizada: {ruta_indice}")
+    logging.info(metricas.resumen())
+    return metricas
 
 # Función para guardar el archivo JSON modificado
-def guardar_json(ruta, data):
+def guardar_json(ruta, data, formato_json=None):
     """
     Guarda los datos proporcionados en un archivo JSON en la ruta especificada.
 
+    Si `data` no es una lista sino un iterable de elementos, los elementos se escriben a medida
+    que se generan, con el mismo formato (indentado) que tendría la lista completa. Como en
+    `guardar_json_stream`, `ruta` se reemplaza recién cuando el archivo está completo.
+
     Args:
         ruta (str): La ruta del archivo donde se guardarán los datos JSON.
-        data (dict): Los datos que se guardarán en el archivo JSON.
-
-    Raises:
-        Exception: Si ocurre un error al intentar guardar el archivo.
+        data (dict | list | iterable): Los datos que se guardarán en el archivo JSON.
+        formato_json (serializacion.FormatoJson, opcional): Serializador, indentación y compresión;
+            por defecto el mismo JSON que `json.dump(data, indent=4)`.
 
+    Returns:
+        str: La ruta del archivo guardado, o None si ocurre un error (que se escribe en el log).
     """
+    formato_json = formato_json or serializacion.FORMATO_PREDETERMINADO
+
+    def escribir(ruta_temporal):
+        with formato_json.abrir(ruta_temporal) as output_file:
+            if isinstance(data, dict):
+                output_file.write(formato_json.codificar(data))
+            else:
+                formato_json.escribir_arreglo(output_file, data)
+
     try:
-        with open(ruta, 'w', encoding='utf-8') as output_file:
-            json.dump(data, output_file, ensure_ascii=False, indent=4)
+        puntosControl.escribir_duradero(ruta, escribir)
         logging.info(f"Proceso completado. Datos guardados en: {ruta}")
         #print(f"Proceso completado. Datos guardados en: {ruta}")
+        return ruta
     except Exception as e:
         logging.error(f"Error al guardar el archivo {ruta}: {e}")
         #print(f"Error al guardar el archivo {ruta}: {e}")
+        return None
+
+# Función para guardar el cubo de beneficio
+def guardar_cubo(cubo, ruta, acumular=False):
+    """
+    Args:
+        cubo (cuboBeneficio.CuboBeneficio): El cubo de la ejecución.
+        ruta (str): La ruta del archivo del cubo.
+        acumular (bool): Si es True, se suma al cubo ya guardado en `ruta` (si existe).
+
+    Returns:
+        int: La cantidad de celdas del cubo guardado, o None si ocurre un error.
+    """
+    try:
+        if acumular:
+            guardado = cuboBeneficio.cargar_cubo(ruta)
+            guardado.combinar(cubo)
+            cubo = guardado
+        cuboBeneficio.guardar_cubo(cubo, ruta)
+        logging.info(f"Cubo de beneficio guardado en: {ruta} ({len(cubo)} celdas)")
+        return len(cubo)
+    except Exception as e:
+        logging.error(f"Error al guardar el cubo de beneficio {ruta}: {e}")
+        return None
+
+# Función para guardar en flujo los elementos procesados
+def guardar_json_stream(ruta, elementos, formato="json", formato_json=None):
+    """
+    Escribe los elementos en el archivo a medida que se generan, sin acumularlos en memoria.
+    Se escribe en un archivo temporal que reemplaza a `ruta` recién al terminar
+    (`puntosControl.escribir_duradero`): si los elementos no se terminan de generar (por
+    ejemplo, EscrituraCancelada), la salida anterior queda como estaba.
+
+    Args:
+        ruta (str): La ruta del archivo de salida.
+        elementos (iterable): Los elementos (dict) a escribir, o sus líneas ya codificadas
+            (bytes, como las de las partes de `puntosControl`).
+        formato (str): "json" escribe un arreglo JSON válido (un objeto por línea);
+            "jsonl" escribe JSON Lines.
+        formato_json (serializacion.FormatoJson, opcional): Serializador y compresión. Cada
+            elemento ocupa siempre una línea, aunque el formato indique indentación.
+
+    Returns:
+        int: La cantidad de elementos escritos, o None si ocurre un error.
+    """
+    formato_json = formato_json or serializacion.FORMATO_PREDETERMINADO
+    total = 0
+
+    def escribir(ruta_temporal):
+        nonlocal total
+        with formato_json.abrir(ruta_temporal) as output_file:
+            if formato == "json":
+                output_file.write(b"[")
+            for elemento in elementos:
+                linea = elemento if isinstance(elemento, bytes) else formato_json.codificar(elemento, indentar=False)
+                if formato == "json":
+                    output_file.write((b"\n" if total == 0 else b",\n") + linea)
+                else:
+                    output_file.write(linea + b"\n")
+                total += 1
+            if formato == "json":
+                output_file.write(b"\n]\n" if total else b"]\n")
+
+    try:
+        puntosControl.escribir_duradero(ruta, escribir)
+        logging.info(f"Proceso completado. {total} elementos guardados en: {ruta}")
+        return total
+    except Exception as e:
+        logging.error(f"Error al guardar el archivo {ruta}: {e}")
+        return None
+
+# Función para guardar los elementos procesados en particiones por mes y RETAIL PAGO
+def guardar_particiones(ruta, elementos, formato="json", formato_json=None):
+    """
+    Escribe los elementos a medida que se generan, cada uno en el archivo de su mes y su RETAIL
+    PAGO, con varias particiones escribiéndose a la vez (`particionesSalida.EscritorParticiones`),
+    y al terminar guarda el manifiesto en el índice. Las particiones y el índice se reemplazan
+    solo si se recibieron todos los elementos; si no (por ejemplo, EscrituraCancelada), la
+    salida particionada anterior queda como estaba.
+
+    Args:
+        ruta (str): La ruta del archivo de salida (OUTPUT_FILE_PATH); las particiones van en la
+            carpeta con su nombre sin extensión y el manifiesto en su índice .indice.json.
+        elementos (iterable): Los elementos (dict) a escribir.
+        formato (str): "json" o "jsonl", como en `guardar_json_stream`.
+        formato_json (serializacion.FormatoJson, opcional): Serializador y compresión.
+
+    Returns:
+        int: La cantidad de elementos escritos, o None si ocurre un error.
+    """
+    base = os.path.splitext(ruta)[0]
+    try:
+        with particionesSalida.EscritorParticiones(base, formato, formato_json) as escritor:
+            escritor.agregar(elementos)
+            manifiesto = escritor.cerrar()
+        ruta_indice = particionesSalida.guardar_manifiesto(base, manifiesto)
+        total = sum(entrada["filas"] for entrada in manifiesto)
+        logging.info(f"Proceso completado. {total} elementos guardados en {len(manifiesto)} particiones: {ruta_indice}")
+        return total
+    except Exception as e:
+        logging.error(f"Error al guardar las particiones de {ruta}: {e}")
+        return None
 
 # Ejecutar la función principal
 if __name__ == "__main__":
-    procesar_archivos()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Enriquece el sell-out con productos, clientes y ofertas.")
+    parser.add_argument("--streaming", action="store_true",
+                        help="Lee, procesa y escribe las ventas una a una con memoria constante.")
+    parser.add_argument("--formato", choices=FORMATOS_SALIDA, default="json",
+                        help="Formato del archivo de salida (jsonl requiere --streaming).")
+    parser.add_argument("--motor", choices=MOTORES, default="registro",
+                        help="Motor de enriquecimiento: por registro, vectorizado (pandas/NumPy) o compacto "
+                             "(vectorizado sobre lotes Arrow, con mucha menos memoria).")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Cantidad de procesos para el enriquecimiento (por defecto 1).")
+    parser.add_argument("--muestreo-debug", type=int, default=0, metavar="N",
+                        help="Escribe en el log de depuración uno de cada N elementos procesados.")
+    parser.add_argument("--sin-cubo", action="store_true",
+                        help="No calcula el cubo de beneficio (Total Beneficio por RETAIL PAGO, Llave, Tipo de Valuacion y mes).")
+    parser.add_argument("--acumular-cubo", action="store_true",
+                        help="Suma el cubo de esta ejecución al ya guardado (cuando las ventas son solo las nuevas).")
+    parser.add_argument("--cache-ofertas", type=int, default=TAMANO_CACHE_OFERTAS, metavar="N",
+                        help=f"Combinaciones (Llave, Fecha) cuya oferta resuelta se recuerda con el motor por registro "
+                             f"(por defecto {TAMANO_CACHE_OFERTAS}; 0 la desactiva).")
+    parser.add_argument("--almacen", nargs="?", const=almacenCatalogos.RUTA_ALMACEN, default=None, metavar="RUTA",
+                        help=f"Consulta los catálogos por lote en el almacén SQLite que actualiza generarJson.py --almacen "
+                             f"(por defecto {almacenCatalogos.RUTA_ALMACEN}), en lugar de cargar sus archivos completos.")
+    parser.add_argument("--particionar", action="store_true",
+                        help="Escribe la salida en un archivo por mes y RETAIL PAGO, con un manifiesto "
+                             "(particiones, filas y checksums) en sell_out_final.indice.json.")
+    parser.add_argument("--punto-control", type=int, default=0, metavar="N",
+                        help="Guarda en disco las ventas enriquecidas cada N filas, con el progreso, para poder "
+                             "reanudar la ejecución si falla (0 = sin puntos de control).")
+    parser.add_argument("--reanudar", action="store_true",
+                        help="Con --punto-control, sigue desde la última parte completa de la ejecución anterior.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Enriquece solo las ventas nuevas o afectadas por cambios en los catálogos desde la "
+                             "ejecución anterior, y actualiza la salida particionada por mes.")
+    serializacion.agregar_argumentos(parser)
+    perfilado.agregar_argumentos(parser)
+    args = parser.parse_args()
+    if args.muestreo_debug > 0:
+        logging.getLogger().setLevel(logging.DEBUG)
+    perfil = perfilado.crear_perfilador("funcionesFinal", args)
+    if args.incremental:
+        ignoradas = [opcion for opcion, usada in (("--streaming", args.streaming), ("--formato", args.formato != "json"),
+                                                  ("--workers", args.workers != 1), ("--almacen", args.almacen),
+                                                  ("--acumular-cubo", args.acumular_cubo),
+                                                  ("--particionar", args.particionar),
+                                                  ("--punto-control", args.punto_control),
+                                                  ("--reanudar", args.reanudar)) if usada]
+        if ignoradas:
+            logging.warning(f"Opciones que no se usan en modo incremental: {', '.join(ignoradas)}")
+        procesar_incremental(motor=args.motor, muestreo_debug=args.muestreo_debug, perfil=perfil,
+                             formato_json=serializacion.crear_formato(args), cubo=not args.sin_cubo,
+                             tamano_cache_ofertas=args.cache_ofertas)
+    else:
+        procesar_archivos(streaming=args.streaming, formato_salida=args.formato, motor=args.motor,
+                          workers=args.workers, muestreo_debug=args.muestreo_debug, perfil=perfil,
+                          formato_json=serializacion.crear_formato(args), cubo=not args.sin_cubo,
+                          acumular_cubo=args.acumular_cubo, tamano_cache_ofertas=args.cache_ofertas,
+                          ruta_almacen=args.almacen, particionar=args.particionar,
+                          punto_control=args.punto_control, reanudar=args.reanudar)
+    ruta_perfil = perfil.guardar()
+    if ruta_perfil:
+        logging.info(f"Perfil de la ejecución guardado en: {ruta_perfil}")
@@ -1,21 +1,188 @@
-import pandas as pd
-import ijson
+import argparse
+import os
+from openpyxl import Workbook
+import perfilado  # Perfil por etapa (tiempos, tamaños, memoria y cProfile), solo con --perfil.
+import serializacion  # Lectura de los archivos JSON, comprimidos o no.
+import intermedios  # Índice de la salida particionada (--particionar o modo incremental).
+import particionesSalida  # Manifiesto y filtro de particiones por mes y RETAIL PAGO.
+import cuboBeneficio  # Cubo de Total Beneficio que guarda el enriquecimiento junto al archivo final.
 
 # Archivo JSON de entrada y archivo Excel de salida
 nombre_archivo_json = "./Json/sell_out_final.json"
 nombre_archivo_excel = "sell_out_final_output.xlsx"
+nombre_archivo_resumen = "sell_out_resumen.xlsx"  # Resúmenes del cubo de beneficio
 
-# Usar ijson para cargar datos JSON grandes en un DataFrame
-datos = []
-with open(nombre_archivo_json, "r", encoding="utf-8") as archivo_json:
-    # Lee los datos en forma de flujo usando ijson
-    for objeto in ijson.items(archivo_json, "item"):
-        datos.append(objeto)
+MAX_FILAS_HOJA = 1_048_576  # Límite de filas de una hoja de Excel, incluido el encabezado.
 
-# Crear un DataFrame con los datos cargados
-df = pd.DataFrame(datos)
+# Función para leer el archivo final elemento por elemento
+def leer_objetos(ruta, filtro=None):
+    """
+    Lee el archivo final en forma de flujo, sin cargarlo completo en memoria.
 
-# Guardar el DataFrame en un archivo Excel
-df.to_excel(nombre_archivo_excel, index=False, engine="openpyxl")
+    Args:
+        ruta (str): Un arreglo JSON o JSON Lines (un objeto por línea), comprimido con gzip o
+            zstd o sin comprimir; el formato se reconoce por el contenido, no por la extensión.
+            También puede ser el índice de una salida particionada (sell_out_final.indice.json,
+            de --particionar o del modo incremental), cuyas particiones se leen en orden.
+        filtro (dict, opcional): Meses y RETAIL PAGO a exportar (`particionesSalida.coincide`).
+            Con el manifiesto de --particionar solo se abren las particiones que lo cumplen; en
+            los demás casos se filtra venta por venta.
 
-print(f"Archivo '{nombre_archivo_excel}' generado exitosamente.")
+    Yields:
+        dict: Cada objeto del archivo.
+    """
+    if intermedios.es_indice(ruta):
+        if filtro:
+            archivos = particionesSalida.seleccionar_particiones(ruta, filtro)
+        else:
+            archivos = [(particion, False) for particion in intermedios.rutas_de_indice(ruta)]
+    else:
+        archivos = [(ruta, bool(filtro))]
+    for archivo, filtrar in archivos:
+        for objeto in serializacion.leer_elementos(archivo):
+            if not filtrar or particionesSalida.coincide(filtro, particionesSalida.mes_de_venta(objeto),
+                                                         particionesSalida.retail_pago_de_venta(objeto)):
+                yield objeto
+
+# Función para obtener las columnas del archivo final
+def obtener_columnas(ruta, filtro=None):
+    """
+    Recorre el archivo una vez para obtener todas las columnas en el orden en que aparecen por
+    primera vez (los elementos sin oferta no tienen todos los campos), como haría `pd.DataFrame`.
+    Solo se guardan los nombres de las columnas, no los datos.
+    """
+    columnas = {}
+    for objeto in leer_objetos(ruta, filtro):
+        columnas.update(dict.fromkeys(objeto))
+    return list(columnas)
+
+# Función para exportar el archivo final a Excel con memoria constante
+def exportar_excel(ruta_json, ruta_excel, filas_por_hoja=MAX_FILAS_HOJA, hojas_por_archivo=0, filtro=None):
+    """
+    Escribe el archivo final en Excel fila por fila con un libro de solo escritura de openpyxl,
+    que vuelca cada fila a disco en lugar de guardarla en memoria.
+
+    Al llegar al límite de filas se continúa en una hoja nueva ("Sheet2", "Sheet3", ...), cada
+    una con su encabezado. Si se indica `hojas_por_archivo`, al llenarse el libro se continúa en
+    un archivo nuevo con sufijo "_2", "_3", ...
+
+    Args:
+        ruta_json (str): El archivo final (arreglo JSON o JSON Lines).
+        ruta_excel (str): El archivo Excel de salida.
+        filas_por_hoja (int): Máximo de filas por hoja, incluido el encabezado.
+        hojas_por_archivo (int): Máximo de hojas por archivo. 0 no limita las hojas.
+        filtro (dict, opcional): Meses y RETAIL PAGO a exportar (ver `leer_objetos`).
+
+    Returns:
+        tuple: (lista de archivos generados, cantidad de filas de datos escritas).
+    """
+    columnas = obtener_columnas(ruta_json, filtro)
+    filas_datos = filas_por_hoja - 1  # Cada hoja repite el encabezado
+    base, extension = os.path.splitext(ruta_excel)
+    archivos = []
+    libro = hoja = None
+    hojas_libro = filas_hoja = total = 0
+
+    def guardar_libro():
+        ruta = ruta_excel if not archivos else f"{base}_{len(archivos) + 1}{extension}"
+        libro.save(ruta)
+        archivos.append(ruta)
+
+    def nueva_hoja():
+        nonlocal libro, hoja, hojas_libro, filas_hoja
+        if libro is None or hojas_libro == hojas_por_archivo:
+            if libro is not None:
+                guardar_libro()
+            libro = Workbook(write_only=True)
+            hojas_libro = 0
+        hojas_libro += 1
+        hoja = libro.create_sheet(f"Sheet{hojas_libro}")
+        hoja.append(columnas)
+        filas_hoja = 0
+
+    nueva_hoja()
+    for objeto in leer_objetos(ruta_json, filtro):
+        if filas_hoja == filas_datos:
+            nueva_hoja()
+        hoja.append([objeto.get(columna) for columna in columnas])
+        filas_hoja += 1
+        total += 1
+    guardar_libro()
+    return archivos, total
+
+# Función para exportar a Excel los resúmenes del cubo de beneficio
+def exportar_resumen(ruta_cubo, ruta_excel, filtro=None):
+    """
+    Escribe una hoja por cada resumen de `cuboBeneficio.RESUMENES` (por RETAIL PAGO, por Llave,
+    por Tipo de Valuacion y el detalle del cubo, todos por mes). Las hojas tienen una fila por
+    combinación de dimensiones, no por venta, así que el libro es chico.
+
+    Args:
+        ruta_cubo (str): El cubo guardado por funcionesFinal.py (`cuboBeneficio.ruta_cubo`).
+        ruta_excel (str): El archivo Excel de salida.
+        filtro (dict, opcional): Meses y RETAIL PAGO a resumir (`particionesSalida.coincide`).
+
+    Returns:
+        tuple: (lista de archivos generados, cantidad de filas de datos escritas).
+    """
+    cubo = cuboBeneficio.cargar_cubo(ruta_cubo)
+    if filtro:
+        # Claves del cubo: (RETAIL PAGO, Llave, Tipo de Valuacion, Mes)
+        cubo.celdas = {clave: valores for clave, valores in cubo.celdas.items()
+                       if particionesSalida.coincide(filtro, clave[3], clave[0])}
+    libro = Workbook(write_only=True)
+    total = 0
+    for nombre, dimensiones in cuboBeneficio.RESUMENES.items():
+        resumen = cubo.resumen(dimensiones)
+        hoja = libro.create_sheet(nombre)
+        hoja.append(list(resumen.columns))
+        for fila in resumen.astype(object).where(resumen.notna(), None).itertuples(index=False):
+            hoja.append(list(fila))
+        total += len(resumen)
+    libro.save(ruta_excel)
+    return [ruta_excel], total
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exporta el archivo final de sell-out a Excel.")
+    parser.add_argument("--entrada", default=nombre_archivo_json, help="Archivo final (JSON o JSON Lines, comprimido o no; o el índice sell_out_final.indice.json de una salida particionada); si no existe se busca con .gz o .zst.")
+    parser.add_argument("--salida", default=nombre_archivo_excel, help="Archivo Excel de salida.")
+    parser.add_argument("--filas-por-hoja", type=int, default=MAX_FILAS_HOJA,
+                        help="Máximo de filas por hoja, incluido el encabezado (por defecto el límite de Excel).")
+    parser.add_argument("--hojas-por-archivo", type=int, default=0,
+                        help="Máximo de hojas por archivo; al llenarse se continúa en un archivo nuevo (0 = sin límite).")
+    parser.add_argument("--resumen", action="store_true",
+                        help="Exporta también los resúmenes del cubo de beneficio (por RETAIL PAGO, Llave, Tipo de Valuacion y mes).")
+    parser.add_argument("--solo-resumen", action="store_true",
+                        help="Exporta solo los resúmenes del cubo de beneficio, sin recorrer el archivo final.")
+    parser.add_argument("--salida-resumen", default=nombre_archivo_resumen, help="Archivo Excel de los resúmenes.")
+    parser.add_argument("--mes", action="append", metavar="AAAA-MM",
+                        help=f"Exporta solo las ventas de este mes ('{particionesSalida.MES_SIN_FECHA}' para las ventas sin fecha); se puede repetir.")
+    parser.add_argument("--retail-pago", action="append", metavar="RETAIL",
+                        help="Exporta solo las ventas de este RETAIL PAGO; se puede repetir. Con la salida de "
+                             "funcionesFinal.py --particionar solo se leen las particiones elegidas.")
+    perfilado.agregar_argumentos(parser)
+    args = parser.parse_args()
+    perfil = perfilado.crear_perfilador("generarExcel", args)
+    args.entrada = serializacion.ruta_existente(args.entrada)
+    filtro = {"mes": set(args.mes or ()), "retail_pago": set(args.retail_pago or ())}
+    if not any(filtro.values()):
+        filtro = None
+
+    if not args.solo_resumen:
+        with perfil.etapa("excel", [args.entrada]) as etapa:
+            archivos, filas = exportar_excel(args.entrada, args.salida, args.filas_por_hoja, args.hojas_por_archivo, filtro)
+            etapa.update(salidas=archivos, filas_salida=filas)
+        print(f"Archivo '{', '.join(archivos)}' generado exitosamente ({filas} filas).")
+
+    if args.resumen or args.solo_resumen:
+        ruta_cubo = cuboBeneficio.ruta_cubo(args.entrada)
+        if not os.path.isfile(ruta_cubo):
+            print(f"No se encontró el cubo de beneficio '{ruta_cubo}'; ejecute funcionesFinal.py sin --sin-cubo.")
+        else:
+            with perfil.etapa("resumen", [ruta_cubo]) as etapa:
+                archivos, filas = exportar_resumen(ruta_cubo, args.salida_resumen, filtro)
+                etapa.update(salidas=archivos, filas_salida=filas)
+            print(f"Archivo '{', '.join(archivos)}' generado exitosamente ({filas} filas de resumen).")
+    ruta_perfil = perfil.guardar()
+    if ruta_perfil:
+        print(f"Perfil de la ejecución guardado en '{ruta_perfil}'.")
@@ -4,6 +4,14 @@ import uuid
 import json
 import os
 import numpy as np
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from fechas import ORDINAL_EPOCH
+import intermedios  # Escritura de los archivos intermedios en Parquet (o JSON a pedido).
+import perfilado  # Perfil por etapa (tiempos, tamaños, memoria y cProfile), solo con --perfil.
+import serializacion  # Serializador, indentación y compresión de los archivos JSON.
+import lecturaExcel  # Lectura en flujo, por bloques de filas, de las hojas de Excel.
+import almacenCatalogos  # Catálogos en una base SQLite local, para consultarlos por lote.
 
 # Ruta del archivo Excel
 archivo_clientes = Path('.\\data\\Calculo Carnot.xlsx')
@@ -12,82 +20,193 @@ archivo_negociacion = Path('.\\data\\enf.xlsx')
 carpeta_data = './Json'
 os.makedirs(carpeta_data, exist_ok=True)
 
+# Función para convertir una columna de fechas al ordinal del día (date.toordinal)
+def convertir_fechas_ordinal(serie):
+    # Las fechas se guardan como enteros para que funcionesFinal.py las compare sin volver a convertirlas
+    fechas = pd.to_datetime(serie, errors='coerce')
+    dias = (fechas - pd.Timestamp('1970-01-01')).dt.days
+    return (dias + ORDINAL_EPOCH).astype('Int64')
+
+# Libro de Excel de cada proceso trabajador de `generar_json_clientes`, abierto una sola vez por proceso
+_libro_trabajador = {}
+
+# Función para inicializar un proceso trabajador de `generar_json_clientes`
+def _inicializar_trabajador(archivo_excel):
+    _libro_trabajador["libro"] = lecturaExcel.abrir_libro(archivo_excel)
+
+# Función que ejecuta cada proceso trabajador sobre una hoja
+def _convertir_hoja_trabajador(hoja, formato, formato_json, conservar):
+    return convertir_hoja(_libro_trabajador["libro"], hoja, formato, formato_json, conservar)
+
+# Función para convertir una hoja del archivo de clientes y guardarla
+def convertir_hoja(libro, hoja, formato="parquet", formato_json=None, conservar=False):
+    """
+    Lee la hoja por bloques (`lecturaExcel.leer_hoja_por_bloques`), agrega a cada bloque la Llave
+    y el ID y guarda la hoja en cuanto se leyó el último bloque. En Parquet los bloques se
+    conservan como tablas Arrow (mucho más compactas que el DataFrame) y se unen al escribir.
+
+    Args:
+        libro (openpyxl.Workbook): El libro, abierto con `lecturaExcel.abrir_libro`.
+        hoja (str): El nombre de la hoja.
+        formato (str): Formato del archivo intermedio ("parquet" o "json").
+        formato_json (serializacion.FormatoJson): Cómo se escribe el archivo en formato json.
+        conservar (bool): Si es True, también se devuelve la hoja completa como DataFrame.
+
+    Returns:
+        tuple: (ruta del archivo guardado, DataFrame de la hoja si `conservar`, mensajes). La
+        ruta es None si la hoja se omitió porque RETAIL o EAN tienen valores nulos.
+    """
+    mensajes = []
+    tablas_arrow = []
+    bloques = []
+    for df in lecturaExcel.leer_hoja_por_bloques(libro, hoja):
+
+        # Eliminar columnas que no tienen nombre o están vacías
+        df = df.loc[:, ~df.columns.astype(str).str.contains('^Unnamed')]
+
+        # Convertir el EAN a string si es necesario (opcional)
+        if 'EAN' in df.columns:
+            df['EAN'] = df['EAN'].astype(str)
+
+        #Convertir correctamente la columna Fecha (ordinal del día)
+        if 'Fecha' in df.columns:
+            df['Fecha'] = convertir_fechas_ordinal(df['Fecha'])
+
+        # Crear el nuevo campo 'Llave'
+        if 'RETAIL' in df.columns:
+            # Si algún bloque tiene RETAIL o EAN nulos se omite la hoja completa (sin leer el resto)
+            #Comprobar que el campo 'RETAIL' no tenga valores nulos
+            if df['RETAIL'].isnull().sum() > 0:
+                mensajes.append(f"La columna 'RETAIL' tiene valores nulos en la hoja '{hoja}'.")
+                return None, None, mensajes
+            #comprobar que el campo 'EAN' no tenga valores nulos
+            if df['EAN'].isnull().sum() > 0:
+                mensajes.append(f"La columna 'EAN' tiene valores nulos en la hoja '{hoja}'.")
+                return None, None, mensajes
+
+            df['Llave'] = df['RETAIL'].astype(str) + df['EAN'].astype(str)
+        elif not bloques and not tablas_arrow:
+            mensajes.append(f"La columna 'RETAIL' no se encontró en la hoja '{hoja}'.")
+
+        # Agregar una columna de ID única (UUID)
+        df['ID'] = [str(uuid.uuid4()) for _ in range(len(df))]
+
+        if formato == "parquet":
+            tablas_arrow.append(intermedios.tabla_arrow(df))
+        if conservar or formato != "parquet":
+            bloques.append(df)
+
+    # Sustituir espacios por guiones bajos en el nombre de la hoja
+    ruta_base = os.path.join(carpeta_data, hoja.replace(' ', '_'))
+    df = pd.concat(bloques, ignore_index=True) if len(bloques) > 1 else (bloques[0] if bloques else None)
+
+    # Guardar la hoja en el formato intermedio especificado
+    if formato == "parquet":
+        ruta_json = ruta_base + intermedios.EXTENSIONES["parquet"]
+        intermedios.escribir_parquet(*intermedios.unir_tablas(tablas_arrow), ruta_json)
+    else:
+        ruta_json = intermedios.guardar_tabla(df, ruta_base, formato, formato_json)
+    mensajes.append(f"Conversión a {formato} completada para la hoja '{hoja}'. Los datos se han guardado en '{ruta_json}'.")
+    return ruta_json, df if conservar else None, mensajes
+
 # Función para generar JSON de Clientes Aplicables
-def generar_json_clientes(archivo_excel):
+def generar_json_clientes(archivo_excel, formato="parquet", tablas=None, formato_json=None, workers=None):
+    # Si se pasa `tablas` (dict), además se guarda ahí cada hoja convertida, con el nombre de su archivo
+    # `formato_json` (serializacion.FormatoJson) indica cómo se escriben los archivos en formato json
+    # Las hojas se convierten en paralelo, una por proceso (`workers`, por defecto una por CPU), y
+    # cada una se guarda en cuanto está lista
     try:
-        # Cargar el archivo Excel
-        xls = pd.ExcelFile(archivo_excel)
-        
         # Obtener los nombres de todas las hojas
-        hojas = xls.sheet_names
+        hojas = lecturaExcel.nombres_hojas(archivo_excel)
         print(f"Hojas encontradas en el archivo de clientes: {hojas}")  # Para depuración
+        workers = min(workers or os.cpu_count() or 1, len(hojas))
+        conservar = tablas is not None
+        resultados = {}
+
+        # Función para registrar el resultado de una hoja
+        def registrar(hoja, resultado):
+            ruta_json, df, mensajes = resultado
+            for mensaje in mensajes:
+                print(mensaje)
+            if ruta_json is not None and conservar:
+                tablas[hoja.replace(' ', '_')] = df
+            resultados[hoja] = ruta_json
+
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_inicializar_trabajador,
+                                     initargs=(archivo_excel,)) as executor:
+                futuros = {executor.submit(_convertir_hoja_trabajador, hoja, formato, formato_json, conservar): hoja
+                           for hoja in hojas}
+                for futuro in as_completed(futuros):
+                    registrar(futuros[futuro], futuro.result())
+        else:
+            libro = lecturaExcel.abrir_libro(archivo_excel)
+            try:
+                for hoja in hojas:
+                    registrar(hoja, convertir_hoja(libro, hoja, formato, formato_json, conservar))
+            finally:
+                libro.close()
 
-        for hoja in hojas:
-
-            #if hoja.lower() == 'ofertas':
-             #   print(f"Omitiendo la hoja '{hoja}'.")
-              #  continue  # Salta a la siguiente iteración del bucle
-
-            # Leer cada hoja
-            df = pd.read_excel(xls, sheet_name=hoja)
-
-            # Eliminar columnas que no tienen nombre o están vacías
-            df = df.loc[:, ~df.columns.astype(str).str.contains('^Unnamed')]
-
-            # Convertir el EAN a string si es necesario (opcional)
-            if 'EAN' in df.columns:
-                df['EAN'] = df['EAN'].astype(str)
-
-                
-            #Convertir correctamente la columna Fecha
-            if 'Fecha' in df.columns:
-                df['Fecha'] = pd.to_datetime(df['Fecha'], errors='coerce').dt.strftime('%m/%d/%Y')
-                
-
-            # Crear el nuevo campo 'Llave'
-            if 'RETAIL' in df.columns:
-                #Comprobar que el campo 'RETAIL' no tenga valores nulos
-                if df['RETAIL'].isnull().sum() > 0:
-                    print(f"La columna 'RETAIL' tiene valores nulos en la hoja '{hoja}'.")
-                    continue  # Salta a la siguiente iteración del bucle
-                #comprobar que el campo 'EAN' no tenga valores nulos
-                if df['EAN'].isnull().sum() > 0:
-                    print(f"La columna 'EAN' tiene valores nulos en la hoja '{hoja}'.")
-                    continue
-                
-                df['Llave'] = df['RETAIL'].astype(str) + df['EAN'].astype(str)
-            else:
-                print(f"La columna 'RETAIL' no se encontró en la hoja '{hoja}'.")
-                
-                
-            # Agregar una columna de ID única usando UUID
-            df['ID'] = [str(uuid.uuid4()) for _ in range(len(df))]
-
-            # Convertir el DataFrame a JSON
-            json_data = df.to_json(orient='records', force_ascii=False)
-
-            # Sustituir espacios por guiones bajos en el nombre de la hoja
-            nombre_json = f"{hoja.replace(' ', '_')}.json"
-            ruta_json = os.path.join(carpeta_data, nombre_json)
-
-            # Guardar el JSON en el archivo especificado
-            with open(ruta_json, 'w', encoding='utf-8') as json_file:
-                json.dump(json.loads(json_data), json_file, ensure_ascii=False, indent=4)
-
-            print(f"Conversión a JSON completada para la hoja '{hoja}'. Los datos se han guardado en '{ruta_json}'.")
+        # Las rutas se devuelven en el orden de las hojas, sin las omitidas
+        return [resultados[hoja] for hoja in hojas if resultados[hoja] is not None]
 
     except Exception as e:
         print(f"Se produjo un error al procesar el archivo de clientes: {e}")
 
+# Campos que definen el nivel de una negociación, en orden de prioridad
+CAMPOS_PRIORIDAD_NIVEL = ['Nombre cliente', 'Numero Cliente', 'Nombre alias', 'Nombre subsegmento', 'Nombre segmento']
+
+# Función para evaluar un predicado una sola vez por cada valor distinto de una columna
+def evaluar_por_valor(serie, predicado):
+    valores = serie.to_numpy(dtype=object)
+    codigos, unicos = pd.factorize(valores)
+    # El último elemento corresponde a los nulos (código -1); None y NaN se evalúan por separado
+    por_valor = np.fromiter((bool(predicado(valor)) for valor in unicos), dtype=bool, count=len(unicos))
+    resultado = np.append(por_valor, False)[codigos]
+    nulos = codigos == -1
+    if nulos.any():
+        es_none = np.equal(valores, None)
+        resultado[nulos & es_none] = bool(predicado(None))
+        resultado[nulos & ~es_none] = bool(predicado(np.nan))
+    return resultado
+
+# Función para calcular el nivel de cada negociación con operaciones por columna
+def calcular_nivel(df, campos_prioridad=None):
+    """
+    Obtiene el nivel de cada fila: "TODOS" si todos los campos de prioridad están vacíos o en
+    "TODOS"; si no, el primer campo con un valor válido, o "N/A" si ninguno lo tiene.
+
+    Cada regla se evalúa como una máscara booleana por campo y el resultado se elige con
+    `np.select` en orden de prioridad.
+    """
+    if campos_prioridad is None:
+        campos_prioridad = CAMPOS_PRIORIDAD_NIVEL
+    validaciones = {
+        'Nombre segmento': lambda v: isinstance(v, str) and v and v != 'TODOS',
+        'Nombre subsegmento': lambda v: isinstance(v, str) and v and v != 'TODOS',
+        'Nombre alias': lambda v: isinstance(v, str) and v and v != 'TODOS',
+        'Numero Cliente': lambda v: isinstance(v, (int, float)) and v > 0,
+        'Nombre cliente': lambda v: isinstance(v, str) and v and v != 'TODOS',
+    }
+    vacios = np.ones(len(df), dtype=bool)
+    condiciones, opciones = [], []
+    for campo in campos_prioridad:
+        serie = df[campo] if campo in df.columns else pd.Series([None] * len(df), index=df.index, dtype=object)
+        vacios &= evaluar_por_valor(serie, lambda v: v in ['TODOS', 0, '0', None, '', 0.0])
+        if campo in validaciones:
+            condiciones.append(evaluar_por_valor(serie, validaciones[campo]))
+            opciones.append(campo)
+    return np.select([vacios] + condiciones, ["TODOS"] + opciones, default='N/A')
+
 # Función para generar JSON de Negociaciones
-def generar_json_negociacion(archivo_excel, carpeta_data):
+def generar_json_negociacion(archivo_excel, carpeta_data, formato="parquet", formato_json=None):
     try:
         # Leer el archivo Excel
         df = pd.read_excel(archivo_excel)
 
-        # Convertir fechas a formato legible
-        df['Fecha inicio vigencia'] = pd.to_datetime(df['Fecha inicio vigencia'], errors='coerce').dt.strftime('%m/%d/%Y')
-        df['Fecha fin vigencia'] = pd.to_datetime(df['Fecha fin vigencia'], errors='coerce').dt.strftime('%m/%d/%Y')
+        # Convertir fechas al ordinal del día
+        df['Fecha inicio vigencia'] = convertir_fechas_ordinal(df['Fecha inicio vigencia'])
+        df['Fecha fin vigencia'] = convertir_fechas_ordinal(df['Fecha fin vigencia'])
 
         # Validar columnas necesarias
         if 'Nombre alias' in df.columns and 'Sivec' in df.columns and 'Nombre Laboratorio' in df.columns:
@@ -96,32 +215,12 @@ def generar_json_negociacion(archivo_excel, carpeta_data):
             df['Nombre Laboratorio'] = df['Nombre Laboratorio'].fillna('').astype(str)
             df['Sivec'] = df['Sivec'].str[:-2]
 
-            # Generar la columna 'Llave'
-            df['Llave'] = df.apply(lambda row: row['Nombre alias'] + row['Sivec'] 
-                                    if row['Sivec'] not in [None, '', 'N/A', 'NaN', 'None'] 
-                                    else row['Nombre Laboratorio'], axis=1)
-
-            # Función para obtener el nivel
-            def obtener_nivel(datos, campos_prioridad=None):
-                if campos_prioridad is None:
-                    campos_prioridad = ['Nombre cliente', 'Numero Cliente', 'Nombre alias', 'Nombre subsegmento', 'Nombre segmento']
-                if all(datos.get(campo) in ['TODOS', 0, '0', None, '', 0.0] for campo in campos_prioridad):
-                    return "TODOS"
-                validaciones = {
-                    'Nombre segmento': lambda v: isinstance(v, str) and v and v != 'TODOS',
-                    'Nombre subsegmento': lambda v: isinstance(v, str) and v and v != 'TODOS',
-                    'Nombre alias': lambda v: isinstance(v, str) and v and v != 'TODOS',
-                    'Numero Cliente': lambda v: isinstance(v, (int, float)) and v > 0,
-                    'Nombre cliente': lambda v: isinstance(v, str) and v and v != 'TODOS',
-                }
-                for campo in campos_prioridad:
-                    valor = datos.get(campo)
-                    if campo in validaciones and validaciones[campo](valor):
-                        return campo
-                return 'N/A'
+            # Generar la columna 'Llave': alias + Sivec cuando el Sivec es válido, si no el laboratorio
+            sivec_valido = df['Sivec'].notna() & ~df['Sivec'].isin(['', 'N/A', 'NaN', 'None'])
+            df['Llave'] = np.where(sivec_valido, df['Nombre alias'] + df['Sivec'].fillna(''), df['Nombre Laboratorio'])
 
             # Agregar columna 'NivelNego'
-            df['NivelNego'] = df.apply(lambda row: obtener_nivel(row), axis=1)
+            df['NivelNego'] = calcular_nivel(df)
             
         else:
             raise ValueError("Las columnas necesarias ('Nombre alias', 'Sivec', 'Nombre Laboratorio') no están presentes en el DataFrame")
@@ -132,185 +231,208 @@ def generar_json_negociacion(archivo_excel, carpeta_data):
         # Agregar columna de ID única
         df['ID'] = [str(uuid.uuid4()) for _ in range(len(df))]
 
-        # Filtrar y guardar los datos en archivos separados según 'Tipo condicion'
+        # Separar los datos según 'Tipo condicion' en una sola pasada y guardarlos en archivos separados
+        grupos = dict(iter(df.groupby('Tipo condicion', sort=False)))
         for condicion in ['SELL-IN', 'SELL-OUT']:
-            df_condicion = df[df['Tipo condicion'] == condicion]
-            json_data = df_condicion.to_json(orient='records', force_ascii=False)
-            nombre_archivo = f'negociacion_{condicion.lower()}.json'
-            ruta_json = os.path.join(carpeta_data, nombre_archivo)
-            with open(ruta_json, 'w', encoding='utf-8') as json_file:
-                json.dump(json.loads(json_data), json_file, ensure_ascii=False, indent=4)
-            print(f"Archivo JSON '{nombre_archivo}' generado con éxito.")
+            df_condicion = grupos.get(condicion, df.iloc[0:0])
+            ruta_base = os.path.join(carpeta_data, f'negociacion_{condicion.lower()}')
+            ruta_json = intermedios.guardar_tabla(df_condicion, ruta_base, formato, formato_json)
+            print(f"Archivo '{ruta_json}' generado con éxito.")
+
+        return df
 
     except Exception as e:
         print(f"Se produjo un error al procesar el archivo de negociación: {e}")
 
-# Función para generar JSON de Ofertas
-def generar_json_ofertas(ruta_negociacion):
-    ruta_oferta_sell_out = os.path.join(carpeta_data, 'ofertaSellOut.json')
-    ruta_oferta_sell_in = os.path.join(carpeta_data, 'ofertaSellIn.json')
-    ruta_oferta_final = os.path.join(carpeta_data, 'ofertaFinal.json')  # Archivo combinado
+# Campos de cada oferta: (campo de salida, columna de la negociación, valor si la columna no existe)
+CAMPOS_OFERTA = [
+    ('Folio', 'Folio', 'N/A'),
+    ('Nombre regla', 'Nombre regla', 'N/A'),
+    ('Costo Fijo', 'Costo Fijo', 0.0),  # Con el nombre que leen funcionesFinal.py y motorVectorizado.py
+    ('Tipo condicion costo', 'Tipo condicion costo', 'N/A'),
+    ('CAP', None, None),
+    ('Oferta', None, None),
+    ('Nivel', None, None),
+    ('Nombre segmento', 'Nombre segmento', 'N/A'),
+    ('Nombre subsegmento', 'Nombre subsegmento', 'N/A'),
+    ('Nombre alias', 'Nombre alias', 'N/A'),
+    ('Numero Cliente', 'Numero Cliente', 'N/A'),
+    ('Nombre cliente', 'Nombre cliente', 'N/A'),
+    ('Nombre', 'Nombre articulo', 'N/A'),
+    ('Ponderado', None, None),
+    ('Fecha inicio vigencia', 'Fecha inicio vigencia', 'N/A'),
+    ('Fecha fin vigencia', 'Fecha fin vigencia', 'N/A'),
+    ('Sivec', 'Sivec', 'N/A'),
+    ('Tipo condicion', 'Tipo condicion', 'N/A'),
+    ('Llave', 'Llave', 'N/A'),
+]
+CONDICIONES_OFERTA = {'SELL-OUT': 'ofertaSellOut', 'SELL-IN': 'ofertaSellIn'}  # Tipo condicion -> archivo
+FOLIOS_CASO = {1: 'CAP', 2: 'Oferta'}  # Folio caso -> campo que toma la "Oferta costo"
+
+# Función para consolidar las negociaciones en una oferta por ventana de vigencia de cada Tipo condicion y Llave
+def consolidar_ofertas(df):
+    """
+    Genera una oferta por cada ventana de vigencia de cada 'Tipo condicion' y 'Llave' (una Llave
+    puede tener varias ventanas con fechas distintas), en el orden en que aparecen por primera
+    vez. Los datos descriptivos salen del primer registro de la ventana; CAP y Oferta, de la
+    "Oferta costo" del último registro de la ventana con Folio caso 1 y 2 respectivamente.
+
+    Args:
+        df (pandas.DataFrame): Las negociaciones, como las genera `generar_json_negociacion`.
+
+    Returns:
+        pandas.DataFrame: Las ofertas, con las columnas de `CAMPOS_OFERTA` en ese orden.
+    """
+    claves = ['Tipo condicion', 'Llave', 'Fecha inicio vigencia', 'Fecha fin vigencia']
+    df = df.assign(**{columna: 'N/A' for columna in claves if columna not in df.columns})
+    df = df[df['Tipo condicion'].isin(list(CONDICIONES_OFERTA))]
+    # Número de ventana de cada registro, en el orden de su primera aparición
+    ventana = df.groupby(claves, sort=False, dropna=False).ngroup().to_numpy()
+    primeros = df[~pd.Series(ventana).duplicated().to_numpy()].reset_index(drop=True)
+    # Los nulos se representan con None, igual que en los registros leídos de los archivos
+    primeros = primeros.astype(object).where(primeros.notna(), None)
+
+    # Pivotear "Oferta costo" por Folio caso: una columna por folio, una fila por ventana
+    columnas_folio = list(FOLIOS_CASO)
+    if 'Folio caso' in df.columns:
+        mascara = df['Folio caso'].isin(columnas_folio).to_numpy()
+        casos = pd.DataFrame({
+            'Ventana': ventana[mascara],
+            'Folio caso': df['Folio caso'].to_numpy()[mascara],
+            'Oferta costo': df['Oferta costo'].to_numpy()[mascara] if 'Oferta costo' in df.columns else 0.0,
+        })
+        casos = casos.drop_duplicates(['Ventana', 'Folio caso'], keep='last')
+        costos = casos.pivot(index='Ventana', columns='Folio caso', values='Oferta costo')
+    else:
+        costos = pd.DataFrame(columns=columnas_folio)
+    costos = costos.reindex(index=range(len(primeros)), columns=columnas_folio)
+    costos = costos.astype(float).fillna(0.0).to_numpy()
+
+    calculados = {campo: costos[:, posicion] for posicion, campo in enumerate(FOLIOS_CASO.values())}
+    calculados['Ponderado'] = 1 - (1 - calculados['CAP']) * (1 - calculados['Oferta'])
+    calculados['Nivel'] = calcular_nivel(primeros)
+
+    ofertas = {'ID': [str(uuid.uuid4()) for _ in range(len(primeros))]}
+    for campo, columna, predeterminado in CAMPOS_OFERTA:
+        if columna is None:
+            ofertas[campo] = calculados[campo]
+        elif columna in primeros.columns:
+            ofertas[campo] = primeros[columna]
+        else:
+            ofertas[campo] = predeterminado
+    return pd.DataFrame(ofertas, index=primeros.index)
 
+# Función para generar JSON de Ofertas
+def generar_json_ofertas(negociacion, formato="parquet", formato_json=None):
+    """
+    Genera ofertaSellOut y ofertaSellIn a partir de las negociaciones, y ofertaFinal como un
+    índice sobre ambos archivos (sin copiar sus datos).
+
+    Args:
+        negociacion (pandas.DataFrame | str): Las negociaciones ya cargadas en memoria, o la ruta
+            del archivo de negociaciones para leerlo.
+        formato (str): Formato de los archivos intermedios ("parquet" o "json").
+        formato_json (serializacion.FormatoJson): Serializador, indentación y compresión de los
+            archivos en formato json; por defecto JSON indentado con 4 espacios.
+
+    Returns:
+        pandas.DataFrame: Las ofertas de ambos tipos de condición, o None si ocurre un error.
+    """
     try:
-        # Validar si el archivo de negociaciones existe
-        if not os.path.isfile(ruta_negociacion):
-            print(f'Error: El archivo {ruta_negociacion} no existe.')
-            return
-
-        # Cargar datos del archivo negociacion.json
-        with open(ruta_negociacion, 'r', encoding='utf-8') as file:
-            datos_negociacion = json.load(file)
-
-        # Diccionarios para almacenar los datos por 'Llave' y por tipo de condición
-        datos_por_llave_sell_out = {}
-        datos_por_llave_sell_in = {}
-
-        # Procesar cada registro en datos_negociacion
-        for registro in datos_negociacion:
-            llave = registro.get('Llave', 'N/A')
-            folio_caso = registro.get('Folio caso', None)
-            tipo_condicion = registro.get('Tipo condicion', 'N/A')
-
-            # Elegir el diccionario correcto basado en el tipo de condición
-            if tipo_condicion == 'SELL-OUT':
-                datos_por_llave = datos_por_llave_sell_out
-            elif tipo_condicion == 'SELL-IN':
-                datos_por_llave = datos_por_llave_sell_in
-            else:
-                # Si no es ni SELL-OUT ni SELL-IN, ignorar este registro
-                continue
-                
-            def obtener_nivel(datos, campos_prioridad=None):
-                if campos_prioridad is None:
-                    campos_prioridad = ['Nombre cliente', 'Numero Cliente', 'Nombre alias', 'Nombre subsegmento', 'Nombre segmento']
-                
-                """
-                Obtiene el nivel basado en el primer campo no vacío y válido en la lista de campos de prioridad, 
-                validando el tipo de datos y aplicando reglas específicas si se requiere.
-
-                Args:
-                    datos: Un diccionario con los datos del registro.
-                    campos_prioridad: Una lista con los nombres de los campos a evaluar por orden de prioridad.
-
-                Returns:
-                    El nombre del primer campo no vacío y válido o 'N/A' si todos están vacíos o no son válidos.
-                """
-
-                # Caso especial: cuando todos los campos relevantes tienen "TODOS" o valores nulos/cero
-                if all(datos.get(campo) in ['TODOS', 0, '0', None, '', 0.0] for campo in campos_prioridad):
-                    return "TODOS"
-                
-                validaciones = {
-                    'Nombre segmento': lambda v: isinstance(v, str) and v and v != 'TODOS',
-                    'Nombre subsegmento': lambda v: isinstance(v, str) and v and v != 'TODOS',
-                    'Nombre alias': lambda v: isinstance(v, str) and v and v != 'TODOS',
-                    'Numero Cliente': lambda v: isinstance(v, (int, float)) and v > 0,
-                    'Nombre cliente': lambda v: isinstance(v, str) and v and v != 'TODOS',
-                }
-                # Validar cada campo en orden de prioridad
-                for campo in campos_prioridad:
-                    valor = datos.get(campo)
-                    if campo in validaciones and validaciones[campo](valor):
-                        return campo
-                # Si no se encuentra un campo válido, retornar 'N/A'
-                return 'N/A'
-            # Inicializar estructura para almacenar CAP y OFERTA si no existe para esta llave
-            if llave not in datos_por_llave:
-                datos_por_llave[llave] = {
-                    'ID': str(uuid.uuid4()),  # Generar un ID único
-                    'Folio': registro.get('Folio', 'N/A'),
-                    'Nombre alias': registro.get('Nombre alias', 'N/A'),
-                    'Sivec': registro.get('Sivec', 'N/A'),
-                    'NOMBRE': registro.get('Nombre articulo', 'N/A'),
-                    'Folio caso': folio_caso,
-                    'CAP': 0.0,
-                    'OFERTA': 0.0,
-                    'Nombre regla': registro.get('Nombre regla', 'N/A'),
-                    'Costo fijo': registro.get('Costo Fijo', 0.0),
-                    'Nivel': obtener_nivel(registro),
-                    'Nombre segmento': registro.get('Nombre segmento', 'N/A'),
-                    'Nombre subsegmento': registro.get('Nombre subsegmento', 'N/A'),
-                    'Numero Cliente': registro.get('Numero Cliente', 'N/A'),
-                    'Nombre cliente': registro.get('Nombre cliente', 'N/A'),
-                    'Tipo condicion costo': registro.get('Tipo condicion costo', 'N/A'),
-                    'Fecha inicio vigencia': registro.get('Fecha inicio vigencia', 'N/A'),
-                    'Fecha fin vigencia': registro.get('Fecha fin vigencia', 'N/A'),
-                    'Tipo condicion': tipo_condicion  # Agregar campo "Tipo condicion"
-                }
-
-            # Asignar CAP cuando el folio de caso es 1, y OFERTA cuando es 2
-            if folio_caso == 1:
-                datos_por_llave[llave]['CAP'] = registro.get('Oferta costo', 0.0)
-            elif folio_caso == 2:
-                datos_por_llave[llave]['OFERTA'] = registro.get('Oferta costo', 0.0)
-                
-
-        # Función para generar registros finales con ponderado
-        def generar_registros_finales(datos_por_llave):
-            registros_finales = []
-            for llave, datos in datos_por_llave.items():
-                cap = datos['CAP']
-                oferta = datos['OFERTA']
-                ponderado = 1 - (1 - cap) * (1 - oferta)
-                datos['PONDERADO'] = ponderado
-
-                # Reordenar campos, asegurando que 'Llave' esté al final
-                registro_ordenado = {
-                    'ID': datos['ID'],  # Incluir el ID único
-                    'Folio': datos['Folio'],
-                    'Nombre regla': datos['Nombre regla'],
-                    'Costo fijo': datos['Costo fijo'],
-                    "Tipo condicion costo": datos['Tipo condicion costo'],
-                    'CAP': datos['CAP'],
-                    'Oferta': datos['OFERTA'],
-                    'Nivel': datos['Nivel'],
-                    'Nombre segmento': datos['Nombre segmento'],
-                    'Nombre subsegmento': datos['Nombre subsegmento'],
-                    'Nombre alias': datos['Nombre alias'],
-                    'Numero Cliente': datos['Numero Cliente'],
-                    'Nombre cliente': datos['Nombre cliente'],
-                    'Nombre': datos['NOMBRE'],
-                    'Ponderado': datos['PONDERADO'],
-                    'Fecha inicio vigencia': datos['Fecha inicio vigencia'],
-                    'Fecha fin vigencia': datos['Fecha fin vigencia'],
-                    'Sivec': datos['Sivec'],
-                    'Tipo condicion': datos['Tipo condicion'],  # Mantener el campo "Tipo condicion"
-                    'Llave': llave
-                }
-                registros_finales.append(registro_ordenado)
-            return registros_finales
-
-        # Generar los registros finales para SELL-OUT y SELL-IN
-        registros_sell_out = generar_registros_finales(datos_por_llave_sell_out)
-        registros_sell_in = generar_registros_finales(datos_por_llave_sell_in)
-
-        # Crear el archivo combinado con todos los registros (SELL-OUT y SELL-IN)
-        registros_finales_combinados = registros_sell_out + registros_sell_in
-
-        # Guardar los datos transformados en ofertaSellOut.json, ofertaSellIn.json y ofertaFinal.json
-        with open(ruta_oferta_sell_out, 'w', encoding='utf-8') as file:
-            json.dump(registros_sell_out, file, ensure_ascii=False, indent=4)
-
-        with open(ruta_oferta_sell_in, 'w', encoding='utf-8') as file:
-            json.dump(registros_sell_in, file, ensure_ascii=False, indent=4)
-
-        with open(ruta_oferta_final, 'w', encoding='utf-8') as file:
-            json.dump(registros_finales_combinados, file, ensure_ascii=False, indent=4)
-
-        print(f'Transformación completada. Archivos guardados en {ruta_oferta_sell_out}, {ruta_oferta_sell_in} y {ruta_oferta_final}.')
+        if isinstance(negociacion, pd.DataFrame):
+            df = negociacion
+        else:
+            # Validar si el archivo de negociaciones existe (en Parquet o JSON)
+            ruta_negociacion = intermedios.resolver_ruta(negociacion)
+            if not os.path.isfile(ruta_negociacion):
+                print(f'Error: El archivo {ruta_negociacion} no existe.')
+                return
+            df = pd.DataFrame(intermedios.cargar_registros(ruta_negociacion))
+
+        ofertas = consolidar_ofertas(df)
+
+        # Guardar cada tipo de condición en su archivo; ofertaFinal solo referencia ambos
+        rutas = []
+        for condicion, nombre in CONDICIONES_OFERTA.items():
+            ofertas_condicion = ofertas[ofertas['Tipo condicion'] == condicion]
+            rutas.append(intermedios.guardar_registros(ofertas_condicion, os.path.join(carpeta_data, nombre), formato, formato_json))
+        ruta_oferta_final = intermedios.guardar_indice(rutas, os.path.join(carpeta_data, 'ofertaFinal'))
+
+        print(f'Transformación completada. Archivos guardados en {rutas[0]}, {rutas[1]} y {ruta_oferta_final}.')
+        return ofertas
 
     except FileNotFoundError:
-        print(f'Error: No se encontró el archivo {ruta_negociacion}.')
+        print(f'Error: No se encontró el archivo {negociacion}.')
     except json.JSONDecodeError:
         print('Error: El archivo JSON está mal formado.')
     except Exception as e:
         print(f'Se produjo un error inesperado: {e}')
-# Ejecutar las funciones
-generar_json_clientes(archivo_clientes)
-generar_json_negociacion(archivo_negociacion , carpeta_data)
+# Archivo intermedio de cada catálogo del almacén (los mismos que lee funcionesFinal.py)
+ARCHIVOS_ALMACEN = {"productos": "Catalogo_de_Productos", "clientes": "Clientes_Aplicables", "ofertas": "ofertaSellOut"}
+
+# Función para actualizar el almacén de catálogos con los archivos intermedios generados
+def actualizar_almacen(ruta_almacen):
+    """
+    Inserta o reemplaza en el almacén SQLite (`almacenCatalogos`) los productos, clientes y
+    ofertas de los archivos intermedios (en Parquet o JSON), leídos igual que los lee funcionesFinal.py.
+
+    Returns:
+        dict: Las filas de cada catálogo en el almacén (los que no se pudieron leer no figuran).
+    """
+    filas = {}
+    with almacenCatalogos.AlmacenCatalogos(ruta_almacen) as almacen:
+        for nombre, archivo in ARCHIVOS_ALMACEN.items():
+            ruta = intermedios.resolver_ruta(os.path.join(carpeta_data, archivo + intermedios.EXTENSIONES["parquet"]))
+            if not os.path.isfile(ruta):
+                print(f"Error: El archivo {ruta} no existe; no se actualizó el catálogo '{nombre}' del almacén.")
+                continue
+            filas[nombre] = almacen.actualizar(nombre, intermedios.cargar_registros(ruta))
+            print(f"Catálogo '{nombre}' actualizado en el almacén '{ruta_almacen}': {filas[nombre]} filas.")
+    return filas
 
+# Ejecutar las funciones
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera los archivos intermedios de clientes, negociaciones y ofertas.")
+    parser.add_argument("--formato", choices=intermedios.FORMATOS_INTERMEDIOS, default="parquet",
+                        help="Formato de los archivos intermedios (por defecto parquet; json a pedido).")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Procesos que convierten las hojas del archivo de clientes en paralelo (por defecto uno por CPU).")
+    parser.add_argument("--almacen", nargs="?", const=almacenCatalogos.RUTA_ALMACEN, default=None, metavar="RUTA",
+                        help=f"Actualiza además el almacén SQLite de catálogos (por defecto {almacenCatalogos.RUTA_ALMACEN}) "
+                             f"que consulta funcionesFinal.py --almacen.")
+    serializacion.agregar_argumentos(parser)
+    perfilado.agregar_argumentos(parser)
+    args = parser.parse_args()
+    perfil = perfilado.crear_perfilador("generarJson", args)
+    formato_json = serializacion.crear_formato(args)
+    extension = intermedios.EXTENSIONES[args.formato]
+    if args.formato == "json":
+        extension = formato_json.ruta(extension)
+
+    with perfil.etapa("clientes", [archivo_clientes]) as etapa:
+        etapa["salidas"] = generar_json_clientes(archivo_clientes, args.formato, formato_json=formato_json, workers=args.workers)
+
+    rutas_negociacion = [os.path.join(carpeta_data, f'negociacion_{condicion}{extension}') for condicion in ('sell-in', 'sell-out')]
+    with perfil.etapa("negociacion", [archivo_negociacion], rutas_negociacion) as etapa:
+        df_negociacion = generar_json_negociacion(archivo_negociacion , carpeta_data, args.formato, formato_json)
+        etapa["filas_salida"] = len(df_negociacion) if df_negociacion is not None else 0
+
+    # Generar las ofertas con las negociaciones SELL-OUT ya cargadas (las mismas de negociacion_sell-out)
+    rutas_ofertas = [os.path.join(carpeta_data, f'{nombre}{extension}') for nombre in CONDICIONES_OFERTA.values()]
+    with perfil.etapa("ofertas", salidas=rutas_ofertas) as etapa:
+        if df_negociacion is not None:
+            negociacion_sell_out = df_negociacion[df_negociacion['Tipo condicion'] == 'SELL-OUT']
+            etapa["filas_entrada"] = len(negociacion_sell_out)
+            generar_json_ofertas(negociacion_sell_out, args.formato, formato_json)
+        else:
+            ruta_negociacion = rutas_negociacion[1]  # Ruta de negociaciones
+            etapa["entradas"] = [intermedios.resolver_ruta(ruta_negociacion)]
+            generar_json_ofertas(ruta_negociacion, args.formato, formato_json)
 
+    if args.almacen:
+        with perfil.etapa("almacen", salidas=[args.almacen]) as etapa:
+            etapa["filas_salida"] = sum(actualizar_almacen(args.almacen).values())
 
-# Generar el JSON de ofertas utilizando la ruta del archivo de negociaciones
-ruta_negociacion = os.path.join(carpeta_data, 'negociacion_sell-out.json')  # Ruta del JSON de negociaciones
-generar_json_ofertas(ruta_negociacion)
+    ruta_perfil = perfil.guardar()
+    if ruta_perfil:
+        print(f"Perfil de la ejecución guardado en '{ruta_perfil}'.")
@@ -0,0 +1,399 @@
+import json
+import math
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import serializacion
+
+
+# Formatos de los archivos intermedios entre generarJson.py y funcionesFinal.py
+FORMATOS_INTERMEDIOS = ("parquet", "json")
+EXTENSIONES = {"parquet": ".parquet", "json": ".json"}
+COMPRESION_PARQUET = "zstd"
+TAMANO_LOTE_LECTURA = 65_536  # Filas por lote al leer un archivo Parquet en flujo.
+EXTENSION_INDICE = ".indice.json"  # Índice que presenta varios archivos intermedios como una sola tabla.
+
+# Metadato del esquema con las columnas guardadas como texto JSON (columnas con tipos mezclados)
+CLAVE_COLUMNAS_JSON = b"bonificaciones.columnas_json"
+
+
+# Función para saber si un valor escalar es nulo
+def es_nulo(valor):
+    return valor is None or valor is pd.NA or valor is pd.NaT or (isinstance(valor, float) and math.isnan(valor))
+
+
+# Función para saber si una columna de objetos mezcla tipos
+def tiene_tipos_mezclados(serie):
+    """
+    Indica si una columna de objetos tiene valores no nulos de distintos tipos (por ejemplo
+    números y texto en "Numero Cliente"). Parquet exige un tipo por columna, así que esas
+    columnas se guardan como texto JSON para conservar el valor original de cada celda.
+    """
+    tipos = {type(valor) for valor in serie if not es_nulo(valor)}
+    return len(tipos) > 1 or bool(tipos - {str, int, float, bool})
+
+
+# Función para convertir una columna de fechas a milisegundos epoch
+def milisegundos_epoch(serie):
+    # Igual que `DataFrame.to_json`, para que Parquet, JSON y memoria den los mismos registros
+    milisegundos = (serie - pd.Timestamp(0, tz=serie.dt.tz)) // pd.Timedelta(milliseconds=1)
+    return milisegundos.astype('Int64')
+
+
+# Función para preparar un DataFrame antes de escribirlo en Parquet
+def preparar_para_parquet(df):
+    """
+    Ajusta el DataFrame para que el Parquet, al leerse, dé los mismos registros que el JSON:
+    nombres de columna como texto, fechas como milisegundos epoch (como `DataFrame.to_json`)
+    y columnas con tipos mezclados como texto JSON.
+
+    Returns:
+        tuple: (DataFrame preparado, lista de columnas guardadas como texto JSON).
+    """
+    df = df.copy()
+    df.columns = df.columns.astype(str)
+    columnas_json = []
+    for columna in df.columns:
+        serie = df[columna]
+        if pd.api.types.is_datetime64_any_dtype(serie):
+            df[columna] = milisegundos_epoch(serie)
+        elif serie.dtype == object and tiene_tipos_mezclados(serie):
+            df[columna] = serie.map(lambda valor: None if es_nulo(valor) else json.dumps(valor, ensure_ascii=False, default=str))
+            columnas_json.append(columna)
+    return df, columnas_json
+
+
+# Función para guardar una tabla intermedia
+def guardar_tabla(df, ruta_base, formato="parquet", formato_json=None):
+    """
+    Guarda un DataFrame como archivo intermedio.
+
+    Args:
+        df (pandas.DataFrame): Los datos a guardar.
+        ruta_base (str): La ruta del archivo sin extensión; la extensión depende del formato.
+        formato (str): "parquet" (columnar, tipado y comprimido) o "json" (arreglo de registros).
+        formato_json (serializacion.FormatoJson): Serializador, indentación y compresión del
+            JSON; por defecto el de `serializacion.FORMATO_PREDETERMINADO`.
+
+    Returns:
+        str: La ruta del archivo generado.
+    """
+    if formato not in FORMATOS_INTERMEDIOS:
+        raise ValueError(f"Formato intermedio no reconocido: {formato}")
+    ruta = ruta_base + EXTENSIONES[formato]
+
+    if formato == "json":
+        formato_json = formato_json or serializacion.FORMATO_PREDETERMINADO
+        ruta = formato_json.ruta(ruta)
+        with formato_json.abrir(ruta) as archivo:
+            if formato_json.serializador == "json":
+                # Se escribe directo, sin volver a decodificar el JSON generado por pandas
+                texto = df.to_json(orient='records', force_ascii=False, indent=formato_json.indentacion)
+                archivo.write(texto.encode('utf-8'))
+            else:
+                formato_json.escribir_arreglo(archivo, registros_de(df))
+        return ruta
+
+    escribir_parquet(*tabla_arrow(df), ruta)
+    return ruta
+
+
+# Función para convertir un DataFrame a la tabla Arrow que se guarda en Parquet
+def tabla_arrow(df):
+    """
+    Returns:
+        tuple: (pyarrow.Table, lista de columnas guardadas como texto JSON), ver `preparar_para_parquet`.
+    """
+    df, columnas_json = preparar_para_parquet(df)
+    return pa.Table.from_pandas(df, preserve_index=False), columnas_json
+
+
+# Función para escribir una tabla Arrow como archivo intermedio Parquet
+def escribir_parquet(tabla, columnas_json, ruta):
+    metadatos = dict(tabla.schema.metadata or {})
+    metadatos[CLAVE_COLUMNAS_JSON] = json.dumps(columnas_json).encode('utf-8')
+    pq.write_table(tabla.replace_schema_metadata(metadatos), ruta, compression=COMPRESION_PARQUET)
+
+
+# Función para unir en una sola tabla los bloques de una tabla convertidos por separado
+def unir_tablas(bloques):
+    """
+    Une tablas Arrow con las mismas columnas (por ejemplo, los bloques de una hoja de Excel,
+    cada uno convertido con `tabla_arrow`) cuyos tipos pueden no coincidir, porque cada bloque
+    se infirió por separado. Para cada columna:
+        - Los bloques donde la columna es toda nula toman el tipo de los demás.
+        - Booleanos, enteros y decimales se unen como el más amplio (como pandas en una sola tabla).
+        - Si los tipos no se pueden unir, o la columna es texto JSON en algún bloque, se guarda
+          como texto JSON en todos. Una columna de fechas en unos bloques y de texto en otros
+          conserva las fechas como milisegundos epoch.
+
+    Args:
+        bloques (list): Tuplas (pyarrow.Table, columnas JSON), en orden.
+
+    Returns:
+        tuple: (pyarrow.Table, lista de columnas guardadas como texto JSON).
+    """
+    if len(bloques) == 1:
+        return bloques[0]
+    tablas = [tabla for tabla, _ in bloques]
+    columnas_json = []
+    tipos = {}  # Columna -> tipo común
+    for columna in tablas[0].column_names:
+        presentes = {tabla.column(columna).type for tabla in tablas
+                     if tabla.column(columna).null_count < len(tabla.column(columna))}
+        json_previo = [tabla.column(columna).type for tabla, json_bloque in bloques if columna in json_bloque]
+        if json_previo:
+            columnas_json.append(columna)
+            tipos[columna] = json_previo[0]
+        elif len(presentes) <= 1:
+            tipos[columna] = presentes.pop() if presentes else tablas[0].column(columna).type
+        elif all(pa.types.is_floating(tipo) or pa.types.is_integer(tipo) or pa.types.is_boolean(tipo) for tipo in presentes):
+            tipos[columna] = pa.float64() if any(pa.types.is_floating(tipo) for tipo in presentes) else pa.int64()
+        else:
+            columnas_json.append(columna)
+            tipos[columna] = pa.string()
+
+    unidas = []
+    for tabla, json_bloque in bloques:
+        columnas = []
+        for columna in tabla.column_names:
+            valores = tabla.column(columna)
+            if columna in columnas_json and columna not in json_bloque:
+                valores = pa.array([None if valor is None else json.dumps(valor, ensure_ascii=False, default=str)
+                                    for valor in valores.to_pylist()], type=pa.string())
+            columnas.append(valores.cast(tipos[columna]))
+        unidas.append(pa.table(columnas, names=tabla.column_names))
+
+    # Los metadatos de pandas del primer bloque solo siguen valiendo si ninguna columna cambió de tipo
+    metadatos = tablas[0].schema.metadata or {}
+    if unidas[0].schema != tablas[0].schema.remove_metadata():
+        metadatos = {clave: valor for clave, valor in metadatos.items() if clave != b'pandas'}
+    tabla = pa.concat_tables(unidas).replace_schema_metadata(metadatos)
+    return tabla, columnas_json
+
+
+# Función para convertir un DataFrame a registros con tipos de Python
+def registros_de(df):
+    """
+    Convierte un DataFrame en una lista de diccionarios con valores de Python y None para los
+    nulos, igual que los registros leídos de un archivo intermedio (las fechas, en milisegundos epoch).
+    """
+    fechas = [columna for columna in df.columns if pd.api.types.is_datetime64_any_dtype(df[columna])]
+    if fechas:
+        df = df.copy()
+        for columna in fechas:
+            df[columna] = milisegundos_epoch(df[columna])
+    valores = df.astype(object)
+    return valores.where(valores.notna(), None).to_dict('records')
+
+
+# Función para guardar registros como tabla intermedia
+def guardar_registros(registros, ruta_base, formato="parquet", formato_json=None):
+    """
+    Guarda registros como archivo intermedio.
+
+    En JSON los registros se escriben tal cual con el serializador de `formato_json` (conservando
+    la precisión de los números); en Parquet se convierten a DataFrame y se guardan con `guardar_tabla`.
+
+    Args:
+        registros (list | pandas.DataFrame): Los registros (dict) a guardar, o un DataFrame con ellos.
+        ruta_base (str): La ruta del archivo sin extensión.
+        formato (str): "parquet" o "json".
+        formato_json (serializacion.FormatoJson): Cómo se escribe el JSON (ver `guardar_tabla`).
+
+    Returns:
+        str: La ruta del archivo generado.
+    """
+    if formato == "json":
+        if isinstance(registros, pd.DataFrame):
+            registros = registros_de(registros)
+        formato_json = formato_json or serializacion.FORMATO_PREDETERMINADO
+        return formato_json.escribir(ruta_base + EXTENSIONES["json"], registros)
+    if not isinstance(registros, pd.DataFrame):
+        registros = pd.DataFrame(registros)
+    return guardar_tabla(registros, ruta_base, formato)
+
+
+# Función para guardar un índice sobre varios archivos intermedios
+def guardar_indice(rutas, ruta_base, detalle=None):
+    """
+    Guarda un índice que presenta varios archivos intermedios como una sola tabla (por ejemplo
+    ofertaFinal sobre ofertaSellOut y ofertaSellIn), sin copiar sus datos.
+
+    Args:
+        rutas (list): Las rutas de los archivos, en el orden en que se leen.
+        ruta_base (str): La ruta del índice sin extensión.
+        detalle (list, opcional): Un diccionario por archivo, en el mismo orden, con lo que se
+            sabe de cada uno (por ejemplo el manifiesto de la salida particionada: mes, RETAIL
+            PAGO, filas y checksum); se lee con `detalle_de_indice`.
+
+    Returns:
+        str: La ruta del índice generado.
+    """
+    ruta = ruta_base + EXTENSION_INDICE
+    carpeta = os.path.dirname(ruta) or '.'
+    # Las rutas se guardan relativas al índice para poder mover la carpeta completa
+    particiones = [os.path.relpath(particion, carpeta) for particion in rutas]
+    contenido = {"particiones": particiones}
+    if detalle is not None:
+        contenido["detalle"] = detalle
+    with open(ruta, 'w', encoding='utf-8') as file:
+        json.dump(contenido, file, ensure_ascii=False, indent=4)
+    return ruta
+
+
+# Función para saber si una ruta es un índice de archivos intermedios
+def es_indice(ruta):
+    return str(ruta).endswith(EXTENSION_INDICE)
+
+
+# Función para obtener los archivos de un índice
+def rutas_de_indice(ruta):
+    """
+    Lee un índice generado por `guardar_indice`.
+
+    Args:
+        ruta (str): La ruta del índice.
+
+    Returns:
+        list: Las rutas de los archivos del índice, resueltas con `resolver_ruta`.
+    """
+    with open(ruta, 'r', encoding='utf-8') as file:
+        particiones = json.load(file)["particiones"]
+    carpeta = os.path.dirname(ruta)
+    return [resolver_ruta(os.path.join(carpeta, particion)) for particion in particiones]
+
+
+# Función para obtener los archivos de un índice junto con su detalle
+def detalle_de_indice(ruta):
+    """
+    Returns:
+        list: Tuplas (ruta del archivo, detalle) en el orden del índice; el detalle es el
+        diccionario guardado con `guardar_indice`, o None si el índice no lo tiene.
+    """
+    with open(ruta, 'r', encoding='utf-8') as file:
+        detalle = json.load(file).get("detalle")
+    rutas = rutas_de_indice(ruta)
+    return list(zip(rutas, detalle if detalle is not None else [None] * len(rutas)))
+
+
+# Función para convertir una tabla Arrow a registros
+def a_registros(tabla, columnas_json):
+    """
+    Convierte una tabla (o lote) Arrow en una lista de diccionarios, con None para los nulos.
+
+    Args:
+        tabla (pyarrow.Table | pyarrow.RecordBatch): Los datos a convertir.
+        columnas_json (list): Columnas guardadas como texto JSON, que se decodifican.
+
+    Returns:
+        list: Los registros (dict).
+    """
+    registros = tabla.to_pylist()
+    if columnas_json:
+        for registro in registros:
+            for columna in columnas_json:
+                if registro[columna] is not None:
+                    registro[columna] = json.loads(registro[columna])
+    return registros
+
+
+# Función para obtener las columnas guardadas como texto JSON
+def columnas_json_de(esquema):
+    metadatos = esquema.metadata or {}
+    return json.loads(metadatos.get(CLAVE_COLUMNAS_JSON, b"[]"))
+
+
+# Función para cargar un archivo intermedio como registros
+def cargar_registros(ruta, memory_map=True):
+    """
+    Carga un archivo intermedio completo como lista de registros.
+
+    Args:
+        ruta (str): La ruta del archivo (.parquet, .json, .json comprimido o un índice de varios archivos).
+        memory_map (bool): Si es True, el Parquet se lee mapeado en memoria en lugar de copiarse.
+
+    Returns:
+        list: Los registros (dict).
+    """
+    if es_indice(ruta):
+        registros = []
+        for particion in rutas_de_indice(ruta):
+            registros.extend(cargar_registros(particion, memory_map))
+        return registros
+    if not ruta.endswith(EXTENSIONES["parquet"]):
+        return serializacion.cargar(ruta)
+    tabla = pq.read_table(ruta, memory_map=memory_map)
+    return a_registros(tabla, columnas_json_de(tabla.schema))
+
+
+# Función para leer un archivo Parquet en flujo
+def leer_registros_stream(ruta, tamano_lote=TAMANO_LOTE_LECTURA, memory_map=True):
+    """
+    Lee un archivo Parquet por lotes, entregando un registro a la vez.
+
+    Args:
+        ruta (str): La ruta del archivo Parquet.
+        tamano_lote (int): Cantidad de filas que se decodifican a la vez.
+        memory_map (bool): Si es True, el archivo se lee mapeado en memoria.
+
+    Yields:
+        dict: Cada registro del archivo.
+    """
+    for lote, columnas_json in leer_lotes(ruta, tamano_lote, memory_map):
+        yield from a_registros(lote, columnas_json)
+
+
+# Función para leer un archivo Parquet por lotes Arrow
+def leer_lotes(ruta, tamano_lote=TAMANO_LOTE_LECTURA, memory_map=True, categoricas=()):
+    """
+    Lee un archivo Parquet (o un índice de varios archivos) por lotes, sin convertirlos a registros.
+
+    Args:
+        ruta (str): La ruta del archivo Parquet o del índice.
+        tamano_lote (int): Cantidad de filas de cada lote.
+        memory_map (bool): Si es True, el archivo se lee mapeado en memoria.
+        categoricas (list): Columnas con pocos valores distintos que se leen como diccionario
+            (cada valor distinto una vez y un índice por fila). Los valores no cambian.
+
+    Yields:
+        tuple: (pyarrow.RecordBatch, columnas guardadas como texto JSON en ese archivo).
+    """
+    if es_indice(ruta):
+        for particion in rutas_de_indice(ruta):
+            yield from leer_lotes(particion, tamano_lote, memory_map, categoricas)
+        return
+    columnas = pq.read_schema(ruta, memory_map=memory_map).names
+    archivo = pq.ParquetFile(ruta, memory_map=memory_map,
+                             read_dictionary=[columna for columna in categoricas if columna in columnas])
+    columnas_json = columnas_json_de(archivo.schema_arrow)
+    for lote in archivo.iter_batches(batch_size=tamano_lote):
+        yield lote, columnas_json
+
+
+# Función para ubicar un archivo intermedio en cualquiera de sus formatos
+def resolver_ruta(ruta):
+    """
+    Devuelve la ruta del archivo intermedio que existe: la indicada o, si no existe, la
+    misma ruta con la extensión del otro formato (por ejemplo, un .json de ejecuciones anteriores),
+    la de un .json comprimido (.json.gz o .json.zst) o la de un índice de varios archivos.
+
+    Args:
+        ruta (str): La ruta esperada del archivo.
+
+    Returns:
+        str: La ruta existente, o la indicada si no existe en ningún formato.
+    """
+    if os.path.isfile(ruta):
+        return ruta
+    base, extension = os.path.splitext(ruta)
+    if extension in serializacion.EXTENSIONES_COMPRESION.values():
+        base, _ = os.path.splitext(base)
+    for extension in (*EXTENSIONES.values(), EXTENSION_INDICE):
+        candidata = serializacion.ruta_existente(base + extension)
+        if os.path.isfile(candidata):
+            return candidata
+    return ruta
@@ -0,0 +1,110 @@
+import math
+import zipfile
+import xml.etree.ElementTree as ET
+
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+from pandas.io.parsers import TextParser
+
+FILAS_POR_BLOQUE = 50_000  # Filas de una hoja que se convierten a DataFrame a la vez.
+ESPACIO_HOJAS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+
+
+# Función para obtener los nombres de las hojas de un libro sin cargarlo
+def nombres_hojas(archivo_excel):
+    """
+    Lee solo la lista de hojas del libro (xl/workbook.xml), sin leer los textos compartidos ni
+    los estilos, que openpyxl carga al abrir el libro.
+
+    Returns:
+        list: Los nombres de las hojas, en el orden del libro.
+    """
+    with zipfile.ZipFile(archivo_excel) as libro:
+        raiz = ET.fromstring(libro.read("xl/workbook.xml"))
+    return [hoja.get("name") for hoja in raiz.iter(f"{ESPACIO_HOJAS}sheet")]
+
+
+# Función para abrir un libro de Excel en modo de solo lectura
+def abrir_libro(archivo_excel):
+    # Igual que pandas: las hojas se leen en flujo y las fórmulas con su último valor calculado
+    return load_workbook(archivo_excel, read_only=True, data_only=True, keep_links=False)
+
+
+# Función para convertir una celda al valor que usa pandas.read_excel
+def valor_celda(celda):
+    valor = celda.value
+    if valor is None:
+        return ""
+    if celda.data_type == TYPE_ERROR:
+        return math.nan
+    if celda.data_type == TYPE_NUMERIC:
+        entero = int(valor)
+        return entero if entero == valor else float(valor)
+    return valor
+
+
+# Función para leer una hoja de Excel por bloques de filas
+def leer_hoja_por_bloques(libro, hoja, filas=FILAS_POR_BLOQUE):
+    """
+    Recorre las filas de la hoja en flujo y entrega cada bloque como DataFrame, de modo que la
+    hoja nunca está completa en memoria.
+
+    Cada bloque se arma con el mismo intérprete que `pandas.read_excel` (la primera fila como
+    encabezado, las celdas vacías como nulos y los tipos inferidos por columna), pero los tipos
+    se infieren dentro del bloque: una columna de enteros con celdas vacías solo pasa a decimal
+    en los bloques donde está vacía. Las filas vacías al final de la hoja se descartan.
+
+    Args:
+        libro (openpyxl.Workbook): El libro, abierto con `abrir_libro`.
+        hoja (str): El nombre de la hoja.
+        filas (int): Cantidad máxima de filas de datos por bloque.
+
+    Yields:
+        pandas.DataFrame: Cada bloque, en el orden de la hoja. Una hoja sin filas de datos da un
+        solo bloque vacío (con las columnas del encabezado, si lo tiene).
+    """
+    hoja_libro = libro[hoja]
+    hoja_libro.reset_dimensions()
+    encabezado = None
+    bloque = []
+    vacias = 0  # Filas vacías pendientes: solo se conservan si después hay más datos
+    entregados = 0
+    for celdas in hoja_libro.iter_rows():
+        fila = [valor_celda(celda) for celda in celdas]
+        while fila and fila[-1] == "":
+            fila.pop()
+        if encabezado is None:
+            encabezado = fila  # La primera fila, aunque esté vacía (como pandas)
+            continue
+        if not fila:
+            vacias += 1
+            continue
+        bloque.extend([[]] * vacias)
+        vacias = 0
+        bloque.append(fila)
+        if len(bloque) >= filas:
+            yield convertir_bloque(encabezado, bloque)
+            entregados += 1
+            bloque = []
+    if bloque or not entregados:
+        yield convertir_bloque(encabezado, bloque)
+
+
+# Función para convertir un bloque de filas en DataFrame
+def convertir_bloque(encabezado, filas):
+    """
+    Args:
+        encabezado (list): Los valores de la fila de encabezado (None si la hoja no tiene filas).
+        filas (list): Las filas de datos del bloque (listas de valores de `valor_celda`).
+
+    Returns:
+        pandas.DataFrame: El bloque, con las columnas del encabezado.
+    """
+    if not encabezado and not filas:
+        return pd.DataFrame()  # Hoja sin filas, o solo con filas vacías
+    # Como pandas, todas las filas se completan al ancho de la más larga; las columnas sin
+    # encabezado quedan como "Unnamed: N"
+    ancho = max([len(encabezado)] + [len(fila) for fila in filas])
+    datos = [fila + [""] * (ancho - len(fila)) for fila in [encabezado] + filas]
+    return TextParser(datos, header=0, skip_blank_lines=False).read()
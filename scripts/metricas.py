@@ -0,0 +1,176 @@
+import ctypes
+import logging
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+
+# Contadores que se reportan siempre en el resumen, aunque queden en cero
+CONTADORES = {
+    "procesados": "Elementos procesados",
+    "con_oferta": "Con oferta vigente",
+    "sin_oferta": "Sin oferta para la llave",
+    "fuera_de_vigencia": "Fuera de vigencia",
+    "condicion_no_reconocida": "Tipo de condición de costo no reconocido",
+}
+TOP_LLAVES = 10  # Cantidad de llaves sin oferta que se listan en el resumen.
+
+try:
+    import resource  # Solo existe en Unix; en Windows la memoria se consulta con la API de psapi.
+except ImportError:
+    resource = None
+
+
+# Contadores de memoria de un proceso en Windows (PROCESS_MEMORY_COUNTERS)
+class _ContadoresMemoria(ctypes.Structure):
+    _fields_ = [("cb", ctypes.c_ulong), ("PageFaultCount", ctypes.c_ulong)] + [
+        (campo, ctypes.c_size_t) for campo in (
+            "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+            "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")]
+
+
+# Función para obtener la memoria residente máxima del proceso
+def memoria_pico_mb(hijos=False):
+    """
+    Devuelve la memoria residente máxima (RSS pico) alcanzada por el proceso actual, en MB.
+
+    Args:
+        hijos (bool): Si es True, devuelve la del proceso hijo (ya terminado) que más memoria usó.
+            Solo disponible en Unix.
+
+    Returns:
+        float: La memoria en MB, o None si no se puede medir en esta plataforma.
+    """
+    if resource is not None:
+        pico = resource.getrusage(resource.RUSAGE_CHILDREN if hijos else resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss está en bytes en macOS y en KB en Linux
+        return pico / 1024 / 1024 if sys.platform == "darwin" else pico / 1024
+    if sys.platform == "win32" and not hijos:
+        contadores = _ContadoresMemoria()
+        contadores.cb = ctypes.sizeof(contadores)
+        proceso = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(proceso, ctypes.byref(contadores), contadores.cb):
+            return contadores.PeakWorkingSetSize / 1024 / 1024
+    return None
+
+
+class MetricasEjecucion:
+    """
+    Acumula las métricas de una ejecución del enriquecimiento: contadores por resultado,
+    llaves sin oferta más frecuentes y tiempos por etapa.
+
+    Reemplaza el log por elemento: en lugar de escribir una línea por venta se cuentan los
+    resultados y al final se escribe un solo resumen. Opcionalmente se escribe en el log de
+    depuración uno de cada `muestreo` elementos procesados.
+
+    Además de los tiempos por etapa se registran hitos: los segundos desde que se crearon las
+    métricas hasta que ocurrió algo por primera vez (por ejemplo, el primer lote procesado).
+
+    Las métricas son aditivas: las de cada lote (o proceso trabajador) se pueden combinar con
+    `combinar` sin perder información. Lo mismo el cubo de beneficio (`cuboBeneficio`), que los
+    motores llenan junto con los contadores cuando está activo.
+    """
+
+    def __init__(self, muestreo=0, cubo=None):
+        """
+        Args:
+            muestreo (int): Si es mayor que 0, se registra en el log (nivel DEBUG) uno de cada
+                `muestreo` elementos procesados. 0 desactiva el muestreo.
+            cubo (CuboBeneficio, opcional): Cubo donde los motores suman el beneficio de cada
+                venta. None no lo calcula.
+        """
+        self.contadores = Counter()
+        self.llaves_sin_oferta = Counter()
+        self.etapas = {}
+        self.hitos = {}
+        self.muestreo = muestreo
+        self.cubo = cubo
+        self.inicio = time.perf_counter()
+
+    # Función para sumar a un contador
+    def contar(self, nombre, cantidad=1):
+        self.contadores[nombre] += cantidad
+
+    # Función para registrar una llave sin oferta
+    def registrar_sin_oferta(self, llave, cantidad=1):
+        self.contadores["sin_oferta"] += cantidad
+        self.llaves_sin_oferta[llave] += cantidad
+
+    # Función para registrar una muestra en el log de depuración
+    def muestrear(self, indice, elemento):
+        """
+        Escribe el elemento en el log de depuración si le toca según el muestreo.
+
+        Args:
+            indice (int): La posición del elemento dentro de la ejecución.
+            elemento (dict): El elemento ya procesado.
+        """
+        if self.muestreo and indice % self.muestreo == 0:
+            logging.debug(f"Muestra del elemento {indice}: {elemento}")
+
+    # Context manager para medir el tiempo de una etapa
+    @contextmanager
+    def etapa(self, nombre):
+        """
+        Mide el tiempo de reloj de una etapa. Si la etapa se repite, los tiempos se suman.
+
+        Args:
+            nombre (str): El nombre de la etapa.
+        """
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.etapas[nombre] = self.etapas.get(nombre, 0.0) + time.perf_counter() - inicio
+
+    # Función para registrar un hito de la ejecución (solo la primera vez que ocurre)
+    def marcar(self, nombre):
+        self.hitos.setdefault(nombre, time.perf_counter() - self.inicio)
+
+    # Función para combinar las métricas de otra ejecución parcial
+    def combinar(self, otras):
+        """
+        Suma a estas métricas los contadores, las llaves sin oferta y el cubo de `otras`.
+
+        Args:
+            otras (MetricasEjecucion): Las métricas a combinar (por ejemplo, las de un lote).
+        """
+        self.contadores.update(otras.contadores)
+        self.llaves_sin_oferta.update(otras.llaves_sin_oferta)
+        for nombre, segundos in otras.etapas.items():
+            self.etapas[nombre] = self.etapas.get(nombre, 0.0) + segundos
+        if self.cubo is not None and otras.cubo is not None:
+            self.cubo.combinar(otras.cubo)
+
+    # Función para generar el resumen de la ejecución
+    def resumen(self, etapa_principal="enriquecimiento"):
+        """
+        Genera un resumen legible de la ejecución.
+
+        Args:
+            etapa_principal (str): La etapa cuyo tiempo se usa para calcular elementos por segundo.
+
+        Returns:
+            str: El resumen, en varias líneas.
+        """
+        lineas = ["Resumen de la ejecución:"]
+        for nombre, descripcion in CONTADORES.items():
+            lineas.append(f"  {descripcion}: {self.contadores[nombre]}")
+        for nombre, cantidad in self.contadores.items():
+            if nombre not in CONTADORES:
+                lineas.append(f"  {nombre}: {cantidad}")
+
+        segundos = self.etapas.get(etapa_principal, 0.0)
+        if segundos > 0:
+            lineas.append(f"  Elementos por segundo: {self.contadores['procesados'] / segundos:,.0f}")
+        for nombre, segundos in self.etapas.items():
+            lineas.append(f"  Tiempo de {nombre}: {segundos:.2f} s")
+        for nombre, segundos in self.hitos.items():
+            lineas.append(f"  Hito '{nombre}': {segundos:.2f} s desde el inicio")
+
+        if self.llaves_sin_oferta:
+            lineas.append(f"  Llaves sin oferta más frecuentes (top {TOP_LLAVES}):")
+            for llave, cantidad in self.llaves_sin_oferta.most_common(TOP_LLAVES):
+                lineas.append(f"    {llave}: {cantidad}")
+        return "\n".join(lineas)
@@ -0,0 +1,616 @@
+import json
+import sys
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from fechas import convertir_fecha_ordinal, formatear_fecha_ordinal
+import intermedios  # Conversión de lotes Arrow a registros para el motor compacto.
+import catalogoProductos  # Catálogo de productos mapeado en memoria.
+import condicionesCosto  # Funciones de cada tipo de condición de costo, por lotes.
+import cuboBeneficio  # Agregado de Total Beneficio por RETAIL PAGO, Llave, Tipo de Valuacion y mes.
+
+
+# Campos de la venta que el motor necesita leer
+CAMPOS_VENTA = ["Producto Código", "ACCOUNT_NUMBER", "Llave", "Pzas Facturadas", "Descuento Factura",
+                "Tipo condicion costo", "Costo Total"]
+
+# Campos que `procesar_elemento` usa según la venta los traiga o no (aunque sean nulos)
+CAMPOS_PRESENCIA = ["ACCOUNT_NUMBER", "Llave"]
+
+# "Valor condicion Costo" de las ventas que lo reciben después de los campos financieros (condiciones
+# con `financieros_previos`): otra columna, que se escribe en la venta con el nombre del campo
+VALOR_CONDICION_AL_FINAL = "Valor condicion Costo (al final)"
+CAMPOS_SALIDA = {VALOR_CONDICION_AL_FINAL: "Valor condicion Costo"}  # Columna -> campo de la venta, si son distintos
+
+# Campos de la venta con pocos valores distintos (las claves de producto y cliente), que el motor
+# compacto lee del Parquet como diccionario
+CAMPOS_CATEGORICOS = ["Producto Código", "ACCOUNT_NUMBER"]
+
+SEPARACION_LLAVES = 1 << 22  # Mayor que cualquier ordinal de día (date.max.toordinal() < 2**22).
+
+
+# Función para ubicar claves en una tabla de forma vectorizada
+def ubicar(claves, tabla):
+    """
+    Obtiene la posición de cada clave dentro de `tabla` (equivalente a un join por clave).
+
+    Args:
+        claves (array-like): Las claves a buscar.
+        tabla (dict): Diccionario clave -> registro (dict).
+
+    Returns:
+        numpy.ndarray: La posición de cada clave en el orden de `tabla`, o -1 si no existe.
+    """
+    indice = pd.Index(list(tabla.keys()), dtype=object)
+    return indice.get_indexer(pd.Index(claves, dtype=object))
+
+
+# Función para obtener un campo de los registros en las posiciones dadas
+def tomar(registros, campo, posiciones, predeterminado=None):
+    """
+    Equivalente vectorizado de `tabla.get(clave, {}).get(campo, predeterminado)`.
+
+    Args:
+        registros (list): Los registros (dict) de la tabla, en el orden de las posiciones.
+        campo (str): El campo del registro que se quiere obtener.
+        posiciones (numpy.ndarray): Posición de cada registro buscado, o -1 si no existe.
+        predeterminado: Valor para las claves que no existen o registros sin el campo.
+
+    Returns:
+        numpy.ndarray: Arreglo de objetos con el valor tal cual aparece en cada registro.
+    """
+    # Las claves no encontradas (-1) apuntan al último elemento, que es el predeterminado
+    return valores_de(registros, campo, predeterminado)[posiciones]
+
+
+# Función para obtener un campo de todos los registros de una tabla
+def valores_de(registros, campo, predeterminado=None):
+    """
+    Returns:
+        numpy.ndarray: Arreglo de objetos con el campo de cada registro y, al final, el predeterminado.
+    """
+    valores_tabla = np.empty(len(registros) + 1, dtype=object)
+    valores_tabla[:-1] = [registro.get(campo, predeterminado) for registro in registros]
+    valores_tabla[-1] = predeterminado
+    return valores_tabla
+
+
+class TablaEnMemoria:
+    """
+    Presenta un diccionario clave -> registro con la misma interfaz de búsqueda por lotes que el
+    catálogo mapeado de `catalogoProductos` (`ubicar` y `valores_en`).
+    """
+
+    def __init__(self, tabla):
+        self.tabla = tabla
+        self.registros = list(tabla.values())
+
+    # Función para ubicar varias claves a la vez
+    def ubicar(self, claves):
+        return ubicar(claves, self.tabla)
+
+    # Función para obtener un campo de los registros en las posiciones dadas
+    def valores_en(self, campo, posiciones, predeterminado=None):
+        """
+        Returns:
+            tuple: (posiciones, valores) tal que `valores[posiciones]` es el campo de cada registro.
+        """
+        return posiciones, valores_de(self.registros, campo, predeterminado)
+
+
+# Función para usar un catálogo (mapeado o diccionario) con la interfaz de búsqueda por lotes
+def como_tabla(catalogo):
+    return catalogo if isinstance(catalogo, catalogoProductos.CatalogoMapeado) else TablaEnMemoria(catalogo)
+
+
+class ColumnaIndexada:
+    """
+    Columna cuyos valores se toman de una tabla (productos, clientes u ofertas): guarda solo la
+    posición de cada fila en la tabla, en lugar de una referencia a cada valor.
+
+    Se indexa y se convierte a lista como un arreglo de NumPy, que es lo que usa `escribir_campos`.
+    """
+
+    __slots__ = ("posiciones", "valores")
+
+    def __init__(self, posiciones, valores):
+        self.posiciones = posiciones.astype(np.int32)
+        self.valores = valores
+
+    def __getitem__(self, indices):
+        return ColumnaIndexada(self.posiciones[indices], self.valores)
+
+    def __len__(self):
+        return len(self.posiciones)
+
+    def tolist(self):
+        return self.valores[self.posiciones].tolist()
+
+    @property
+    def nbytes(self):
+        return self.posiciones.nbytes
+
+
+# Función para convertir fechas a ordinales de día de forma vectorizada
+def convertir_fechas_ordinal(valores):
+    """
+    Convierte un arreglo de fechas (ordinales de día o texto 'MM/DD/YYYY') a ordinales enteros.
+    Cada fecha distinta se convierte una sola vez con `fechas.convertir_fecha_ordinal`.
+
+    Returns:
+        numpy.ndarray: Arreglo int64 con el ordinal de cada fecha, o -1 si está vacía o no es válida.
+    """
+    codigos, unicos = pd.factorize(pd.Series(valores, dtype=object))
+    ordinales = [convertir_fecha_ordinal(valor) for valor in unicos]
+    convertidas = np.asarray([-1 if ordinal is None else ordinal for ordinal in ordinales] + [-1], dtype=np.int64)
+    # Los valores nulos (-1) apuntan al último elemento, que es -1
+    return convertidas[codigos]
+
+
+# Función para ubicar la oferta vigente de cada venta en el índice de ofertas
+def ubicar_ofertas_vigentes(posicion_llave, fecha, ofertas_dict):
+    """
+    Equivalente vectorizado de `buscar_oferta_vigente` para todas las ventas a la vez.
+
+    Las ventanas de todas las Llaves se aplanan en un solo arreglo ordenado por (Llave, inicio)
+    y cada venta se ubica con una búsqueda binaria (`np.searchsorted`) sobre ese arreglo.
+
+    Args:
+        posicion_llave (numpy.ndarray): Posición de la Llave de cada venta en `ofertas_dict`, o -1.
+        fecha (numpy.ndarray): Ordinal del día de cada venta, o -1 si la fecha no es válida.
+        ofertas_dict (dict): Índice de ofertas generado por `construir_indice_ofertas`.
+
+    Returns:
+        tuple: (ofertas, posiciones) donde `ofertas` es la lista aplanada de ofertas y
+        `posiciones` la posición de la oferta vigente de cada venta, o -1 si no hay ninguna.
+    """
+    ofertas, inicios, fines, fines_maximos, desde = [], [], [], [], []
+    for ventanas in ofertas_dict.values():
+        desde.append(len(ofertas))
+        ofertas.extend(ventanas["ofertas"])
+        inicios.extend(ventanas["inicios"])
+        fines.extend(ventanas["fines"])
+        fines_maximos.extend(ventanas["fines_maximos"])
+    desde = np.asarray(desde + [len(ofertas)], dtype=np.int64)
+    fines = np.asarray(fines, dtype=np.int64)
+    fines_maximos = np.asarray(fines_maximos, dtype=np.int64)
+    # Clave compuesta (Llave, inicio): los bloques de cada Llave quedan contiguos y ordenados
+    llave_de_ventana = np.repeat(np.arange(len(desde) - 1, dtype=np.int64), np.diff(desde))
+    compuesto = llave_de_ventana * SEPARACION_LLAVES + np.asarray(inicios, dtype=np.int64)
+
+    posiciones = np.full(len(fecha), -1, dtype=np.int64)
+    activas = np.flatnonzero((posicion_llave >= 0) & (fecha >= 0))
+    if not len(activas) or not len(ofertas):
+        return ofertas, posiciones
+    candidata = np.searchsorted(compuesto, posicion_llave[activas] * SEPARACION_LLAVES + fecha[activas], side='right') - 1
+    # Retroceder solo mientras alguna ventana anterior de la misma Llave pueda seguir vigente
+    while len(activas):
+        inicio_bloque = desde[posicion_llave[activas]]
+        dia = fecha[activas]
+        sigue = (candidata >= inicio_bloque) & (fines_maximos[np.maximum(candidata, 0)] >= dia)
+        activas, candidata, dia = activas[sigue], candidata[sigue], dia[sigue]
+        vigente = fines[candidata] >= dia
+        posiciones[activas[vigente]] = candidata[vigente]
+        activas, candidata = activas[~vigente], candidata[~vigente] - 1
+    return ofertas, posiciones
+
+
+# Función para evaluar la veracidad de cada valor, como lo haría un `if valor:`
+def es_verdadero(valores):
+    return np.fromiter((bool(valor) for valor in valores), dtype=bool, count=len(valores))
+
+
+# Función para interpretar como categoría los valores de un arreglo
+def categorizar(valores):
+    """
+    Representa un arreglo (o una columna de pandas) como categoría: un código entero por fila y
+    cada valor distinto una sola vez. Los nulos quedan con código -1.
+
+    Returns:
+        tuple: (códigos, numpy.ndarray de objetos con los valores distintos).
+    """
+    if not isinstance(valores, pd.Series):
+        valores = pd.Series(valores, dtype=object)
+    codigos, unicos = pd.factorize(valores)
+    return codigos, np.asarray(unicos, dtype=object)
+
+
+# Función para calcular los campos enriquecidos de un lote de ventas
+def calcular_ventas(ventas, presencia, fecha, fecha_es_ordinal, productos_dict, clientes_dict, ofertas_dict, metricas=None):
+    """
+    Calcula en bloque, con pandas/NumPy, los campos que `procesar_elemento` agrega a cada venta.
+
+    Los campos repetitivos (Fecha, EAN y Llave) se calculan sobre sus valores distintos y se
+    devuelven como categorías (`pandas.Categorical`), y los que se copian de una tabla (Valuacion
+    Unitaria, Validacion Cliente, RETAIL PAGO y Tipo de Valuacion) como `ColumnaIndexada`, así
+    cada texto existe una sola vez en memoria.
+
+    Args:
+        ventas (pandas.DataFrame): Las columnas de CAMPOS_VENTA de cada venta.
+        presencia (dict): Campo de CAMPOS_PRESENCIA -> máscara de las ventas que traen el campo,
+            aunque sea nulo.
+        fecha (numpy.ndarray): Ordinal del día de cada venta, o -1 si la fecha no es válida.
+        fecha_es_ordinal (numpy.ndarray): Ventas cuya Fecha viene como ordinal y se reescribe en texto.
+        productos_dict (dict | CatalogoMapeado): Productos indexados por EAN (`Producto Código` sin los 2 últimos dígitos).
+        clientes_dict (dict): Clientes indexados por NUMERO FARMACIA.
+        ofertas_dict (dict): Índice de ofertas por Llave generado por `construir_indice_ofertas`.
+        metricas (MetricasEjecucion, opcional): Métricas donde se cuentan los resultados del lote.
+
+    Returns:
+        tuple: (columnas, presentes) como las recibe `escribir_campos`. Las columnas son arreglos
+        de NumPy, `pandas.Categorical` o `ColumnaIndexada`.
+    """
+    n = len(ventas)
+    tiene_codigo = ventas["Producto Código"].notna().to_numpy()
+    # Como en `procesar_elemento`: la venta que trae ACCOUNT_NUMBER (aunque sea nulo) recibe la
+    # Llave RETAIL PAGO + EAN; la que no lo trae busca la oferta con la Llave que trae, si la tiene
+    tiene_cuenta = presencia["ACCOUNT_NUMBER"] & tiene_codigo
+    llave_propia = presencia["Llave"] & ~presencia["ACCOUNT_NUMBER"]
+
+    # Producto: EAN y Valuacion Unitaria (el código se recorta una vez por código distinto)
+    codigos_producto, productos_distintos = categorizar(ventas["Producto Código"])
+    eans_por_producto = pd.Series(productos_distintos, dtype=object).str[:-2].to_numpy(dtype=object)
+    codigos_ean, eans = categorizar(eans_por_producto)
+    codigo_ean = np.append(codigos_ean, -1)[codigos_producto]
+    ean = pd.Categorical.from_codes(codigo_ean, pd.Index(eans, dtype=object))
+    tabla_productos = como_tabla(productos_dict)
+    posicion_producto = np.append(tabla_productos.ubicar(eans), -1)[codigo_ean]
+    producto_encontrado = posicion_producto >= 0
+    valuacion_unitaria = ColumnaIndexada(*tabla_productos.valores_en("Costo de Reposicion", posicion_producto))
+
+    # Cliente: Validacion Cliente, RETAIL PAGO y Llave
+    clientes = list(clientes_dict.values())
+    codigos_cuenta, cuentas = categorizar(ventas["ACCOUNT_NUMBER"])
+    posicion_cliente = np.append(ubicar(cuentas, clientes_dict), -1)[codigos_cuenta]
+    validacion_cliente = ColumnaIndexada(posicion_cliente, valores_de(clientes, "Aplica", "No"))
+    retail_pago_cliente = ColumnaIndexada(posicion_cliente, valores_de(clientes, "RETAIL PAGO", "No"))
+    retail_pago = tomar(clientes, "RETAIL PAGO", posicion_cliente, "No")
+    retail_pago[~presencia["ACCOUNT_NUMBER"]] = cuboBeneficio.SIN_RETAIL_PAGO
+
+    # Llave = RETAIL PAGO + EAN, armada una sola vez por combinación distinta
+    codigos_retail, retails = categorizar(retail_pago)
+    combinacion = codigos_retail.astype(np.int64) * (len(eans) + 1) + (codigo_ean + 1)
+    combinaciones, codigo_combinacion = np.unique(combinacion[tiene_cuenta], return_inverse=True)
+    eans_texto = np.append(np.asarray(["nan"], dtype=object), eans.astype(str))
+    # Internadas: los lotes de un mismo archivo comparten el mismo objeto para cada Llave
+    textos = [sys.intern(f"{retails[c // (len(eans) + 1)]}{eans_texto[c % (len(eans) + 1)]}") for c in combinaciones.tolist()]
+    codigos_texto, llaves = categorizar(textos)
+    codigo_llave = np.full(n, -1, dtype=np.int64)
+    codigo_llave[tiene_cuenta] = codigos_texto[codigo_combinacion.reshape(-1)]
+    if llave_propia.any():
+        # Las Llaves que traen las ventas se suman a las categorías (una Llave nula queda con -1)
+        codigos_propias, propias = categorizar(ventas["Llave"].to_numpy(dtype=object)[llave_propia])
+        codigos_union, llaves = categorizar(np.concatenate([llaves, propias]))
+        codigo_llave[tiene_cuenta] = codigos_union[codigo_llave[tiene_cuenta]]
+        codigo_llave[llave_propia] = np.append(codigos_union[len(codigos_union) - len(propias):], -1)[codigos_propias]
+    con_llave = tiene_cuenta | llave_propia
+    llave = pd.Categorical.from_codes(codigo_llave, pd.Index(llaves, dtype=object))
+
+    # Ofertas: unión por Llave y búsqueda de la ventana de vigencia que incluye la fecha
+    posicion_llave = np.append(ubicar(llaves, ofertas_dict), -1)[codigo_llave]
+    oferta_encontrada = posicion_llave >= 0
+    ofertas, posicion_oferta = ubicar_ofertas_vigentes(posicion_llave, fecha, ofertas_dict)
+    aplica = posicion_oferta >= 0
+
+    oferta_cap = tomar(ofertas, "CAP", posicion_oferta, 0.0)
+    oferta_oferta = tomar(ofertas, "Oferta", posicion_oferta, 0.0)
+    tipo_valuacion = ColumnaIndexada(posicion_oferta, valores_de(ofertas, "Nombre regla"))
+    nombre_regla = tomar(ofertas, "Nombre regla", posicion_oferta)
+    costo_fijo_oferta = tomar(ofertas, "Costo Fijo", posicion_oferta)
+    tipo_condicion_oferta = tomar(ofertas, "Tipo condicion costo", posicion_oferta)
+
+    cap = pd.to_numeric(pd.Series(oferta_cap, dtype=object), errors='coerce').to_numpy(dtype=float)
+    oferta = pd.to_numeric(pd.Series(oferta_oferta, dtype=object), errors='coerce').to_numpy(dtype=float)
+
+    # Tipo de Valuacion: columna del producto indicada por "Nombre regla", o el Costo Fijo de la oferta
+    con_valuacion = aplica & producto_encontrado & es_verdadero(nombre_regla)
+    valor_tipo_valuacion = np.full(n, None, dtype=object)
+    for regla in pd.unique(nombre_regla[con_valuacion]):
+        mascara = con_valuacion & (nombre_regla == regla)
+        if regla == "Costo Fijo":
+            valor_tipo_valuacion[mascara] = costo_fijo_oferta[mascara]
+        else:
+            posiciones, valores = tabla_productos.valores_en(regla, posicion_producto[mascara])
+            valor_tipo_valuacion[mascara] = valores[posiciones]
+
+    # Tipo condicion costo: el de la oferta si existe, si no el que ya traía la venta
+    con_tipo_condicion = aplica & es_verdadero(tipo_condicion_oferta)
+    tipo_condicion = ventas["Tipo condicion costo"].to_numpy(dtype=object).copy()
+    tipo_condicion[con_tipo_condicion] = tipo_condicion_oferta[con_tipo_condicion]
+
+    piezas = pd.to_numeric(ventas["Pzas Facturadas"], errors='coerce').fillna(1).to_numpy(dtype=float)
+    descuento = pd.to_numeric(ventas["Descuento Factura"], errors='coerce').fillna(0.0).to_numpy(dtype=float)
+    valuacion = pd.to_numeric(pd.Series(valor_tipo_valuacion, dtype=object), errors='coerce')
+    valuacion = valuacion.where(pd.Series(con_valuacion), 0.0).to_numpy(dtype=float)
+
+    # Condición de costo: cada grupo de ventas con el mismo tipo se calcula con la función
+    # registrada en `condicionesCosto`. Costo Total: el calculado por la condición (por ejemplo
+    # "% DESCUENTO SOBRE COSTO") o el que ya traía la venta
+    costo_total = pd.to_numeric(ventas["Costo Total"], errors='coerce').to_numpy(dtype=float)
+    valor_condicion, costo_total, con_costo_total, reconocida = condicionesCosto.calcular_condiciones(
+        tipo_condicion, aplica, condicionesCosto.VentasCondicion(piezas, valuacion, descuento), costo_total)
+    con_financieros = aplica & ~np.isnan(costo_total)
+    tipos_previos = [tipo for tipo, condicion in condicionesCosto.CONDICIONES.items() if condicion.financieros_previos]
+    condicion_al_final = con_financieros & pd.Series(tipo_condicion, dtype=object).isin(tipos_previos).to_numpy()
+
+    # Campos financieros (el encadenamiento CAP -> OFERTA de `calcular_campos_financieros`)
+    valor_cap, costo_con_cap, valor_oferta, total_beneficio = condicionesCosto.calcular_financieros(cap, oferta, costo_total)
+
+    # Fecha: si viene como ordinal (generarJson.py), la salida final la conserva en texto
+    ordinales, inversa = np.unique(fecha[fecha_es_ordinal], return_inverse=True)
+    codigo_fecha = np.full(n, -1, dtype=np.int64)
+    codigo_fecha[fecha_es_ordinal] = inversa.reshape(-1)
+    textos = [formatear_fecha_ordinal(ordinal) for ordinal in ordinales.tolist()]
+    fecha_texto = pd.Categorical.from_codes(codigo_fecha, pd.Index(textos, dtype=object))
+
+    # Mismo orden en que `procesar_elemento` agrega los campos a cada venta
+    columnas = {
+        "Fecha": fecha_texto,
+        "EAN": ean,
+        "Valuacion Unitaria": valuacion_unitaria,
+        "Validacion Cliente": validacion_cliente,
+        "RETAIL PAGO": retail_pago_cliente,
+        "Llave": llave,
+        "CAP": cap,
+        "OFERTA": oferta,
+        "Valor Tipo de Valuacion": valor_tipo_valuacion,
+        "Tipo de Valuacion": tipo_valuacion,
+        "Tipo condicion costo": tipo_condicion,
+        "Costo Total": costo_total,
+        "Valor condicion Costo": valor_condicion,
+        "Valor CAP": valor_cap,
+        "Costo con CAP": costo_con_cap,
+        "Valor Oferta": valor_oferta,
+        "Total Beneficio": total_beneficio,
+        VALOR_CONDICION_AL_FINAL: valor_condicion,
+    }
+    # Qué campos recibe cada venta
+    presentes = {
+        "Fecha": fecha_es_ordinal,
+        "EAN": tiene_codigo,
+        "Valuacion Unitaria": tiene_codigo,
+        "Validacion Cliente": tiene_cuenta,
+        "RETAIL PAGO": tiene_cuenta,
+        "Llave": tiene_cuenta,
+        "CAP": aplica,
+        "OFERTA": aplica,
+        "Valor Tipo de Valuacion": con_valuacion,
+        "Tipo de Valuacion": con_valuacion,
+        "Tipo condicion costo": con_tipo_condicion,
+        "Costo Total": con_costo_total,
+        "Valor condicion Costo": aplica & ~condicion_al_final,
+        "Valor CAP": con_financieros,
+        "Costo con CAP": con_financieros,
+        "Valor Oferta": con_financieros,
+        "Total Beneficio": con_financieros,
+        VALOR_CONDICION_AL_FINAL: condicion_al_final,
+    }
+
+    if metricas is not None:
+        metricas.contar("procesados", n)
+        metricas.contar("con_oferta", int(aplica.sum()))
+        metricas.contar("fuera_de_vigencia", int((oferta_encontrada & ~aplica).sum()))
+        metricas.contar("condicion_no_reconocida", int((aplica & ~reconocida).sum()))
+        codigos_sin_oferta = codigo_llave[con_llave & ~oferta_encontrada]
+        sin_oferta = np.bincount(codigos_sin_oferta[codigos_sin_oferta >= 0], minlength=len(llaves))
+        for posicion in np.flatnonzero(sin_oferta).tolist():
+            metricas.registrar_sin_oferta(llaves[posicion], int(sin_oferta[posicion]))
+        if (codigos_sin_oferta < 0).any():
+            metricas.registrar_sin_oferta(None, int((codigos_sin_oferta < 0).sum()))
+        if metricas.cubo is not None:
+            acumular_cubo(metricas.cubo, con_financieros, (codigos_retail, retails), (codigo_llave, llaves),
+                          np.where(con_valuacion, nombre_regla, None), fecha, [total_beneficio, valor_cap, valor_oferta])
+    return columnas, presentes
+
+
+# Función para sumar al cubo de beneficio las ventas de un lote con campos financieros
+def acumular_cubo(cubo, filas, retail, llave, tipo_valuacion, fecha, medidas):
+    """
+    Args:
+        cubo (CuboBeneficio): El cubo donde se suman las ventas.
+        filas (numpy.ndarray): Máscara de las ventas que se suman (las que tienen Total Beneficio).
+        retail (tuple): (códigos, valores distintos) del RETAIL PAGO de cada venta.
+        llave (tuple): (códigos, valores distintos) de la Llave de cada venta.
+        tipo_valuacion (numpy.ndarray): El Tipo de Valuacion de cada venta, o None.
+        fecha (numpy.ndarray): El ordinal del día de cada venta.
+        medidas (list): Los arreglos de cada medida de `cuboBeneficio.MEDIDAS`, en ese orden.
+    """
+    ordinales, codigo_mes = np.unique(fecha[filas], return_inverse=True)
+    meses = [cuboBeneficio.mes_de_ordinal(ordinal) for ordinal in ordinales.tolist()]
+    dimensiones = [(retail[0][filas], retail[1]), (llave[0][filas], llave[1]), categorizar(tipo_valuacion[filas]),
+                   (codigo_mes.reshape(-1), meses)]
+    cubo.agregar_columnas(dimensiones, [valores[filas] for valores in medidas])
+
+
+# Función principal del motor vectorizado
+def procesar_ventas_vectorizado(data, productos_dict, clientes_dict, ofertas_dict, metricas=None):
+    """
+    Enriquece todas las ventas en bloque con pandas/NumPy, con el mismo resultado que llamar
+    `procesar_elemento` sobre cada una.
+
+    Args:
+        data (list): Lista de ventas (dict) a procesar. Se modifican en el lugar.
+        productos_dict (dict): Productos indexados por EAN (`Producto Código` sin los 2 últimos dígitos).
+        clientes_dict (dict): Clientes indexados por NUMERO FARMACIA.
+        ofertas_dict (dict): Índice de ofertas por Llave generado por `construir_indice_ofertas`.
+        metricas (MetricasEjecucion, opcional): Métricas donde se cuentan los resultados del lote.
+
+    Returns:
+        list: La misma lista `data`, con los campos enriquecidos agregados a cada venta.
+    """
+    if not data:
+        return data
+
+    ventas = pd.DataFrame.from_records(data, columns=CAMPOS_VENTA)
+    n = len(ventas)
+    presencia = {campo: np.fromiter((campo in venta for venta in data), dtype=bool, count=n) for campo in CAMPOS_PRESENCIA}
+    # Se toma directo de las ventas: en el DataFrame, ordinales mezclados con nulos pasarían a float
+    fecha_original = np.empty(n, dtype=object)
+    fecha_original[:] = [venta.get("Fecha", None) for venta in data]
+    fecha = convertir_fechas_ordinal(fecha_original)
+    fecha_es_ordinal = (fecha >= 0) & np.fromiter((isinstance(valor, int) for valor in fecha_original), dtype=bool, count=n)
+
+    columnas, presentes = calcular_ventas(ventas, presencia, fecha, fecha_es_ordinal, productos_dict, clientes_dict,
+                                          ofertas_dict, metricas)
+    escribir_campos(data, columnas, presentes)
+
+    if metricas is not None and metricas.muestreo:
+        for indice in range(0, n, metricas.muestreo):
+            metricas.muestrear(indice, data[indice])
+    return data
+
+
+class LoteCompacto:
+    """
+    Un lote de ventas enriquecidas en representación compacta:
+      - Las columnas originales quedan en el lote Arrow leído del Parquet.
+      - Cada campo calculado guarda solo los valores de las ventas que lo reciben, en el orden
+        del lote (los de oferta, por ejemplo, solo los de las ventas con oferta vigente).
+      - Un entero por venta ("forma") indica con un bit por campo cuáles recibe.
+
+    Los diccionarios de cada venta se arman recién al serializar, por tramos de TAMANO_TRAMO
+    ventas, con las mismas claves y en el mismo orden que produce `procesar_elemento`.
+    """
+
+    __slots__ = ("lote", "columnas_json", "campos", "forma", "columnas")
+
+    TAMANO_TRAMO = 2_000  # Ventas que se convierten a diccionario a la vez.
+
+    def __init__(self, lote, columnas_json, columnas, presentes):
+        self.lote = lote
+        self.columnas_json = columnas_json
+        self.campos = list(columnas)
+        self.forma = calcular_forma(self.campos, presentes, lote.num_rows).astype(np.uint32)
+        self.columnas = {campo: columnas[campo][np.flatnonzero(presentes[campo])] for campo in self.campos}
+
+    def __len__(self):
+        return self.lote.num_rows
+
+    # Función para armar los diccionarios de un tramo de ventas
+    def tramo(self, desde, hasta):
+        forma, anteriores = self.forma[desde:hasta], self.forma[:desde]
+        presentes, filas = {}, {}
+        for bit, campo in enumerate(self.campos):
+            presentes[campo] = (forma >> bit & 1).astype(bool)
+            # Posición en la columna compacta: las ventas anteriores que también reciben el campo
+            filas[campo] = np.count_nonzero(anteriores >> bit & 1) + np.cumsum(presentes[campo]) - 1
+        registros = intermedios.a_registros(self.lote.slice(desde, hasta - desde), self.columnas_json)
+        escribir_campos(registros, self.columnas, presentes, filas)
+        return registros
+
+    # Función para recorrer las ventas como diccionarios
+    def registros(self):
+        """
+        Yields:
+            dict: Cada venta enriquecida, en el orden del lote.
+        """
+        for desde in range(0, len(self), self.TAMANO_TRAMO):
+            yield from self.tramo(desde, min(desde + self.TAMANO_TRAMO, len(self)))
+
+    # Función para estimar la memoria que ocupa el lote
+    def nbytes(self):
+        total = self.lote.nbytes + self.forma.nbytes
+        for valores in self.columnas.values():
+            total += valores.codes.nbytes if isinstance(valores, pd.Categorical) else valores.nbytes
+        return total
+
+
+# Función para leer una columna de un lote Arrow
+def columna_lote(lote, campo, columnas_json):
+    """
+    Convierte una columna del lote a pandas sin crear un objeto de Python por valor, salvo en las
+    columnas con tipos mezclados (guardadas como texto JSON), que se decodifican a objetos.
+
+    Returns:
+        pandas.Series: Los valores de la columna (todos nulos si el lote no la tiene).
+    """
+    if campo not in lote.schema.names:
+        return pd.Series(np.full(lote.num_rows, None, dtype=object))
+    if campo not in columnas_json:
+        return lote.column(campo).to_pandas()
+    # Se decodifica cada valor distinto una sola vez
+    codigos, unicos = categorizar(lote.column(campo).to_pandas())
+    decodificados = np.empty(len(unicos) + 1, dtype=object)
+    decodificados[:-1] = [json.loads(valor) for valor in unicos]
+    return pd.Series(decodificados[codigos])
+
+
+# Función para enriquecer un lote Arrow sin convertirlo a diccionarios
+def procesar_lote_compacto(lote, columnas_json, productos_dict, clientes_dict, ofertas_dict, metricas=None, desplazamiento=0):
+    """
+    Enriquece un lote de ventas leído de Parquet (`pyarrow.RecordBatch`), con el mismo resultado
+    que `procesar_ventas_vectorizado`, pero sin crear un diccionario por venta.
+
+    Args:
+        lote (pyarrow.RecordBatch): Las ventas del lote.
+        columnas_json (list): Columnas del Parquet guardadas como texto JSON.
+        productos_dict (dict): Productos indexados por EAN.
+        clientes_dict (dict): Clientes indexados por NUMERO FARMACIA.
+        ofertas_dict (dict): Índice de ofertas por Llave generado por `construir_indice_ofertas`.
+        metricas (MetricasEjecucion, opcional): Métricas donde se cuentan los resultados del lote.
+        desplazamiento (int): Posición de la primera venta del lote en el archivo (para el muestreo).
+
+    Returns:
+        LoteCompacto: Las ventas enriquecidas.
+    """
+    ventas = pd.DataFrame({campo: columna_lote(lote, campo, columnas_json) for campo in CAMPOS_VENTA})
+    # Todas las ventas del lote traen las columnas del Parquet (con None en los nulos)
+    presencia = {campo: np.full(lote.num_rows, campo in lote.schema.names) for campo in CAMPOS_PRESENCIA}
+
+    if "Fecha" in lote.schema.names and "Fecha" not in columnas_json and pa.types.is_integer(lote.schema.field("Fecha").type):
+        # Ordinales de generarJson.py: se leen directo como enteros (los nulos y los no positivos, -1)
+        fecha = lote.column("Fecha").fill_null(-1).to_numpy().astype(np.int64)
+        fecha = np.where(fecha > 0, fecha, -1)
+        fecha_es_ordinal = fecha >= 0
+    else:
+        fecha_original = columna_lote(lote, "Fecha", columnas_json).to_numpy(dtype=object)
+        fecha = convertir_fechas_ordinal(fecha_original)
+        fecha_es_ordinal = (fecha >= 0) & np.fromiter((isinstance(valor, int) for valor in fecha_original), dtype=bool, count=len(fecha))
+
+    columnas, presentes = calcular_ventas(ventas, presencia, fecha, fecha_es_ordinal, productos_dict, clientes_dict,
+                                          ofertas_dict, metricas)
+    compacto = LoteCompacto(lote, columnas_json, columnas, presentes)
+
+    if metricas is not None and metricas.muestreo:
+        primera = -desplazamiento % metricas.muestreo
+        for indice in range(primera, len(compacto), metricas.muestreo):
+            metricas.muestrear(desplazamiento + indice, compacto.tramo(indice, indice + 1)[0])
+    return compacto
+
+
+# Función para combinar las máscaras de presencia en un entero por venta (un bit por campo)
+def calcular_forma(campos, presentes, n):
+    forma = np.zeros(n, dtype=np.int64)
+    for bit, campo in enumerate(campos):
+        forma |= presentes[campo].astype(np.int64) << bit
+    return forma
+
+
+# Función para escribir las columnas calculadas de vuelta en los diccionarios de venta
+def escribir_campos(data, columnas, presentes, filas=None):
+    """
+    Agrega a cada venta los campos calculados que le corresponden.
+
+    Las ventas se agrupan por la combinación de campos presentes, de modo que cada grupo se
+    escribe con una sola lista de claves y los valores salen como tipos nativos de Python.
+
+    Args:
+        data (list): Lista de ventas (dict) a modificar.
+        columnas (dict): Nombre de campo (o columna de CAMPOS_SALIDA) -> arreglo con el valor de cada venta.
+        presentes (dict): Nombre de campo -> máscara booleana de las ventas que reciben el campo.
+        filas (dict, opcional): Nombre de campo -> posición en `columnas[campo]` del valor de cada
+            venta. Por defecto, la misma posición de la venta.
+    """
+    campos = list(columnas)
+    forma = calcular_forma(campos, presentes, len(data))
+
+    for valor_forma in np.unique(forma):
+        indices = np.flatnonzero(forma == valor_forma)
+        campos_grupo = [campo for bit, campo in enumerate(campos) if valor_forma >> bit & 1]
+        if not campos_grupo:
+            continue
+        valores = [columnas[campo][indices if filas is None else filas[campo][indices]].tolist() for campo in campos_grupo]
+        claves = [CAMPOS_SALIDA.get(campo, campo) for campo in campos_grupo]
+        for i, fila in zip(indices.tolist(), zip(*valores)):
+            data[i].update(zip(claves, fila))
@@ -0,0 +1,289 @@
+import hashlib
+import os
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import intermedios
+import serializacion
+from cuboBeneficio import SIN_RETAIL_PAGO, mes_de_ordinal  # Mismo RETAIL PAGO en el cubo y en las particiones
+from fechas import convertir_fecha_ordinal
+
+# Salida particionada por mes de la Fecha y RETAIL PAGO: sell_out_final/2024-01/BENAVIDES.json,
+# con el manifiesto (particiones, filas y checksums) en el índice sell_out_final.indice.json
+MES_SIN_FECHA = "sin_fecha"  # Mes de las ventas sin fecha válida.
+FILAS_EN_MEMORIA = 50_000  # Filas acumuladas entre todas las particiones antes de enviarlas a escribir.
+HILOS_ESCRITURA = min(4, os.cpu_count() or 1)  # Particiones que se serializan y escriben a la vez.
+BLOQUE_CHECKSUM = 1 << 20  # Bytes por lectura al calcular el checksum de una partición.
+EXTENSIONES_SALIDA = {"json": ".json", "jsonl": ".jsonl"}
+
+
+# Función para obtener el mes ("AAAA-MM") de la Fecha de una venta
+def mes_de_venta(venta):
+    fecha = convertir_fecha_ordinal(venta.get("Fecha", None))
+    return MES_SIN_FECHA if fecha is None else mes_de_ordinal(fecha)
+
+
+# Función para obtener el RETAIL PAGO con que se enriqueció una venta
+def retail_pago_de_venta(venta):
+    """
+    El enriquecimiento guarda en cada venta con ACCOUNT_NUMBER el RETAIL PAGO de su cliente, así
+    que se lee de la propia venta, sin volver a consultar el catálogo de clientes.
+    """
+    return venta.get("RETAIL PAGO", SIN_RETAIL_PAGO)
+
+
+# Función para convertir un valor en un nombre de archivo válido
+def nombre_archivo(valor):
+    return re.sub(r"[^\w.-]+", "_", str(valor)).strip(".") or "_"
+
+
+# Función para saber si una partición o una venta cumple un filtro
+def coincide(filtro, mes, retail_pago):
+    """
+    Args:
+        filtro (dict): Valores admitidos por "mes" y por "retail_pago" (un conjunto, o None
+            para admitir cualquiera).
+        mes (str): El mes ("AAAA-MM" o MES_SIN_FECHA).
+        retail_pago (str): El RETAIL PAGO.
+    """
+    return ((not filtro.get("mes") or mes in filtro["mes"])
+            and (not filtro.get("retail_pago") or retail_pago in filtro["retail_pago"]))
+
+
+# Función para calcular el checksum de un archivo ya escrito
+def checksum_archivo(ruta):
+    suma = hashlib.sha256()
+    with open(ruta, "rb") as archivo:
+        while bloque := archivo.read(BLOQUE_CHECKSUM):
+            suma.update(bloque)
+    return suma.hexdigest()
+
+
+class _Particion:
+    """Un archivo de la salida particionada mientras se escribe."""
+
+    def __init__(self, mes, retail_pago, ruta):
+        self.mes = mes
+        self.retail_pago = retail_pago
+        self.ruta = ruta
+        self.temporal = f"{ruta}.{os.getpid()}.tmp"  # Se escribe aquí y se renombra en `cerrar`
+        self.archivo = None
+        self.filas = 0
+        self.pendientes = []  # Ventas recibidas y aún no enviadas a escribir
+        self.ultima = None  # Última escritura enviada; la siguiente espera a que termine
+
+
+class EscritorParticiones:
+    """
+    Escribe las ventas enriquecidas en un archivo por mes y RETAIL PAGO, a medida que llegan.
+
+    Las ventas se acumulan por partición y, cada FILAS_EN_MEMORIA filas, se envían a un grupo de
+    hilos que serializa, comprime y escribe varias particiones a la vez. Las escrituras de una
+    misma partición se encadenan, así que cada archivo conserva el orden de llegada. Cada archivo
+    tiene el formato de `guardar_json_stream` (un objeto por línea).
+
+    Cada partición se escribe en un archivo temporal que reemplaza al de la salida recién en
+    `cerrar`, con todas las ventas recibidas: si los elementos no se terminan de generar, las
+    particiones de la salida anterior (y su índice) quedan como estaban.
+
+    Se usa como context manager; `cerrar` termina los archivos y devuelve el manifiesto. Al
+    salir se eliminan los archivos temporales que no llegaron a renombrarse.
+    """
+
+    def __init__(self, carpeta, formato_salida="json", formato_json=None, hilos=HILOS_ESCRITURA):
+        """
+        Args:
+            carpeta (str): La carpeta de las particiones (OUTPUT_FILE_PATH sin extensión).
+            formato_salida (str): "json" (arreglo JSON) o "jsonl" (JSON Lines).
+            formato_json (serializacion.FormatoJson, opcional): Serializador y compresión.
+            hilos (int): Particiones que se escriben a la vez.
+        """
+        self.carpeta = carpeta
+        self.formato_salida = formato_salida
+        self.formato_json = formato_json or serializacion.FORMATO_PREDETERMINADO
+        self.hilos = max(1, hilos)
+        self.particiones = {}  # (mes, RETAIL PAGO) -> _Particion
+        self.rutas = set()
+        self.meses = {}  # Fecha -> mes, para no convertir cada fecha
+        self.acumuladas = 0
+        self.enviadas = deque()
+        self.executor = ThreadPoolExecutor(max_workers=self.hilos, thread_name_prefix="particion")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excepcion):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        for particion in self.particiones.values():
+            if particion.archivo is not None:
+                particion.archivo.close()
+            if os.path.exists(particion.temporal):
+                os.remove(particion.temporal)
+                carpeta = os.path.dirname(particion.temporal)
+                if not os.listdir(carpeta):
+                    os.rmdir(carpeta)  # La carpeta de un mes creada por esta ejecución
+
+    # Función para obtener (o crear) la partición de una venta
+    def particion(self, mes, retail_pago):
+        clave = (mes, retail_pago)
+        particion = self.particiones.get(clave)
+        if particion is None:
+            nombre = nombre_archivo(retail_pago)
+            ruta = self.formato_json.ruta(os.path.join(self.carpeta, nombre_archivo(mes), nombre + EXTENSIONES_SALIDA[self.formato_salida]))
+            sufijo = 1
+            while ruta in self.rutas:  # Dos RETAIL PAGO con el mismo nombre de archivo
+                sufijo += 1
+                ruta = self.formato_json.ruta(os.path.join(self.carpeta, nombre_archivo(mes), f"{nombre}_{sufijo}" + EXTENSIONES_SALIDA[self.formato_salida]))
+            self.rutas.add(ruta)
+            particion = self.particiones[clave] = _Particion(mes, retail_pago, ruta)
+        return particion
+
+    # Función para agregar ventas enriquecidas a sus particiones
+    def agregar(self, elementos):
+        meses = self.meses
+        for elemento in elementos:
+            fecha = elemento.get("Fecha", None)
+            mes = meses.get(fecha)
+            if mes is None:
+                mes = meses[fecha] = mes_de_venta(elemento)
+            self.particion(mes, retail_pago_de_venta(elemento)).pendientes.append(elemento)
+            self.acumuladas += 1
+            if self.acumuladas >= FILAS_EN_MEMORIA:
+                self.enviar_pendientes()
+
+    # Función para enviar a escribir las ventas acumuladas de todas las particiones
+    def enviar_pendientes(self):
+        for particion in self.particiones.values():
+            if particion.pendientes:
+                self.enviar(particion, particion.pendientes)
+                particion.pendientes = []
+        self.acumuladas = 0
+
+    # Función para enviar una tarea de escritura de una partición
+    def enviar(self, particion, grupo, final=False):
+        particion.ultima = self.executor.submit(self._escribir, particion, grupo, particion.ultima, final)
+        self.enviadas.append(particion.ultima)
+        # Como mucho dos tareas por hilo esperan en cola; los errores de escritura se propagan aquí
+        while len(self.enviadas) > 2 * self.hilos:
+            self.enviadas.popleft().result()
+
+    # Función que ejecuta cada hilo de escritura
+    def _escribir(self, particion, grupo, anterior, final):
+        if anterior is not None:
+            anterior.result()  # Las escrituras de una partición van en orden
+        if particion.archivo is None:
+            os.makedirs(os.path.dirname(particion.ruta), exist_ok=True)
+            particion.archivo = self.formato_json.abrir(particion.temporal)
+            if self.formato_salida == "json":
+                particion.archivo.write(b"[")
+        partes = []
+        for elemento in grupo:
+            linea = self.formato_json.codificar(elemento, indentar=False)
+            if self.formato_salida == "json":
+                partes.append((b"\n" if particion.filas == 0 else b",\n") + linea)
+            else:
+                partes.append(linea + b"\n")
+            particion.filas += 1
+        particion.archivo.write(b"".join(partes))
+        if final:
+            if self.formato_salida == "json":
+                particion.archivo.write(b"\n]\n" if particion.filas else b"]\n")
+            particion.archivo.close()
+            particion.archivo = None
+
+    # Función para terminar de escribir todas las particiones
+    def cerrar(self):
+        """
+        Returns:
+            list: Una entrada del manifiesto (dict) por partición, ordenadas por mes y RETAIL
+            PAGO: archivo, mes, retail_pago, filas, bytes y sha256 (del archivo tal como quedó
+            en disco, comprimido o no).
+        """
+        for particion in self.particiones.values():
+            self.enviar(particion, particion.pendientes, final=True)
+            particion.pendientes = []
+        self.acumuladas = 0
+        while self.enviadas:
+            self.enviadas.popleft().result()
+        for particion in self.particiones.values():
+            os.replace(particion.temporal, particion.ruta)
+        ordenadas = sorted(self.particiones.values(), key=lambda particion: (particion.mes, particion.retail_pago))
+        checksums = self.executor.map(checksum_archivo, [particion.ruta for particion in ordenadas])
+        return [{"archivo": particion.ruta, "mes": particion.mes, "retail_pago": particion.retail_pago,
+                 "filas": particion.filas, "bytes": os.path.getsize(particion.ruta), "sha256": checksum}
+                for particion, checksum in zip(ordenadas, checksums)]
+
+
+# Función para guardar el manifiesto de la salida particionada
+def guardar_manifiesto(ruta_base, manifiesto):
+    """
+    Guarda el manifiesto como índice de las particiones (`reemplazar_indice`), así que todo lo
+    que lee un índice lee la salida completa.
+
+    Args:
+        ruta_base (str): La ruta del índice sin extensión (OUTPUT_FILE_PATH sin extensión).
+        manifiesto (list): Las entradas de `EscritorParticiones.cerrar`.
+
+    Returns:
+        str: La ruta del índice generado.
+    """
+    carpeta = os.path.dirname(ruta_base) or "."
+    detalle = [dict(entrada, archivo=os.path.relpath(entrada["archivo"], carpeta)) for entrada in manifiesto]
+    return reemplazar_indice([entrada["archivo"] for entrada in manifiesto], ruta_base, detalle)
+
+
+# Función para reemplazar el índice de la salida y eliminar los archivos que ya no están en él
+def reemplazar_indice(rutas, ruta_base, detalle=None):
+    """
+    Guarda el índice con `intermedios.guardar_indice` y elimina los archivos del índice anterior
+    que no están en el nuevo: las particiones que quedaron sin ventas (por ejemplo, un mes) y las
+    de la otra organización de la salida cuando se alterna entre --particionar (por mes y RETAIL
+    PAGO) y el modo incremental (por mes), que comparten la carpeta y el índice. Solo se eliminan
+    archivos de la carpeta de la salida, y después las carpetas de mes que quedan vacías.
+
+    Args:
+        rutas (list): Las rutas de los archivos del índice nuevo.
+        ruta_base (str): La ruta del índice sin extensión, que también es la carpeta de la salida.
+        detalle (list, opcional): Ver `intermedios.guardar_indice`.
+
+    Returns:
+        str: La ruta del índice generado.
+    """
+    ruta = ruta_base + intermedios.EXTENSION_INDICE
+    anteriores = set()
+    if os.path.isfile(ruta):
+        anteriores = {os.path.abspath(archivo) for archivo in intermedios.rutas_de_indice(ruta)}
+    ruta = intermedios.guardar_indice(rutas, ruta_base, detalle)
+    carpeta = os.path.abspath(ruta_base)
+    for archivo in sorted(anteriores.difference(os.path.abspath(archivo) for archivo in rutas)):
+        if os.path.commonpath([carpeta, archivo]) != carpeta or not os.path.isfile(archivo):
+            continue
+        os.remove(archivo)
+        contenedora = os.path.dirname(archivo)
+        if contenedora != carpeta and not os.listdir(contenedora):
+            os.rmdir(contenedora)  # La carpeta de un mes que ya no tiene ventas
+    return ruta
+
+
+# Función para elegir los archivos de un índice que cumplen un filtro
+def seleccionar_particiones(ruta, filtro):
+    """
+    Args:
+        ruta (str): El índice de la salida particionada.
+        filtro (dict): Ver `coincide`.
+
+    Returns:
+        list: Tuplas (ruta del archivo, filtrar por venta). Las particiones del manifiesto que no
+        cumplen el filtro se omiten sin abrirlas; las que no tienen mes y RETAIL PAGO en el
+        manifiesto (por ejemplo las del modo incremental, solo por mes) se leen y se filtran
+        venta por venta.
+    """
+    seleccionadas = []
+    for archivo, detalle in intermedios.detalle_de_indice(ruta):
+        if detalle and "mes" in detalle and "retail_pago" in detalle:
+            if coincide(filtro, detalle["mes"], detalle["retail_pago"]):
+                seleccionadas.append((archivo, False))
+        else:
+            seleccionadas.append((archivo, True))
+    return seleccionadas
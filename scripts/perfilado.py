@@ -0,0 +1,154 @@
+import cProfile
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+from metricas import memoria_pico_mb
+
+
+# Función para sumar el tamaño de los archivos que existen
+def tamano_archivos(rutas):
+    return sum(os.path.getsize(ruta) for ruta in rutas if ruta and os.path.isfile(ruta))
+
+
+class Perfilador:
+    """
+    Registra el perfil de una ejecución por etapa: tiempo de reloj y de CPU, tamaño de las
+    entradas y salidas (bytes y filas) y memoria pico. Opcionalmente guarda un archivo pstats de
+    cProfile por etapa y mide el pico de memoria de Python de cada etapa con tracemalloc.
+
+    Al terminar, `guardar` agrega la ejecución al reporte JSON; si varios scripts usan el mismo
+    reporte (generarJson.py, funcionesFinal.py y generarExcel.py), queda una sola corrida completa.
+
+    Las etapas no se anidan: cProfile admite un solo perfilador activo a la vez.
+    """
+
+    def __init__(self, script, ruta_reporte, carpeta_cprofile=None, usar_tracemalloc=False):
+        """
+        Args:
+            script (str): El nombre del script que se perfila.
+            ruta_reporte (str): El archivo JSON del reporte.
+            carpeta_cprofile (str, opcional): Carpeta donde se guarda un archivo .pstats por etapa.
+            usar_tracemalloc (bool): Si es True, mide el pico de memoria de Python de cada etapa.
+                Es más preciso que el RSS pico, pero hace más lenta la ejecución.
+        """
+        self.script = script
+        self.ruta_reporte = ruta_reporte
+        self.carpeta_cprofile = carpeta_cprofile
+        self.usar_tracemalloc = usar_tracemalloc
+        self.etapas = []
+        self.inicio = time.perf_counter()
+        self.fecha = datetime.now().isoformat(timespec="seconds")
+        if carpeta_cprofile:
+            os.makedirs(carpeta_cprofile, exist_ok=True)
+        if usar_tracemalloc and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    # Context manager para perfilar una etapa
+    @contextmanager
+    def etapa(self, nombre, entradas=(), salidas=()):
+        """
+        Perfila una etapa. El diccionario que entrega el context manager se agrega al reporte, así
+        que la etapa puede completar "filas_entrada", "filas_salida" o cambiar "salidas" cuando
+        recién las conoce.
+
+        Args:
+            nombre (str): El nombre de la etapa.
+            entradas (list): Archivos que lee la etapa.
+            salidas (list): Archivos que escribe la etapa.
+
+        Yields:
+            dict: El registro de la etapa.
+        """
+        registro = {"etapa": nombre, "entradas": list(entradas), "salidas": list(salidas)}
+        perfil = cProfile.Profile() if self.carpeta_cprofile else None
+        if self.usar_tracemalloc:
+            tracemalloc.reset_peak()
+        inicio, inicio_cpu = time.perf_counter(), time.process_time()
+        if perfil is not None:
+            perfil.enable()
+        try:
+            yield registro
+        finally:
+            if perfil is not None:
+                perfil.disable()
+            registro["segundos"] = round(time.perf_counter() - inicio, 4)
+            registro["segundos_cpu"] = round(time.process_time() - inicio_cpu, 4)
+            registro["entradas"] = [str(ruta) for ruta in registro["entradas"]]
+            registro["salidas"] = [str(ruta) for ruta in registro["salidas"] or []]
+            registro["bytes_entrada"] = tamano_archivos(registro["entradas"])
+            registro["bytes_salida"] = tamano_archivos(registro["salidas"])
+            # El RSS pico es el máximo del proceso hasta el final de la etapa
+            registro["rss_pico_mb"] = memoria_pico_mb()
+            if self.usar_tracemalloc:
+                registro["tracemalloc_pico_mb"] = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 2)
+            if perfil is not None:
+                ruta = os.path.join(self.carpeta_cprofile, f"{self.script}_{len(self.etapas) + 1:02d}_{nombre}.pstats")
+                perfil.dump_stats(ruta)
+                registro["cprofile"] = ruta
+            self.etapas.append(registro)
+
+    # Función para agregar la ejecución al reporte
+    def guardar(self):
+        """
+        Agrega esta ejecución a la lista "ejecuciones" del reporte JSON, creándolo si no existe.
+
+        Returns:
+            str: La ruta del reporte.
+        """
+        reporte = {"ejecuciones": []}
+        if os.path.isfile(self.ruta_reporte):
+            with open(self.ruta_reporte, "r", encoding="utf-8") as archivo:
+                reporte = json.load(archivo)
+        reporte["ejecuciones"].append({
+            "script": self.script,
+            "fecha": self.fecha,
+            "argumentos": sys.argv[1:],
+            "segundos": round(time.perf_counter() - self.inicio, 4),
+            "rss_pico_mb": memoria_pico_mb(),
+            "etapas": self.etapas,
+        })
+        with open(self.ruta_reporte, "w", encoding="utf-8") as archivo:
+            json.dump(reporte, archivo, ensure_ascii=False, indent=4)
+        return self.ruta_reporte
+
+
+class PerfiladorInactivo:
+    """
+    Perfilador que no hace nada: se usa cuando el perfilado está apagado, para que las etapas
+    no cuesten más que entrar en un `nullcontext`.
+    """
+
+    def etapa(self, nombre, entradas=(), salidas=()):
+        return nullcontext({})
+
+    def guardar(self):
+        return None
+
+
+INACTIVO = PerfiladorInactivo()
+
+
+# Función para agregar las opciones de perfilado a la línea de comandos de un script
+def agregar_argumentos(parser):
+    parser.add_argument("--perfil", metavar="ARCHIVO",
+                        help="Activa el perfilado y agrega la ejecución a este reporte JSON.")
+    parser.add_argument("--perfil-cprofile", metavar="CARPETA",
+                        help="Con --perfil, guarda un archivo pstats de cProfile por etapa en esta carpeta.")
+    parser.add_argument("--perfil-tracemalloc", action="store_true",
+                        help="Con --perfil, mide el pico de memoria de Python de cada etapa (más lento).")
+
+
+# Función para crear el perfilador según los argumentos de la línea de comandos
+def crear_perfilador(script, args):
+    """
+    Returns:
+        Perfilador | PerfiladorInactivo: El perfilador si se pasó --perfil; si no, INACTIVO.
+    """
+    if not args.perfil:
+        return INACTIVO
+    return Perfilador(script, args.perfil, args.perfil_cprofile, args.perfil_tracemalloc)
@@ -0,0 +1,172 @@
+import json
+import os
+import shutil
+
+import cuboBeneficio
+import intermedios
+import serializacion
+from estadoIncremental import huella_archivo
+
+# Puntos de control del enriquecimiento, junto a la salida: sell_out_final.puntos_control/ con
+# una parte por cada N ventas enriquecidas (parte_000000.jsonl, ...), el cubo acumulado y el progreso
+EXTENSION_PUNTOS_CONTROL = ".puntos_control"
+VERSION_PUNTOS_CONTROL = 2  # Cambia si cambia el formato o los campos de las ventas, para no reanudar puntos de control anteriores.
+ARCHIVO_PROGRESO = "progreso.json"
+ARCHIVO_CUBO = "cubo" + intermedios.EXTENSIONES["parquet"]
+
+
+# Función para obtener la carpeta de los puntos de control de un archivo de salida
+def carpeta_puntos_control(ruta_salida):
+    return os.path.splitext(ruta_salida)[0] + EXTENSION_PUNTOS_CONTROL
+
+
+# Función para obtener la huella de cada archivo de entrada (None si viene en memoria)
+def huellas_entradas(rutas):
+    """
+    Args:
+        rutas (dict): Nombre -> ruta del archivo, o None si los datos ya están en memoria.
+
+    Returns:
+        dict: Nombre -> huella (`estadoIncremental.huella_archivo`), o None si no existe.
+    """
+    return {nombre: huella_archivo(ruta) if ruta and os.path.exists(ruta) else None for nombre, ruta in rutas.items()}
+
+
+# Función para escribir un archivo de forma duradera
+def escribir_duradero(ruta, escribir):
+    """
+    Escribe en un archivo temporal con `escribir(ruta_temporal)`, lo fuerza a disco y recién
+    entonces lo renombra: si la ejecución se interrumpe, `ruta` queda con su contenido anterior
+    completo o con el nuevo completo, nunca a medias.
+    """
+    base, extension = os.path.splitext(ruta)
+    temporal = f"{base}.tmp{extension}"
+    try:
+        escribir(temporal)
+        with open(temporal, "rb+") as archivo:
+            os.fsync(archivo.fileno())
+        os.replace(temporal, ruta)
+    finally:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+
+
+class PuntosControl:
+    """
+    Las ventas ya enriquecidas de una ejecución, guardadas en partes a medida que se completan,
+    con un archivo de progreso que se reescribe después de cada parte. Si la ejecución falla, la
+    siguiente con `reanudar` saltea las ventas de las partes completas y sigue desde ahí, siempre
+    que los archivos de entrada y las opciones sean los mismos.
+
+    El progreso guarda también los contadores de las métricas y el cubo de beneficio de las
+    partes completas, para que el resumen y el cubo de la ejecución reanudada cubran todas las ventas.
+    """
+
+    def __init__(self, carpeta, entradas, opciones, reanudar=False):
+        """
+        Args:
+            carpeta (str): La carpeta de los puntos de control (`carpeta_puntos_control`).
+            entradas (dict): La huella de cada archivo de entrada (`huellas_entradas`).
+            opciones (dict): Las opciones que cambian el resultado o cómo se escriben las partes
+                (por ejemplo, el motor o el serializador).
+            reanudar (bool): Si es True, se sigue desde el progreso guardado, si coincide; si no,
+                se empieza de cero y se descartan los puntos de control anteriores.
+        """
+        self.carpeta = carpeta
+        self.ruta_progreso = os.path.join(carpeta, ARCHIVO_PROGRESO)
+        self.ruta_cubo = os.path.join(carpeta, ARCHIVO_CUBO)
+        identidad = {"version": VERSION_PUNTOS_CONTROL, "entradas": entradas, "opciones": opciones}
+        self.motivo = None  # Por qué no se reanudó, si se pidió
+        self.progreso = None
+        if reanudar:
+            if not os.path.isfile(self.ruta_progreso):
+                self.motivo = "no hay puntos de control"
+            else:
+                with open(self.ruta_progreso, "r", encoding="utf-8") as archivo:
+                    progreso = json.load(archivo)
+                if {clave: progreso.get(clave) for clave in identidad} == identidad:
+                    self.progreso = progreso
+                else:
+                    self.motivo = "los archivos de entrada o las opciones cambiaron"
+        if self.progreso is None:
+            if os.path.isdir(carpeta):
+                shutil.rmtree(carpeta)
+            os.makedirs(carpeta)
+            self.progreso = dict(identidad, partes=[], filas=0, completo=False, contadores={}, llaves_sin_oferta={})
+
+    # Función para saber si se reanudó una ejecución anterior
+    @property
+    def reanudada(self):
+        return self.progreso["filas"] > 0 or self.progreso["completo"]
+
+    # Función para recuperar en las métricas lo de las partes ya completas
+    def restaurar(self, metricas):
+        metricas.contadores.update(self.progreso["contadores"])
+        metricas.llaves_sin_oferta.update(self.progreso["llaves_sin_oferta"])
+        if metricas.cubo is not None and os.path.isfile(self.ruta_cubo):
+            metricas.cubo.combinar(cuboBeneficio.cargar_cubo(self.ruta_cubo))
+
+    # Función para guardar una parte de ventas enriquecidas
+    def guardar_parte(self, elementos, formato_json):
+        """
+        Escribe la parte como JSON Lines (con el serializador y la compresión de `formato_json`)
+        de forma duradera.
+        La parte cuenta como completa recién con `registrar`.
+
+        Returns:
+            tuple: (nombre del archivo de la parte, cantidad de ventas).
+        """
+        nombre = formato_json.ruta(f"parte_{len(self.progreso['partes']):06d}.jsonl")
+        filas = 0
+
+        def escribir(ruta):
+            nonlocal filas
+            with formato_json.abrir(ruta) as archivo:
+                for elemento in elementos:
+                    archivo.write(formato_json.codificar(elemento, indentar=False) + b"\n")
+                    filas += 1
+
+        escribir_duradero(os.path.join(self.carpeta, nombre), escribir)
+        return nombre, filas
+
+    # Función para registrar una parte completa en el progreso
+    def registrar(self, nombre, filas, metricas):
+        """
+        Args:
+            nombre (str): El archivo de la parte (`guardar_parte`).
+            filas (int): Las ventas de la parte.
+            metricas (MetricasEjecucion): Las métricas de todas las partes completas.
+        """
+        if metricas.cubo is not None:
+            escribir_duradero(self.ruta_cubo, lambda ruta: cuboBeneficio.guardar_cubo(metricas.cubo, ruta))
+        self.progreso["partes"].append(nombre)
+        self.progreso["filas"] += filas
+        self.progreso["contadores"] = dict(metricas.contadores)
+        self.progreso["llaves_sin_oferta"] = dict(metricas.llaves_sin_oferta)
+        self.guardar_progreso()
+
+    # Función para marcar que ya se enriquecieron todas las ventas
+    def terminar(self):
+        self.progreso["completo"] = True
+        self.guardar_progreso()
+
+    # Función para guardar el progreso
+    def guardar_progreso(self):
+        def escribir(ruta):
+            with open(ruta, "w", encoding="utf-8") as archivo:
+                json.dump(self.progreso, archivo, ensure_ascii=False)
+        escribir_duradero(self.ruta_progreso, escribir)
+
+    # Función para recorrer las ventas enriquecidas de todas las partes, en orden
+    def elementos(self):
+        for nombre in self.progreso["partes"]:
+            yield from serializacion.leer_lineas(os.path.join(self.carpeta, nombre))
+
+    # Función para recorrer las líneas JSON de todas las partes, en orden, sin decodificarlas
+    def lineas(self):
+        for nombre in self.progreso["partes"]:
+            yield from serializacion.lineas_de_archivo(os.path.join(self.carpeta, nombre))
+
+    # Función para eliminar los puntos de control (cuando la salida final ya está guardada)
+    def eliminar(self):
+        shutil.rmtree(self.carpeta, ignore_errors=True)
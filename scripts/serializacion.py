@@ -0,0 +1,301 @@
+import gzip
+import json
+import os
+import ijson
+import pyarrow as pa
+
+# Serializadores opcionales, más rápidos que el módulo json: se usan solo si están instalados
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+# Serialización de los archivos JSON que escriben generarJson.py y funcionesFinal.py
+SERIALIZADORES = ("json", "orjson", "ujson")
+COMPRESIONES = ("ninguna", "gzip", "zstd")
+EXTENSIONES_COMPRESION = {"gzip": ".gz", "zstd": ".zst"}
+# Primeros bytes de cada formato comprimido, para reconocerlo sin depender de la extensión
+FIRMAS_COMPRESION = {b"\x1f\x8b": "gzip", b"\x28\xb5\x2f\xfd": "zstd"}
+NIVEL_GZIP = 6  # El nivel 9 de gzip.open comprime apenas más y es varias veces más lento.
+TAMANO_GRUPO = 2_000  # Elementos de un arreglo que se serializan a la vez.
+BLOQUE_LECTURA = 1 << 20  # Bytes por lectura al recorrer un archivo JSON Lines.
+
+
+# Función para saber qué serializadores están instalados
+def serializadores_disponibles():
+    modulos = {"json": json, "orjson": orjson, "ujson": ujson}
+    return [nombre for nombre in SERIALIZADORES if modulos[nombre] is not None]
+
+
+class FormatoJson:
+    """
+    Cómo se escribe un archivo JSON: el serializador, la indentación y la compresión.
+
+    El formato predeterminado (módulo json, indentación de 4 espacios, sin compresión) escribe
+    exactamente lo mismo que `json.dump(..., ensure_ascii=False, indent=4)`. Con indentación 0
+    la salida es compacta, sin espacios ni saltos de línea.
+
+    Diferencias de los serializadores opcionales:
+      - orjson solo indenta con 2 espacios y escribe NaN e infinito como null.
+      - ujson no admite NaN ni infinito.
+    """
+
+    def __init__(self, serializador="json", indentacion=4, compresion="ninguna"):
+        """
+        Args:
+            serializador (str): "json", "orjson" o "ujson".
+            indentacion (int): Espacios de indentación; 0 escribe JSON compacto.
+            compresion (str): "ninguna", "gzip" o "zstd".
+
+        Raises:
+            ValueError: Si el serializador o la compresión no se reconocen, o si el serializador
+                no está instalado.
+        """
+        if serializador not in SERIALIZADORES:
+            raise ValueError(f"Serializador no reconocido: {serializador}")
+        if serializador not in serializadores_disponibles():
+            raise ValueError(f"El serializador '{serializador}' no está instalado.")
+        if compresion not in COMPRESIONES:
+            raise ValueError(f"Compresión no reconocida: {compresion}")
+        self.serializador = serializador
+        self.indentacion = max(int(indentacion), 0)
+        self.compresion = compresion
+
+    # Función para describir el formato (para los parámetros de las huellas del pipeline)
+    def parametros(self):
+        return {"serializador": self.serializador, "indentacion": self.indentacion, "compresion": self.compresion}
+
+    # Función para obtener la ruta del archivo según la compresión
+    def ruta(self, ruta):
+        return ruta + EXTENSIONES_COMPRESION.get(self.compresion, "")
+
+    # Función para serializar un objeto
+    def codificar(self, objeto, indentar=True):
+        """
+        Args:
+            objeto: El objeto a serializar.
+            indentar (bool): Si es False se escribe en una sola línea aunque el formato indente
+                (con los separadores ", " y ": " del módulo json, salvo que el formato sea compacto).
+
+        Returns:
+            bytes: El JSON en UTF-8.
+        """
+        indentacion = self.indentacion if indentar else 0
+        if self.serializador == "orjson":
+            opciones = orjson.OPT_SERIALIZE_NUMPY | (orjson.OPT_INDENT_2 if indentacion else 0)
+            return orjson.dumps(objeto, option=opciones)
+        if self.serializador == "ujson":
+            return ujson.dumps(objeto, ensure_ascii=False, indent=indentacion, escape_forward_slashes=False).encode("utf-8")
+        separadores = None if self.indentacion else (",", ":")
+        return json.dumps(objeto, ensure_ascii=False, indent=indentacion or None, separators=separadores).encode("utf-8")
+
+    # Función para abrir un archivo de salida con la compresión del formato
+    def abrir(self, ruta):
+        """
+        Returns:
+            Un archivo binario de escritura; lo escrito se comprime si el formato lo indica.
+        """
+        if self.compresion == "gzip":
+            return gzip.open(ruta, "wb", compresslevel=NIVEL_GZIP)
+        if self.compresion == "zstd":
+            return pa.output_stream(ruta, compression="zstd")
+        return open(ruta, "wb")
+
+    # Función para escribir un arreglo JSON a medida que se generan sus elementos
+    def escribir_arreglo(self, archivo, elementos):
+        """
+        Escribe los elementos como un arreglo JSON, igual que si se serializara la lista
+        completa, pero sin armarla: cada grupo de TAMANO_GRUPO elementos se serializa como un
+        arreglo y se le quitan los corchetes para empalmarlo con el siguiente.
+
+        Args:
+            archivo: Archivo binario abierto con `abrir`.
+            elementos (iterable): Los elementos del arreglo.
+
+        Returns:
+            int: La cantidad de elementos escritos.
+        """
+        total = 0
+        grupo = []
+        separador = b"["
+
+        def escribir_grupo():
+            nonlocal separador
+            # Sin el "[" inicial, el "]" final ni el salto de línea que lo precede
+            archivo.write(separador + self.codificar(grupo)[1:-1].rstrip(b"\n"))
+            separador = b","
+
+        for elemento in elementos:
+            grupo.append(elemento)
+            total += 1
+            if len(grupo) == TAMANO_GRUPO:
+                escribir_grupo()
+                grupo = []
+        if grupo:
+            escribir_grupo()
+        if not total:
+            archivo.write(b"[]")
+        else:
+            archivo.write(b"\n]" if self.indentacion else b"]")
+        return total
+
+    # Función para escribir un archivo JSON completo
+    def escribir(self, ruta, datos):
+        """
+        Escribe `datos` en `ruta` (agregando la extensión de la compresión). Las listas y los
+        iterables se escriben por grupos con `escribir_arreglo`.
+
+        Returns:
+            str: La ruta del archivo escrito.
+        """
+        ruta = self.ruta(ruta)
+        with self.abrir(ruta) as archivo:
+            if isinstance(datos, dict):
+                archivo.write(self.codificar(datos))
+            else:
+                self.escribir_arreglo(archivo, datos)
+        return ruta
+
+
+FORMATO_PREDETERMINADO = FormatoJson()
+
+
+# Función para reconocer la compresión de un archivo
+def detectar_compresion(ruta):
+    """
+    Returns:
+        str: "gzip", "zstd" o "ninguna", según los primeros bytes del archivo.
+    """
+    with open(ruta, "rb") as archivo:
+        inicio = archivo.read(4)
+    for firma, compresion in FIRMAS_COMPRESION.items():
+        if inicio.startswith(firma):
+            return compresion
+    return "ninguna"
+
+
+# Función para abrir un archivo JSON para lectura, comprimido o no
+def abrir_lectura(ruta):
+    """
+    Returns:
+        Un archivo binario de lectura con el contenido ya descomprimido.
+    """
+    compresion = detectar_compresion(ruta)
+    if compresion == "gzip":
+        return gzip.open(ruta, "rb")
+    if compresion == "zstd":
+        return pa.input_stream(ruta, compression="zstd")
+    return open(ruta, "rb")
+
+
+# Función para cargar un archivo JSON completo
+def cargar(ruta):
+    """
+    Carga un archivo JSON (comprimido o no, indentado o compacto). Con orjson instalado se usa
+    para decodificar; si el archivo tiene NaN o infinito, que orjson no admite, se usa el módulo json.
+
+    Raises:
+        json.JSONDecodeError: Si el archivo no es JSON válido.
+    """
+    with abrir_lectura(ruta) as archivo:
+        contenido = archivo.read()
+    return decodificar(contenido)
+
+
+# Función para decodificar un texto JSON
+def decodificar(contenido):
+    """
+    Decodifica con orjson si está instalado; si el texto tiene NaN o infinito, que orjson no
+    admite, se usa el módulo json.
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(contenido)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(contenido)
+
+
+# Función para leer un archivo JSON Lines línea por línea
+def leer_lineas(ruta):
+    """
+    Lee un archivo JSON Lines (comprimido o no) de a bloques, con memoria constante. A diferencia
+    de `leer_elementos`, cada línea se decodifica igual que con `cargar`, así que los valores
+    (incluidos NaN e infinito) quedan exactamente como se escribieron.
+
+    Yields:
+        Cada elemento del archivo.
+    """
+    for linea in lineas_de_archivo(ruta):
+        yield decodificar(linea)
+
+
+# Función para recorrer las líneas no vacías de un archivo, comprimido o no
+def lineas_de_archivo(ruta):
+    """
+    Yields:
+        bytes: Cada línea no vacía, ya descomprimida y sin el salto de línea.
+    """
+    pendiente = b""
+    with abrir_lectura(ruta) as archivo:
+        while bloque := archivo.read(BLOQUE_LECTURA):
+            lineas = (pendiente + bloque).split(b"\n")
+            pendiente = lineas.pop()
+            for linea in lineas:
+                if linea.strip():
+                    yield linea
+    if pendiente.strip():
+        yield pendiente
+
+
+# Función para leer en flujo los elementos de un archivo JSON
+def leer_elementos(ruta):
+    """
+    Lee un archivo JSON elemento por elemento, con memoria constante: un arreglo JSON (indentado,
+    compacto o con un objeto por línea) o JSON Lines, comprimido o no. El tipo se reconoce por
+    el primer carácter del contenido.
+
+    Yields:
+        Cada elemento, con los números decimales como float.
+    """
+    with abrir_lectura(ruta) as archivo:
+        inicio = archivo.read(64).lstrip()
+    arreglo = inicio.startswith(b"[")
+    with abrir_lectura(ruta) as archivo:
+        # use_float evita los Decimal de ijson, que json.dumps no sabe serializar
+        if arreglo:
+            yield from ijson.items(archivo, "item", use_float=True)
+        else:
+            yield from ijson.items(archivo, "", multiple_values=True, use_float=True)
+
+
+# Función para ubicar un archivo JSON que puede estar comprimido
+def ruta_existente(ruta):
+    """
+    Returns:
+        str: De `ruta` y la misma ruta con la extensión de cada compresión, el archivo existente
+        modificado más recientemente (para no leer una salida vieja de otra compresión); `ruta`
+        si no existe ninguno.
+    """
+    candidatas = [ruta] + [ruta + extension for extension in EXTENSIONES_COMPRESION.values()]
+    existentes = [candidata for candidata in candidatas if os.path.isfile(candidata)]
+    return max(existentes, key=os.path.getmtime) if existentes else ruta
+
+
+# Función para agregar las opciones de serialización a la línea de comandos de un script
+def agregar_argumentos(parser):
+    parser.add_argument("--serializador", choices=serializadores_disponibles(), default="json",
+                        help="Serializador de los archivos JSON (orjson y ujson, si están instalados, son más rápidos).")
+    parser.add_argument("--indentacion", type=int, default=4,
+                        help="Espacios de indentación de los archivos JSON; 0 los escribe compactos.")
+    parser.add_argument("--compresion", choices=COMPRESIONES, default="ninguna",
+                        help="Compresión de los archivos JSON (agrega .gz o .zst al nombre).")
+
+
+# Función para crear el formato según los argumentos de la línea de comandos
+def crear_formato(args):
+    return FormatoJson(args.serializador, args.indentacion, args.compresion)
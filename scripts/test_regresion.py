@@ -0,0 +1,403 @@
+import copy
+import json
+import os
+from collections import Counter
+
+import pytest
+
+import intermedios
+import particionesSalida
+
+# Catálogos pequeños con los casos que distinguen a los motores: ventanas de vigencia de una misma
+# Llave, cliente desconocido, ACCOUNT_NUMBER nulo, producto desconocido y Llaves propias de la venta
+PRODUCTOS = [
+    {"Producto Código": "750000000000101", "Costo de Reposicion": 71.5, "Precio Farmacia": 90.25, "Precio Publico": 120.0},
+    {"Producto Código": "750000000000201", "Costo de Reposicion": 10.0, "Precio Farmacia": 12.5, "Precio Publico": 15.75},
+]
+CLIENTES = [
+    {"NUMERO FARMACIA": "1000", "Aplica": "Si", "RETAIL PAGO": "BENAVIDES"},
+    {"NUMERO FARMACIA": "1001", "Aplica": "No", "RETAIL PAGO": "AHORRO"},
+]
+
+
+# Función para armar una oferta de prueba
+def oferta(llave, inicio, fin, regla="Precio Farmacia", tipo="Monto Fijo", cap=0.1, oferta=0.2):
+    return {"Llave": llave, "Nombre regla": regla, "Costo Fijo": 3.5, "Tipo condicion costo": tipo, "CAP": cap,
+            "Oferta": oferta, "Fecha inicio vigencia": inicio, "Fecha fin vigencia": fin, "Tipo condicion": "SELL-OUT"}
+
+
+OFERTAS = [
+    oferta("BENAVIDES7500000000001", "01/01/2024", "03/31/2024"),
+    oferta("BENAVIDES7500000000001", "04/01/2024", "06/30/2024", "Costo Fijo", "Costo Fijo", 0.05, 0.15),
+    oferta("AHORRO7500000000002", "01/01/2024", "12/31/2024", "Precio Publico", "% DESCUENTO SOBRE COSTO"),
+    oferta("No7500000000002", "01/01/2024", "12/31/2024"),
+    oferta("BENAVIDES7500000000009", "01/01/2024", "12/31/2024"),
+    oferta("PROPIA01", "01/01/2024", "12/31/2024", cap=0.3, oferta=0.1),
+]
+
+
+# Función para armar una venta de prueba
+def venta(codigo, fecha, piezas=3, descuento=1.5, costo=100.0, **campos):
+    return {"Producto Código": codigo, "Fecha": fecha, "Pzas Facturadas": piezas, "Descuento Factura": descuento,
+            "Costo Total": costo, **campos}
+
+
+# Ventas que traen ACCOUNT_NUMBER (a veces nulo): la Llave es RETAIL PAGO + EAN
+VENTAS_CON_CUENTA = [
+    venta("750000000000101", "02/15/2024", ACCOUNT_NUMBER="1000"),
+    venta("750000000000101", "05/20/2024", costo=80.5, ACCOUNT_NUMBER="1000"),
+    venta("750000000000101", "08/01/2024", ACCOUNT_NUMBER="1000"),
+    venta("750000000000201", "03/03/2024", ACCOUNT_NUMBER="1001", piezas=7),
+    venta("750000000000201", "03/04/2024", ACCOUNT_NUMBER="9999"),
+    venta("750000000000201", "03/05/2024", ACCOUNT_NUMBER=None),
+    venta("750000000000901", "03/06/2024", ACCOUNT_NUMBER="1000"),
+    venta("750000000000201", "no es fecha", ACCOUNT_NUMBER="1001"),
+]
+# Ventas sin ACCOUNT_NUMBER: se busca la oferta de la Llave que traen, si la traen
+VENTAS_CON_LLAVE = [
+    venta("750000000000101", "02/15/2024", Llave="PROPIA01"),
+    venta("750000000000201", "11/30/2024", descuento=None, costo=12.0, Llave="PROPIA01"),
+    venta("750000000000201", "03/03/2024", Llave="SIN_OFERTA"),
+    venta("750000000000101", "03/03/2024", Llave=None),
+]
+
+
+@pytest.fixture(scope="module")
+def funcionesFinal():
+    # Se importa después de que `carpeta_trabajo` crea la carpeta logs/
+    import funcionesFinal
+    return funcionesFinal
+
+
+# Función para guardar los catálogos y las ventas de prueba como los deja generarJson.py
+@pytest.fixture
+def entradas(funcionesFinal, tmp_path, monkeypatch):
+    """
+    Returns:
+        callable: Recibe las ventas (y opcionalmente los clientes), las guarda en Parquet junto
+        con los catálogos y apunta las rutas de funcionesFinal a esos archivos.
+    """
+    def guardar(ventas, clientes=CLIENTES):
+        for nombre, registros in (("RUTA_PRODUCTOS", PRODUCTOS), ("RUTA_CLIENTES", clientes), ("RUTA_OFERTAS", OFERTAS),
+                                  ("RUTA_ARCHIVO", ventas)):
+            monkeypatch.setattr(funcionesFinal, nombre, intermedios.guardar_registros(registros, str(tmp_path / nombre)))
+        monkeypatch.setattr(funcionesFinal, "OUTPUT_FILE_PATH", str(tmp_path / "sell_out_final.json"))
+    return guardar
+
+
+# Función para leer la salida final de la última ejecución
+def leer_salida(funcionesFinal):
+    with open(funcionesFinal.OUTPUT_FILE_PATH, encoding="utf-8") as archivo:
+        return json.load(archivo)
+
+
+# Función para leer el cubo de beneficio de la última ejecución
+def leer_cubo(funcionesFinal):
+    import cuboBeneficio
+    return cuboBeneficio.cargar_cubo(cuboBeneficio.ruta_cubo(funcionesFinal.OUTPUT_FILE_PATH)).celdas
+
+
+# Función para leer todas las ventas de una salida particionada (por su índice)
+def leer_particiones(funcionesFinal):
+    import serializacion
+    ruta_indice = os.path.splitext(funcionesFinal.OUTPUT_FILE_PATH)[0] + intermedios.EXTENSION_INDICE
+    return [venta for ruta in intermedios.rutas_de_indice(ruta_indice) for venta in serializacion.cargar(ruta)]
+
+
+# Función para comparar las celdas de dos cubos (las sumas pueden diferir en el último decimal)
+def cubos_iguales(celdas, esperadas):
+    return celdas.keys() == esperadas.keys() and all(celdas[clave] == pytest.approx(esperadas[clave]) for clave in esperadas)
+
+
+# El motor vectorizado sigue las reglas de Llave de procesar_elemento, venta por venta
+def test_motor_vectorizado_igual_a_registro(funcionesFinal):
+    from cuboBeneficio import CuboBeneficio
+    from metricas import MetricasEjecucion
+    import motorVectorizado
+
+    ofertas_dict = funcionesFinal.construir_indice_ofertas(OFERTAS)
+    productos_dict = funcionesFinal.indice_productos(PRODUCTOS)
+    clientes_dict = funcionesFinal.indice_clientes(CLIENTES)
+    ventas = VENTAS_CON_CUENTA + VENTAS_CON_LLAVE
+
+    por_registro, metricas_registro = copy.deepcopy(ventas), MetricasEjecucion(cubo=CuboBeneficio())
+    for elemento in por_registro:
+        funcionesFinal.procesar_elemento(elemento, productos_dict, clientes_dict, ofertas_dict, metricas_registro)
+    vectorizado, metricas_vectorizado = copy.deepcopy(ventas), MetricasEjecucion(cubo=CuboBeneficio())
+    motorVectorizado.procesar_ventas_vectorizado(vectorizado, productos_dict, clientes_dict, ofertas_dict, metricas_vectorizado)
+
+    assert [list(elemento) for elemento in vectorizado] == [list(elemento) for elemento in por_registro]
+    assert vectorizado == por_registro
+    # "procesados" lo cuenta `procesar_elementos_stream` con el motor por registro
+    assert +metricas_vectorizado.contadores - Counter(procesados=len(ventas)) == +metricas_registro.contadores
+    assert metricas_vectorizado.llaves_sin_oferta == metricas_registro.llaves_sin_oferta
+    # Las ventas sin ACCOUNT_NUMBER se suman al cubo sin RETAIL PAGO
+    assert ("sin_retail_pago", "PROPIA01") in {clave[:2] for clave in metricas_registro.cubo.celdas}
+    assert cubos_iguales(metricas_vectorizado.cubo.celdas, metricas_registro.cubo.celdas)
+
+
+# Los tres motores escriben la misma salida final a partir de las mismas entradas
+@pytest.mark.parametrize("ventas", [VENTAS_CON_CUENTA, VENTAS_CON_LLAVE], ids=["con_cuenta", "con_llave"])
+def test_motores_escriben_la_misma_salida(funcionesFinal, entradas, ventas):
+    entradas(ventas)
+    salidas, cubos = {}, {}
+    for motor in funcionesFinal.MOTORES:
+        assert funcionesFinal.procesar_archivos(motor=motor) is not None
+        salidas[motor], cubos[motor] = leer_salida(funcionesFinal), leer_cubo(funcionesFinal)
+
+    assert len(salidas["registro"]) == len(ventas)
+    assert cubos["registro"]
+    for motor in ("vectorizado", "compacto"):
+        assert salidas[motor] == salidas["registro"]
+        assert cubos_iguales(cubos[motor], cubos["registro"])
+        assert [list(elemento) for elemento in salidas[motor]] == [list(elemento) for elemento in salidas["registro"]]
+
+
+# En streaming se escriben las mismas ventas que en memoria, como arreglo JSON o como JSON Lines
+def test_streaming_escribe_la_misma_salida(funcionesFinal, entradas, tmp_path):
+    entradas(VENTAS_CON_CUENTA + VENTAS_CON_LLAVE)
+    assert funcionesFinal.procesar_archivos() is not None
+    en_memoria = leer_salida(funcionesFinal)
+
+    assert funcionesFinal.procesar_archivos(streaming=True) is not None
+    assert leer_salida(funcionesFinal) == en_memoria
+
+    assert funcionesFinal.procesar_archivos(streaming=True, formato_salida="jsonl") is not None
+    with open(tmp_path / "sell_out_final.jsonl", encoding="utf-8") as archivo:
+        lineas = archivo.read().splitlines()
+    assert [json.loads(linea) for linea in lineas] == en_memoria
+
+
+# Sin elementos, el arreglo JSON en streaming queda vacío pero válido
+@pytest.mark.parametrize("formato, contenido", [("json", b"[]\n"), ("jsonl", b"")])
+def test_guardar_json_stream_sin_elementos(funcionesFinal, tmp_path, formato, contenido):
+    ruta = tmp_path / f"vacio.{formato}"
+    assert funcionesFinal.guardar_json_stream(str(ruta), iter([]), formato) == 0
+    assert ruta.read_bytes() == contenido
+
+
+# Si quien genera los elementos falla, el escritor en segundo plano no cierra la salida como completa
+def test_escritura_en_segundo_plano_se_cancela(funcionesFinal, tmp_path):
+    import concurrencia
+    from functools import partial
+    ruta = tmp_path / "salida.json"
+    ruta.write_text("anterior")
+
+    with pytest.raises(ValueError, match="falla simulada"):
+        with concurrencia.EscrituraEnSegundoPlano(partial(funcionesFinal.guardar_json_stream, str(ruta))) as escritura:
+            assert escritura.enviar([{"ID": 1}, {"ID": 2}])
+            raise ValueError("falla simulada")
+    assert escritura.resultado is None
+    assert archivos_de(tmp_path) == {"salida.json": b"anterior"}
+
+
+# Cada ventana de vigencia de una Llave es una oferta, con el CAP y la Oferta de sus propios folios
+def test_consolidar_ofertas_por_ventana_de_vigencia():
+    import pandas as pd
+    import generarJson
+
+    negociacion = pd.DataFrame([
+        {"Tipo condicion": "SELL-OUT", "Llave": "BENAVIDES7500000000001", "Folio": 10, "Folio caso": 1, "Oferta costo": 0.1,
+         "Fecha inicio vigencia": "01/01/2024", "Fecha fin vigencia": "03/31/2024"},
+        {"Tipo condicion": "SELL-OUT", "Llave": "BENAVIDES7500000000001", "Folio": 10, "Folio caso": 2, "Oferta costo": 0.2,
+         "Fecha inicio vigencia": "01/01/2024", "Fecha fin vigencia": "03/31/2024"},
+        {"Tipo condicion": "SELL-OUT", "Llave": "BENAVIDES7500000000001", "Folio": 11, "Folio caso": 1, "Oferta costo": 0.05,
+         "Fecha inicio vigencia": "04/01/2024", "Fecha fin vigencia": "06/30/2024"},
+        {"Tipo condicion": "SELL-OUT", "Llave": "BENAVIDES7500000000001", "Folio": 11, "Folio caso": 2, "Oferta costo": 0.15,
+         "Fecha inicio vigencia": "04/01/2024", "Fecha fin vigencia": "06/30/2024"},
+        {"Tipo condicion": "SELL-IN", "Llave": "BENAVIDES7500000000001", "Folio": 12, "Folio caso": 1, "Oferta costo": 0.3,
+         "Fecha inicio vigencia": "01/01/2024", "Fecha fin vigencia": "03/31/2024"},
+        {"Tipo condicion": "SELL-OUT", "Llave": "AHORRO7500000000002", "Folio": 13, "Folio caso": 2, "Oferta costo": 0.25,
+         "Fecha inicio vigencia": "01/01/2024", "Fecha fin vigencia": "12/31/2024"},
+    ]).assign(**{"Costo Fijo": [0.0, 0.0, 3.5, 3.5, 0.0, 0.0]})
+    ofertas = generarJson.consolidar_ofertas(negociacion)
+
+    # "Costo Fijo" conserva el nombre con que lo busca el enriquecimiento
+    columnas = ["Tipo condicion", "Llave", "Folio", "Fecha inicio vigencia", "CAP", "Oferta", "Costo Fijo"]
+    assert ofertas[columnas].values.tolist() == [
+        ["SELL-OUT", "BENAVIDES7500000000001", 10, "01/01/2024", 0.1, 0.2, 0.0],
+        ["SELL-OUT", "BENAVIDES7500000000001", 11, "04/01/2024", 0.05, 0.15, 3.5],
+        ["SELL-IN", "BENAVIDES7500000000001", 12, "01/01/2024", 0.3, 0.0, 0.0],
+        ["SELL-OUT", "AHORRO7500000000002", 13, "01/01/2024", 0.0, 0.25, 0.0],
+    ]
+
+
+# El catálogo mapeado da, campo por campo, los mismos valores que el diccionario de productos
+def test_valor_producto_igual_en_catalogo_mapeado(tmp_path):
+    import catalogoProductos
+    productos = {producto["Producto Código"][:-2]: producto for producto in PRODUCTOS}
+    productos["750000000003"] = {"Producto Código": "75000000000301", "Costo de Reposicion": 5, "Lista": [1, 2]}
+    ruta = str(tmp_path / ("productos" + catalogoProductos.EXTENSION_CATALOGO))
+    catalogoProductos.construir_catalogo(productos, ruta, {})
+    mapeado = catalogoProductos.abrir_catalogo(ruta)
+
+    campos = {campo for producto in productos.values() for campo in producto} | {"No existe"}
+    for clave in list(productos) + ["750000000009", None]:
+        for campo in campos:
+            # Dos veces: la segunda sale de la caché de valores
+            for _ in range(2):
+                assert (catalogoProductos.valor_producto(mapeado, clave, campo, "predeterminado")
+                        == catalogoProductos.valor_producto(productos, clave, campo, "predeterminado"))
+
+
+# Si la salida no se puede escribir, la ejecución no se informa como completa
+@pytest.mark.parametrize("streaming", [False, True], ids=["en_memoria", "streaming"])
+@pytest.mark.parametrize("particionar", [False, True], ids=["un_archivo", "particionada"])
+def test_escritura_fallida_no_completa_la_ejecucion(funcionesFinal, entradas, tmp_path, monkeypatch, streaming, particionar):
+    entradas(VENTAS_CON_CUENTA)
+    # La carpeta de la salida es un archivo: no se puede crear ni escribir dentro de ella
+    (tmp_path / "no_es_carpeta").write_text("")
+    monkeypatch.setattr(funcionesFinal, "OUTPUT_FILE_PATH", str(tmp_path / "no_es_carpeta" / "sell_out_final.json"))
+
+    assert funcionesFinal.procesar_archivos(streaming=streaming, particionar=particionar, cubo=False) is None
+
+
+# Función para leer todos los archivos de una carpeta (para ver si una ejecución la modificó)
+def archivos_de(carpeta):
+    return {str(ruta.relative_to(carpeta)): ruta.read_bytes() for ruta in carpeta.rglob("*") if ruta.is_file()}
+
+
+# Si el enriquecimiento falla a mitad de una ejecución en streaming, la salida anterior queda
+# intacta en lugar de reemplazarse por un archivo (o un índice de particiones) bien formado con
+# solo parte de las ventas
+@pytest.mark.parametrize("formato", ["json", "jsonl"])
+@pytest.mark.parametrize("particionar", [False, True], ids=["un_archivo", "particionada"])
+def test_falla_en_streaming_conserva_la_salida_anterior(funcionesFinal, entradas, tmp_path, monkeypatch, formato, particionar):
+    entradas(VENTAS_CON_CUENTA + VENTAS_CON_LLAVE)
+    assert funcionesFinal.procesar_archivos(streaming=True, formato_salida=formato, particionar=particionar) is not None
+    anteriores = archivos_de(tmp_path)
+
+    procesar_elemento = funcionesFinal.procesar_elemento
+    procesadas = []
+
+    # Enriquece las ventas como siempre, pero falla en la décima
+    def procesar_elemento_con_falla(*args, **kwargs):
+        procesadas.append(None)
+        if len(procesadas) == 10:
+            raise ValueError("falla simulada")
+        return procesar_elemento(*args, **kwargs)
+
+    monkeypatch.setattr(funcionesFinal, "procesar_elemento", procesar_elemento_con_falla)
+    # Las primeras ventas ya llegaron al escritor, y con --particionar a los archivos de sus particiones
+    monkeypatch.setattr(funcionesFinal, "GRUPO_ESCRITURA", 2)
+    monkeypatch.setattr(particionesSalida, "FILAS_EN_MEMORIA", 2)
+    with pytest.raises(ValueError, match="falla simulada"):
+        funcionesFinal.procesar_archivos(streaming=True, formato_salida=formato, particionar=particionar)
+    assert archivos_de(tmp_path) == anteriores
+
+
+# Una etapa que falla no conserva la huella de su ejecución anterior: la próxima corrida la repite
+def test_etapa_fallida_se_vuelve_a_ejecutar(funcionesFinal, tmp_path, monkeypatch):
+    import ejecutarPipeline
+
+    monkeypatch.setattr(ejecutarPipeline, "RUTA_ESTADO", str(tmp_path / "pipeline_estado.json"))
+    salida = tmp_path / "clientes.parquet"
+    falla = False
+
+    def ejecutar_clientes(pipeline):
+        salida.write_text("a medias" if falla else "completa")
+        if falla:
+            raise RuntimeError("No se pudieron convertir las hojas de clientes.")
+        return [str(salida)]
+
+    monkeypatch.setattr(ejecutarPipeline.Pipeline, "ejecutar_clientes", ejecutar_clientes)
+    assert ejecutarPipeline.Pipeline().ejecutar("clientes") == {"clientes": "ejecutada"}
+    falla = True
+    with pytest.raises(RuntimeError):
+        ejecutarPipeline.Pipeline().ejecutar("clientes", forzar=["clientes"])
+    falla = False
+    assert ejecutarPipeline.Pipeline().ejecutar("clientes") == {"clientes": "ejecutada"}
+    assert salida.read_text() == "completa"
+
+
+# --particionar y el modo incremental comparten carpeta e índice: al alternar entre ellos no
+# quedan archivos de la otra organización de la salida
+def test_alternar_salida_particionada_e_incremental(funcionesFinal, entradas):
+    entradas(VENTAS_CON_CUENTA + VENTAS_CON_LLAVE)
+    carpeta = os.path.splitext(funcionesFinal.OUTPUT_FILE_PATH)[0]
+    ruta_indice = carpeta + intermedios.EXTENSION_INDICE
+
+    def archivos():
+        return sorted(os.path.relpath(os.path.join(raiz, nombre), carpeta)
+                      for raiz, _, nombres in os.walk(carpeta) for nombre in nombres)
+
+    def indexados():
+        return sorted(os.path.relpath(ruta, carpeta) for ruta in intermedios.rutas_de_indice(ruta_indice))
+
+    assert funcionesFinal.procesar_archivos(particionar=True) is not None
+    particionada, ventas = archivos(), leer_particiones(funcionesFinal)
+    # El RETAIL PAGO de la partición es el que el enriquecimiento guardó en la venta
+    assert {"2024-02/BENAVIDES.json", "2024-03/AHORRO.json", "2024-03/No.json"} <= set(particionada)
+    assert particionada == indexados()
+
+    for _ in range(2):
+        assert funcionesFinal.procesar_incremental() is not None
+        assert archivos() == indexados() and all(os.sep not in archivo for archivo in archivos())
+        assert sorted(map(json.dumps, leer_particiones(funcionesFinal))) == sorted(map(json.dumps, ventas))
+
+        assert funcionesFinal.procesar_archivos(particionar=True) is not None
+        assert archivos() == particionada == indexados()
+
+
+# Después de cada cambio en las ventas o los catálogos, el modo incremental deja las mismas
+# ventas enriquecidas y el mismo cubo que una ejecución completa con las mismas entradas
+@pytest.mark.parametrize("motor", ["registro", "vectorizado"])
+def test_incremental_igual_a_ejecucion_completa(funcionesFinal, entradas, tmp_path, monkeypatch, motor):
+    ventas = VENTAS_CON_CUENTA + VENTAS_CON_LLAVE
+    clientes_modificados = [dict(CLIENTES[0], Aplica="No"), dict(CLIENTES[1], **{"RETAIL PAGO": "BENAVIDES"})]
+    pasos = [
+        (ventas, CLIENTES),
+        (ventas, CLIENTES),  # Sin cambios
+        (ventas[1:] + [venta("750000000000201", "12/01/2024", ACCOUNT_NUMBER="1001")], CLIENTES),
+        (ventas[1:] + [venta("750000000000201", "12/01/2024", ACCOUNT_NUMBER="1001")], clientes_modificados),
+    ]
+    for ventas_paso, clientes in pasos:
+        entradas(ventas_paso, clientes)
+        assert funcionesFinal.procesar_incremental(motor=motor) is not None
+        incremental, cubo_incremental = leer_particiones(funcionesFinal), leer_cubo(funcionesFinal)
+
+        with monkeypatch.context() as cambios:
+            cambios.setattr(funcionesFinal, "OUTPUT_FILE_PATH", str(tmp_path / "completa.json"))
+            assert funcionesFinal.procesar_archivos(motor=motor) is not None
+            completa, cubo_completo = leer_salida(funcionesFinal), leer_cubo(funcionesFinal)
+
+        # El modo incremental ordena las ventas por mes; cada una con sus campos en el mismo orden
+        assert sorted(map(json.dumps, incremental)) == sorted(map(json.dumps, completa))
+        assert cubos_iguales(cubo_incremental, cubo_completo)
+
+
+# Una ejecución que falla a mitad del enriquecimiento y se reanuda desde su último punto de
+# control deja la misma salida y el mismo cubo que una ejecución completa sin fallas
+@pytest.mark.parametrize("motor", ["registro", "compacto"])
+@pytest.mark.parametrize("streaming", [False, True], ids=["en_memoria", "streaming"])
+def test_reanudar_igual_a_ejecucion_completa(funcionesFinal, entradas, tmp_path, monkeypatch, motor, streaming):
+    import puntosControl
+    entradas(VENTAS_CON_CUENTA + VENTAS_CON_LLAVE)
+    with monkeypatch.context() as cambios:
+        cambios.setattr(funcionesFinal, "OUTPUT_FILE_PATH", str(tmp_path / "completa.json"))
+        assert funcionesFinal.procesar_archivos(streaming=streaming, motor=motor) is not None
+        completa, cubo_completo = leer_salida(funcionesFinal), leer_cubo(funcionesFinal)
+
+    guardar_parte = puntosControl.PuntosControl.guardar_parte
+    partes = []
+
+    # Guarda las partes como siempre, pero la primera ejecución falla en la tercera
+    def guardar_parte_con_falla(self, elementos, formato_json):
+        partes.append(len(self.progreso["partes"]))
+        if partes == [0, 1, 2]:
+            raise OSError("falla simulada")
+        return guardar_parte(self, elementos, formato_json)
+
+    monkeypatch.setattr(puntosControl.PuntosControl, "guardar_parte", guardar_parte_con_falla)
+    with pytest.raises(OSError, match="falla simulada"):
+        funcionesFinal.procesar_archivos(streaming=streaming, motor=motor, punto_control=2)
+    carpeta = puntosControl.carpeta_puntos_control(funcionesFinal.OUTPUT_FILE_PATH)
+    assert os.path.isdir(carpeta)
+
+    # Al reanudar solo se enriquecen las partes que faltaban
+    partes.clear()
+    assert funcionesFinal.procesar_archivos(streaming=streaming, motor=motor, punto_control=2, reanudar=True) is not None
+    assert partes == [2, 3, 4, 5]
+    assert leer_salida(funcionesFinal) == completa
+    assert cubos_iguales(leer_cubo(funcionesFinal), cubo_completo)
+    assert not os.path.exists(carpeta)